@@ -19,6 +19,63 @@ struct SortQuestionsRequest: Codable {
     }
 }
 
+struct ChangesRequest: Codable {
+    let action: String
+    let since: Int?
+    let epoch: String?
+    
+    init(since: Int?, epoch: String?) {
+        self.action = "get_changes"
+        self.since = since
+        self.epoch = epoch
+    }
+}
+
+struct NegotiateRequest: Codable {
+    let action: String
+    let compression: [String]
+    
+    init(compression: [String]) {
+        self.action = "negotiate"
+        self.compression = compression
+    }
+}
+
+// Asks the server to push change events for every question, one question or one tag
+struct SubscribeRequest: Codable {
+    let action: String
+    let questionId: String?
+    let tag: String?
+    
+    init(questionId: String? = nil, tag: String? = nil) {
+        self.action = "subscribe"
+        self.questionId = questionId
+        self.tag = tag
+    }
+    
+    enum CodingKeys: String, CodingKey {
+        case action
+        case questionId = "question_id"
+        case tag
+    }
+}
+
+struct VoteRequest: Codable {
+    let action: String
+    let questionId: String
+    let voteType: VoteType
+    let userId: String
+    let token: String?
+    
+    init(questionId: String, voteType: VoteType, userId: String) {
+        self.action = "vote"
+        self.questionId = questionId
+        self.voteType = voteType
+        self.userId = userId
+        self.token = UserSession.currentToken
+    }
+}
+
 struct FilterQuestionsRequest: Codable {
     let action: String
     let searchText: String
@@ -33,11 +90,13 @@ struct DeleteQuestionRequest: Codable {
     let action: String
     let questionId: String
     let authorId: String
+    var token: String? = UserSession.currentToken
     
     enum CodingKeys: String, CodingKey {
         case action
         case questionId = "question_id"
         case authorId = "author_id"
+        case token
     }
 }
 
@@ -73,11 +132,13 @@ struct DeleteAnswerRequest: Codable {
     let answerId: String
     let questionId: String
     let authorId: String
+    var token: String? = UserSession.currentToken
     
     enum CodingKeys: String, CodingKey {
         case action
         case answerId = "answerId"
         case questionId = "questionId"
         case authorId = "authorId"
+        case token
     }
 } 
\ No newline at end of file
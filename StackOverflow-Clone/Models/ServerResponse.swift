@@ -4,6 +4,72 @@ struct ServerResponse: Codable {
     let status: String
     let message: String?
     let username: String? // For login responses
+    let token: String? // Session token from login and sign-up
     let data: [Question]? // For question-related responses
     let lastModified: String? // For tracking updates
 }
+
+// Response to get_changes: only records changed since the client's last sequence number
+struct ChangesResponse: Codable {
+    let status: String
+    let message: String?
+    let seq: Int?
+    let epoch: String?
+    let reset: Bool?
+    let questions: [Question]?
+    let answers: [ChangedAnswer]?
+    let deletedQuestions: [String]?
+    let deletedAnswers: [DeletedAnswer]?
+    
+    enum CodingKeys: String, CodingKey {
+        case status
+        case message
+        case seq
+        case epoch
+        case reset
+        case questions
+        case answers
+        case deletedQuestions = "deleted_questions"
+        case deletedAnswers = "deleted_answers"
+    }
+}
+
+struct ChangedAnswer: Codable {
+    let questionId: String
+    let answer: Answer
+}
+
+struct DeletedAnswer: Codable {
+    let questionId: String
+    let answerId: String
+}
+
+// Frame the server pushes to subscribed connections; never a reply to a request
+struct PushMessage: Codable {
+    let event: String // "changes", or "resync" when events were dropped and get_changes must catch up
+    let changes: [ChangeEvent]?
+}
+
+struct ChangeEvent: Codable {
+    let type: String // question_added, answer_added, answer_deleted, question_deleted or votes
+    let question: Question?
+    let questionId: String?
+    let answer: Answer?
+    let answerId: String?
+    let upvotes: Int?
+    let downvotes: Int?
+    let votes: Int?
+    let userVotes: [String: VoteType]? // only the votes that changed; .none means withdrawn
+    
+    enum CodingKeys: String, CodingKey {
+        case type
+        case question
+        case questionId
+        case answer
+        case answerId
+        case upvotes
+        case downvotes
+        case votes
+        case userVotes = "user_votes"
+    }
+}
@@ -2,6 +2,10 @@ import SwiftUI
 import Combine
 
 class UserSession: ObservableObject {
+    // Token of the signed-in session, sent with write requests so the server
+    // knows who is acting without asking for the password again
+    static var currentToken: String?
+    
     @Published var username: String? {
         didSet {
             // This will trigger view updates when username changes
@@ -9,12 +13,19 @@ class UserSession: ObservableObject {
         }
     }
     
+    @Published var token: String? {
+        didSet {
+            UserSession.currentToken = token
+        }
+    }
+    
     var isLoggedIn: Bool {
         username != nil
     }
     
     func logout() {
         username = nil
+        token = nil
         // Add any additional cleanup here
     }
     
@@ -7,6 +7,12 @@ class Connection {
     private static var nextID: Int = 0
     var didStopCallback: ((Error?) -> Void)? = nil
     
+    // Every message is a 4-byte big-endian length followed by the JSON payload.
+    // The top bit of the length marks a raw-deflate payload (after negotiation).
+    static let headerLength = 4
+    static let compressedFlag = 0x8000_0000
+    private var receiveBuffer = Data()
+    
     init(nwConnection: NWConnection) {
         self.nwConnection = nwConnection
         self.id = Connection.nextID
@@ -44,8 +50,9 @@ class Connection {
             guard let self = self else { return }
             
             if let data = data, !data.isEmpty {
-                print("Connection \(self.id) did receive, data: \(String(data: data, encoding: .utf8) ?? "")")
-                NotificationCenter.default.post(name: .didReceiveData, object: data)
+                print("Connection \(self.id) did receive \(data.count) bytes")
+                self.receiveBuffer.append(data)
+                self.processReceiveBuffer()
             }
             if isComplete {
                 self.connectionDidEnd()
@@ -57,8 +64,40 @@ class Connection {
         }
     }
     
+    // Posts every complete frame; a partial frame stays buffered until the rest arrives
+    private func processReceiveBuffer() {
+        while receiveBuffer.count >= Connection.headerLength {
+            let header = receiveBuffer.prefix(Connection.headerLength).reduce(0) { ($0 << 8) | Int($1) }
+            let length = header & ~Connection.compressedFlag
+            let frameEnd = Connection.headerLength + length
+            guard receiveBuffer.count >= frameEnd else { return }
+            
+            var frame = Data(receiveBuffer.dropFirst(Connection.headerLength).prefix(length))
+            receiveBuffer = Data(receiveBuffer.dropFirst(frameEnd))
+            if header & Connection.compressedFlag != 0 {
+                // NSData's .zlib algorithm is raw deflate, matching the server
+                if let inflated = try? (frame as NSData).decompressed(using: .zlib) as Data {
+                    frame = inflated
+                } else {
+                    // Still post something so the response stays matched to its request
+                    print("Connection \(self.id) received an undecodable compressed frame")
+                    frame = Data(#"{"status":"error","message":"Undecodable compressed response"}"#.utf8)
+                }
+            }
+            // Tagged with this connection so each SocketService only sees its own frames
+            NotificationCenter.default.post(name: .didReceiveData, object: frame, userInfo: ["connectionID": self.id])
+        }
+    }
+    
+    static func frame(_ payload: Data) -> Data {
+        var length = UInt32(payload.count).bigEndian
+        var framed = Data(bytes: &length, count: Connection.headerLength)
+        framed.append(payload)
+        return framed
+    }
+    
     func send(data: Data) {
-        self.nwConnection.send(content: data, completion: .contentProcessed { [weak self] error in
+        self.nwConnection.send(content: Connection.frame(data), completion: .contentProcessed { [weak self] error in
             if let error = error {
                 self?.connectionDidFail(error: error)
                 return
@@ -95,7 +134,13 @@ class Connection {
 class SocketService: ObservableObject {
     private var connection: Connection?
     @Published var isConnected = false
-    private var responseHandlers: [(Data) -> Void] = []
+    private var responseHandlers: [(Result<Data, Error>) -> Void] = []
+    // Sent again on every reconnect; the completion runs each time so callers can resync
+    private var subscriptions: [(request: SubscribeRequest, completion: (Result<Data, Error>) -> Void)] = []
+    // Receives frames the server pushes to subscribed connections
+    var pushHandler: ((Data) -> Void)?
+    // Server pushes start with this key; responses never carry it
+    private static let pushPrefix = Data(#"{"event":"#.utf8)
     
     init() {
         setupConnection()
@@ -112,6 +157,11 @@ class SocketService: ObservableObject {
         connection.didStopCallback = { [weak self] error in
             print("Socket did stop with error: \(String(describing: error))")
             self?.isConnected = false
+            // Requests still waiting will never get their response on this connection
+            let pending = self?.responseHandlers ?? []
+            self?.responseHandlers = []
+            let failure = error ?? NSError(domain: "", code: -1, userInfo: [NSLocalizedDescriptionKey: "Connection closed"])
+            pending.forEach { $0(.failure(failure)) }
             // Attempt to reconnect after a delay
             DispatchQueue.main.asyncAfter(deadline: .now() + 2) {
                 self?.setupConnection()
@@ -121,6 +171,17 @@ class SocketService: ObservableObject {
         self.connection = connection
         connection.start()
         self.isConnected = true
+        
+        // Ask for compressed responses; large question lists shrink several-fold on the wire
+        send(NegotiateRequest(compression: ["deflate"])) { result in
+            if case .success(let data) = result {
+                print("Negotiated: \(String(data: data, encoding: .utf8) ?? "")")
+            }
+        }
+        
+        for subscription in subscriptions {
+            send(subscription.request, completion: subscription.completion)
+        }
     }
     
     private func setupNotifications() {
@@ -133,14 +194,26 @@ class SocketService: ObservableObject {
     }
     
     @objc private func handleReceivedData(_ notification: Notification) {
-        guard let data = notification.object as? Data else { return }
+        guard let data = notification.object as? Data,
+              let connectionID = notification.userInfo?["connectionID"] as? Int,
+              connectionID == connection?.id else { return }
+        // Pushes arrive between responses and must not consume a response handler
+        if data.starts(with: SocketService.pushPrefix) {
+            pushHandler?(data)
+            return
+        }
         // Execute and remove the first response handler
         if let handler = responseHandlers.first {
             responseHandlers.removeFirst()
-            handler(data)
+            handler(.success(data))
         }
     }
     
+    func subscribe(_ request: SubscribeRequest, completion: @escaping (Result<Data, Error>) -> Void) {
+        subscriptions.append((request: request, completion: completion))
+        send(request, completion: completion)
+    }
+    
     func send<T: Encodable>(_ request: T, completion: @escaping (Result<Data, Error>) -> Void) {
         guard let connection = connection else {
             completion(.failure(NSError(domain: "", code: -1, userInfo: [NSLocalizedDescriptionKey: "No connection available"])))
@@ -152,9 +225,7 @@ class SocketService: ObservableObject {
             print("Sending: \(String(data: data, encoding: .utf8) ?? "")")
             
             // Add response handler before sending
-            responseHandlers.append { responseData in
-                completion(.success(responseData))
-            }
+            responseHandlers.append(completion)
             
             connection.send(data: data)
         } catch {
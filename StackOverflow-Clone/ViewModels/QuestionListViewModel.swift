@@ -5,11 +5,14 @@ struct QuestionRequest: Codable {
     let action: String
     let question: Question?
     let lastUpdate: String?
+    let token: String?
     
     init(action: String, question: Question? = nil, lastUpdate: String? = nil) {
         self.action = action
         self.question = question
         self.lastUpdate = lastUpdate
+        // Only writes need the session; reads stay identical so the server can share cached responses
+        self.token = action == "add_question" ? UserSession.currentToken : nil
     }
 }
 
@@ -23,6 +26,7 @@ struct AnswerRequest: Codable {
     let action: String
     let answer: Answer
     let questionId: String
+    var token: String? = UserSession.currentToken
 }
 
 class QuestionListViewModel: ObservableObject {
@@ -30,15 +34,17 @@ class QuestionListViewModel: ObservableObject {
     @Published var isLoading = false
     @Published var errorMessage: String?
     
-    private var lastUpdate: String?
+    // Sync position from the last get_changes response
+    private var lastSeq: Int?
+    private var epoch: String?
     private let socketService = SocketService()
+    // Only used against servers without subscriptions
     private var refreshTimer: Timer?
     private let refreshInterval: TimeInterval = 0.1 // 0.1 seconds
     
     init() {
         print("QuestionListViewModel initialized")
-        loadQuestions()
-        startAutoRefresh() // Start auto-refresh when initialized
+        startLiveUpdates()
     }
     
     deinit {
@@ -52,11 +58,8 @@ class QuestionListViewModel: ObservableObject {
             isLoading = true
         }
         
-        // Include last update time in request
-        let request = QuestionRequest(
-            action: "get_questions",
-            lastUpdate: lastUpdate
-        )
+        // Only ask for what changed since the last sync
+        let request = ChangesRequest(since: lastSeq, epoch: epoch)
         
         socketService.send(request) { [weak self] result in
             DispatchQueue.main.async {
@@ -67,16 +70,9 @@ class QuestionListViewModel: ObservableObject {
                 switch result {
                 case .success(let data):
                     do {
-                        let response = try JSONDecoder.shared.decode(ServerResponse.self, from: data)
+                        let response = try JSONDecoder.shared.decode(ChangesResponse.self, from: data)
                         if response.status == "success" {
-                            // Update lastUpdate timestamp
-                            self?.lastUpdate = response.lastModified
-                            
-                            // Only update questions if there are changes
-                            if let questions = response.data {
-                                self?.questions = questions
-                                print("✅ Updated questions list with \(questions.count) questions")
-                            }
+                            self?.applyChanges(response)
                         } else {
                             print("❌ Server returned error: \(response.message ?? "Unknown error")")
                             self?.errorMessage = response.message
@@ -93,6 +89,140 @@ class QuestionListViewModel: ObservableObject {
         }
     }
     
+    // The server pushes changes as they happen instead of being polled for them
+    private func startLiveUpdates() {
+        socketService.pushHandler = { [weak self] data in
+            self?.handlePush(data)
+        }
+        
+        // Runs again after every reconnect: catch up on whatever was missed, then pushes take over
+        socketService.subscribe(SubscribeRequest()) { [weak self] result in
+            DispatchQueue.main.async {
+                if case .success(let data) = result,
+                   let response = try? JSONDecoder.shared.decode(ServerResponse.self, from: data),
+                   response.status != "success" {
+                    print("⚠️ Subscriptions unavailable, polling instead: \(response.message ?? "")")
+                    self?.startAutoRefresh()
+                }
+                self?.loadQuestions()
+            }
+        }
+    }
+    
+    private func handlePush(_ data: Data) {
+        do {
+            let push = try JSONDecoder.shared.decode(PushMessage.self, from: data)
+            if push.event == "resync" {
+                // Some pushes were dropped while we were behind
+                loadQuestions()
+            } else {
+                applyEvents(push.changes ?? [])
+            }
+        } catch {
+            print("❌ Push decoding error: \(error)")
+        }
+    }
+    
+    private func applyEvents(_ events: [ChangeEvent]) {
+        guard !events.isEmpty else { return }
+        var updated = questions
+        var needsSort = false
+        
+        for event in events {
+            switch event.type {
+            case "question_added":
+                guard let question = event.question else { continue }
+                if let index = updated.firstIndex(where: { $0.id == question.id }) {
+                    updated[index] = question
+                } else {
+                    updated.append(question)
+                }
+                needsSort = true
+            case "answer_added":
+                guard let answer = event.answer,
+                      let index = updated.firstIndex(where: { $0.id == event.questionId }) else { continue }
+                if let answerIndex = updated[index].answers.firstIndex(where: { $0.id == answer.id }) {
+                    updated[index].answers[answerIndex] = answer
+                } else {
+                    updated[index].answers.append(answer)
+                }
+            case "answer_deleted":
+                guard let index = updated.firstIndex(where: { $0.id == event.questionId }) else { continue }
+                updated[index].answers.removeAll { $0.id == event.answerId }
+            case "question_deleted":
+                updated.removeAll { $0.id == event.questionId }
+            case "votes":
+                guard let index = updated.firstIndex(where: { $0.id == event.questionId }) else { continue }
+                updated[index].upvotes = event.upvotes ?? updated[index].upvotes
+                updated[index].downvotes = event.downvotes ?? updated[index].downvotes
+                updated[index].votes = event.votes ?? updated[index].upvotes - updated[index].downvotes
+                for (userId, vote) in event.userVotes ?? [:] {
+                    updated[index].userVotes[userId] = vote == .none ? nil : vote
+                }
+            default:
+                continue
+            }
+        }
+        
+        if needsSort {
+            updated.sort { $0.createdDate > $1.createdDate }
+        }
+        questions = updated
+    }
+    
+    private func applyChanges(_ changes: ChangesResponse) {
+        lastSeq = changes.seq
+        epoch = changes.epoch
+        
+        if changes.reset == true {
+            questions = changes.questions ?? []
+            print("✅ Updated questions list with \(questions.count) questions")
+            return
+        }
+        
+        let changedQuestions = changes.questions ?? []
+        let changedAnswers = changes.answers ?? []
+        let deletedQuestions = Set(changes.deletedQuestions ?? [])
+        let deletedAnswers = changes.deletedAnswers ?? []
+        
+        // Nothing changed, leave the published list alone
+        if changedQuestions.isEmpty && changedAnswers.isEmpty && deletedQuestions.isEmpty && deletedAnswers.isEmpty {
+            return
+        }
+        
+        var updated = questions
+        updated.removeAll { deletedQuestions.contains($0.id) }
+        
+        for question in changedQuestions {
+            if let index = updated.firstIndex(where: { $0.id == question.id }) {
+                updated[index] = question
+            } else {
+                updated.append(question)
+            }
+        }
+        
+        for change in changedAnswers {
+            guard let index = updated.firstIndex(where: { $0.id == change.questionId }) else { continue }
+            if let answerIndex = updated[index].answers.firstIndex(where: { $0.id == change.answer.id }) {
+                updated[index].answers[answerIndex] = change.answer
+            } else {
+                updated[index].answers.append(change.answer)
+            }
+        }
+        
+        for deleted in deletedAnswers {
+            guard let index = updated.firstIndex(where: { $0.id == deleted.questionId }) else { continue }
+            updated[index].answers.removeAll { $0.id == deleted.answerId }
+        }
+        
+        if !changedQuestions.isEmpty {
+            updated.sort { $0.createdDate > $1.createdDate }
+        }
+        
+        questions = updated
+        print("✅ Applied changes up to \(changes.seq ?? 0)")
+    }
+    
     func addQuestion(_ question: Question) {
         print("⬆️ Adding question: \(question.title)")
         let request = QuestionRequest(action: "add_question", question: question)
@@ -166,6 +296,9 @@ class QuestionListViewModel: ObservableObject {
                             print("✅ Answer deleted successfully")
                             if let updatedQuestions = response.data {
                                 self?.questions = updatedQuestions
+                            } else {
+                                // Compact acknowledgement, pull just the delta
+                                self?.loadQuestions()
                             }
                             // Dismiss the view if needed
                             // self?.presentationMode.wrappedValue.dismiss()
@@ -206,6 +339,9 @@ class QuestionListViewModel: ObservableObject {
                             // Update local state with server response
                             if let updatedQuestions = response.data {
                                 self?.questions = updatedQuestions
+                            } else {
+                                // Compact acknowledgement, pull just the delta
+                                self?.loadQuestions()
                             }
                         } else {
                             print("❌ Server returned error: \(response.message ?? "Unknown error")")
@@ -229,9 +365,21 @@ class QuestionListViewModel: ObservableObject {
         }
     }
     
-    func vote(on questionId: String, voteType: VoteType) {
+    func vote(on questionId: String, voteType: VoteType, userId: String) {
         guard let index = questions.firstIndex(where: { $0.id == questionId }) else { return }
         
+        // Each user holds one vote per question; repeating it is a no-op, switching moves it
+        let previous = questions[index].userVotes[userId] ?? .none
+        guard previous != voteType else { return }
+        
+        switch previous {
+        case .upvote:
+            questions[index].upvotes -= 1
+        case .downvote:
+            questions[index].downvotes -= 1
+        case .none:
+            break
+        }
         switch voteType {
         case .upvote:
             questions[index].upvotes += 1
@@ -241,7 +389,27 @@ class QuestionListViewModel: ObservableObject {
             break
         }
         
+        questions[index].userVotes[userId] = voteType == .none ? nil : voteType
         questions[index].votes = questions[index].upvotes - questions[index].downvotes
+        
+        let request = VoteRequest(questionId: questionId, voteType: voteType, userId: userId)
+        socketService.send(request) { [weak self] result in
+            DispatchQueue.main.async {
+                switch result {
+                case .success(let data):
+                    if let response = try? JSONDecoder.shared.decode(ServerResponse.self, from: data),
+                       response.status != "success" {
+                        print("❌ Vote rejected: \(response.message ?? "Unknown error")")
+                        self?.errorMessage = response.message
+                        self?.loadQuestions()
+                    }
+                case .failure(let error):
+                    print("❌ Failed to vote: \(error)")
+                    self?.errorMessage = error.localizedDescription
+                    self?.loadQuestions()
+                }
+            }
+        }
     }
     
     func debugPrintQuestions() {
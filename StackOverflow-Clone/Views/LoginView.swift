@@ -145,6 +145,7 @@ struct LoginView: View {
                             self.toastMessage = "Login successful!"
                             self.showToast = true
                             userSession.username = response.username
+                            userSession.token = response.token
                             
                             // Delay closing the view until after the toast
                             DispatchQueue.main.asyncAfter(deadline: .now() + 0.8) {
@@ -16,7 +16,7 @@ struct ProfileView: View {
             // Logout button
             Button(action: {
                 // Perform logout
-                userSession.username = nil
+                userSession.logout()
                 presentationMode.wrappedValue.dismiss()
             }) {
                 Text("Logout")
@@ -242,7 +242,8 @@ struct QuestionRowView: View {
     
     
     private func vote(_ type: VoteType) {
-        viewModel.vote(on: question.id, voteType: type)
+        guard let username = userSession.username else { return }
+        viewModel.vote(on: question.id, voteType: type, userId: username)
     }
     
     private func deleteQuestion() {
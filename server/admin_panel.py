@@ -1,15 +1,284 @@
 import customtkinter as ctk
 from tkinter import ttk, messagebox
-import pickle
 from datetime import datetime
 import json
+import socket
+import threading
+import queue
+import argparse
+from snapshot import JOURNAL_PATH, SNAPSHOT_PATH, open_database, write_snapshot
+from schema import normalize_question, normalize_user
+from framing import FrameDecoder, send_frame
+
+# Rows inserted into a table at a time, as it is scrolled towards the bottom
+PAGE_SIZE = 200
+
+
+def read_database():
+    """The saved database as a dict, from the snapshot or else the legacy pickle"""
+    database = open_database()
+    try:
+        return {
+            "questions": list(database["questions"]),
+            "users": database["users"],
+            "journal_seq": database["journal_seq"],
+        }
+    finally:
+        database["close"]()
+
+
+def read_users():
+    """Users from the saved database, plus sign-ups the server has only journaled so far"""
+    database = open_database()
+    database["close"]()
+    users = database["users"]
+    try:
+        with open(JOURNAL_PATH, "rb") as f:
+            for line in f:
+                # Only user records matter here, so skip parsing everything else
+                if b'"op":"put_user"' not in line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # a record the server is still writing
+                users[record["email"]] = record["user"]
+    except FileNotFoundError:
+        pass
+    return users
+
+
+def question_fields(question):
+    """A question's columns, apart from the answer count"""
+    return (
+        question.get("title", "N/A"),
+        question.get("author_id", "N/A"),
+        question.get("created_date", "N/A"),
+        ", ".join(question.get("tags", [])),
+    )
+
+
+def user_row(email, user):
+    return (
+        user.get("username", "N/A"),
+        email,
+        user.get("created_date", "N/A"),
+        "🗑️",  # Delete action
+    )
+
+
+def diff_rows(old, new):
+    """(changed (key, row) pairs in new's order, removed keys) between two key -> row dicts"""
+    changed = [(key, row) for key, row in new.items() if old.get(key) != row]
+    removed = [key for key in old if key not in new]
+    return changed, removed
+
+
+class DataLoader:
+    """Loads the panel's rows away from the Tk thread and works out what changed.
+
+    Questions come from the running server's get_changes sync API, so after the
+    first load a refresh only transfers what changed since the last one. When
+    the server is not running the saved database is read instead and compared
+    with the previous load. Either way the panel only receives the difference.
+    The server has no action listing users, so they are always read from the
+    saved files.
+    """
+
+    def __init__(self, host="127.0.0.1", port=54321):
+        self.address = (host, port)
+        self.source = None
+        self.seq = None
+        self.epoch = None
+        self.questions = {}  # question id -> fields from question_fields
+        self.answers = {}    # question id -> answer ids
+        self.users = {}      # email -> row
+
+    def question_row(self, question_id):
+        title, author, created_date, tags = self.questions[question_id]
+        return (title, author, created_date, len(self.answers[question_id]), tags)
+
+    def question_rows(self):
+        return {question_id: self.question_row(question_id) for question_id in self.questions}
+
+    def load(self):
+        """Everything that changed since the previous load, as a dict of changed and removed rows"""
+        old_rows = self.question_rows()
+        try:
+            changed, removed = self.sync_from_server(old_rows)
+        except OSError:
+            # No server running: read the saved database instead
+            changed, removed = self.read_from_file(old_rows)
+
+        users = {email: user_row(email, user) for email, user in read_users().items()}
+        changed_users, removed_users = diff_rows(self.users, users)
+        self.users = users
+        return {
+            "source": self.source,
+            "questions": changed,
+            "removed_questions": removed,
+            "users": changed_users,
+            "removed_users": removed_users,
+            "question_count": len(self.questions),
+            "user_count": len(self.users),
+        }
+
+    def call(self, sock, decoder, request):
+        send_frame(sock, json.dumps(request).encode("utf-8"))
+        frames = []
+        while not frames:
+            data = sock.recv(1 << 20)
+            if not data:
+                raise ConnectionError("Server closed the connection")
+            frames = decoder.feed(data)
+        response = json.loads(frames[0])
+        if response.get("status") != "success":
+            raise ConnectionError(response.get("message", "Request failed"))
+        return response
+
+    def sync_from_server(self, old_rows):
+        since = self.seq if self.source == "server" else None
+        with socket.create_connection(self.address, timeout=5) as sock:
+            sock.settimeout(60)
+            decoder = FrameDecoder()
+            self.call(sock, decoder, {"action": "negotiate", "compression": ["deflate"]})
+            response = self.call(sock, decoder, {"action": "get_changes", "since": since, "epoch": self.epoch})
+        self.source = "server"
+        self.seq = response["seq"]
+        self.epoch = response["epoch"]
+
+        if response["reset"]:
+            # A first load, or the server restarted: compare everything against what is shown
+            self.questions = {}
+            self.answers = {}
+            for question in response["questions"]:
+                self.questions[question["id"]] = question_fields(question)
+                self.answers[question["id"]] = {answer["id"] for answer in question.get("answers", [])}
+            return diff_rows(old_rows, self.question_rows())
+
+        touched = set()
+        for question in response["questions"]:
+            self.questions[question["id"]] = question_fields(question)
+            self.answers[question["id"]] = {answer["id"] for answer in question.get("answers", [])}
+            touched.add(question["id"])
+        for change in response["answers"]:
+            if change["questionId"] in self.answers:
+                self.answers[change["questionId"]].add(change["answer"]["id"])
+                touched.add(change["questionId"])
+        for deleted in response["deleted_answers"]:
+            if deleted["questionId"] in self.answers:
+                self.answers[deleted["questionId"]].discard(deleted["answerId"])
+                touched.add(deleted["questionId"])
+        removed = []
+        for question_id in response["deleted_questions"]:
+            if self.questions.pop(question_id, None) is not None:
+                del self.answers[question_id]
+                removed.append(question_id)
+        touched.difference_update(removed)
+        changed = [(question_id, self.question_row(question_id)) for question_id in touched]
+        return [(key, row) for key, row in changed if old_rows.get(key) != row], removed
+
+    def read_from_file(self, old_rows):
+        self.source = "file"
+        self.seq = self.epoch = None
+        self.questions = {}
+        self.answers = {}
+        for question in read_database().get("questions", []):
+            self.questions[question["id"]] = question_fields(question)
+            self.answers[question["id"]] = {answer["id"] for answer in question.get("answers", [])}
+        return diff_rows(old_rows, self.question_rows())
+
+
+class PagedTable:
+    """One table's rows, all kept in memory but inserted into its Treeview a page at a time.
+
+    Treeview items are keyed by the row key (question id or email), so a
+    refresh updates, inserts or deletes just the rows that changed. New rows go
+    on top when the table lists the newest first, else at the end.
+    """
+
+    def __init__(self, new_first=False):
+        self.new_first = new_first
+        self.keys = []   # display order
+        self.rows = {}   # key -> values
+        self.tree = None
+        self.scrollbar = None
+        self.shown = 0   # leading keys inserted into the tree
+        self.more_pending = False
+
+    def attach(self, tree, scrollbar):
+        """Show the rows in a new Treeview, starting with the first page"""
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.shown = 0
+        tree.configure(yscrollcommand=self.on_scroll)
+        self.show_more()
+
+    def detach(self):
+        self.tree = None
+        self.scrollbar = None
+
+    def on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        # Near the bottom of what is inserted: add the next page once Tk is idle
+        if float(last) > 0.9 and self.shown < len(self.keys) and not self.more_pending:
+            self.more_pending = True
+            self.tree.after_idle(self.show_more)
+
+    def show_more(self):
+        self.more_pending = False
+        if self.tree is None:
+            return
+        end = min(self.shown + PAGE_SIZE, len(self.keys))
+        for key in self.keys[self.shown:end]:
+            self.tree.insert("", "end", iid=key, values=self.rows[key])
+        self.shown = end
+
+    def apply(self, changed, removed):
+        for key in removed:
+            if self.rows.pop(key, None) is None:
+                continue
+            index = self.keys.index(key)
+            del self.keys[index]
+            if index < self.shown:
+                self.shown -= 1
+                if self.tree is not None:
+                    self.tree.delete(key)
+
+        new = []
+        for key, values in changed:
+            if key not in self.rows:
+                new.append(key)
+            elif self.tree is not None and self.tree.exists(key):
+                self.tree.item(key, values=values)
+            self.rows[key] = values
+        if not new:
+            return
+
+        if self.new_first:
+            self.keys[:0] = new
+            if self.tree is not None and len(new) <= PAGE_SIZE:
+                for key in reversed(new):
+                    self.tree.insert("", 0, iid=key, values=self.rows[key])
+                self.shown += len(new)
+            elif self.tree is not None:
+                # Too many to insert at once (a first load): start over from the first page
+                self.tree.delete(*self.tree.get_children())
+                self.shown = 0
+                self.show_more()
+        else:
+            all_shown = self.shown == len(self.keys)
+            self.keys.extend(new)
+            # Appended rows only need inserting if the end of the table is showing
+            if self.tree is not None and all_shown:
+                self.show_more()
 
 # Set theme and color scheme
 ctk.set_appearance_mode("dark")
 
 
 class AdminPanel:
-    def __init__(self):
+    def __init__(self, host="127.0.0.1", port=54321):
         self.root = ctk.CTk()
         self.root.title("Stack Overflow Admin Panel")
         self.root.geometry("1400x800")
@@ -25,12 +294,21 @@ class AdminPanel:
         )
         self.style.configure("Treeview.Heading", background="#ff9800", foreground="white", font=('Arial', 12, 'bold'))
 
-        # Load data
-        self.load_data()
+        # Rows for each table; loading fills them in from a background thread
+        self.users_table = PagedTable()
+        self.questions_table = PagedTable(new_first=True)
+        self.loader = DataLoader(host, port)
+        self.loads = queue.Queue()
+        self.loading = False
+        self.announce_load = False
 
         # Create main layout
         self.create_layout()
 
+        # Load data
+        self.load_data()
+        self.root.after(100, self.poll_loads)
+
     def create_layout(self):
         # Create sidebar
         self.sidebar = ctk.CTkFrame(self.root, width=200, corner_radius=0)
@@ -110,7 +388,7 @@ class AdminPanel:
         # Users count
         self.users_count_label = ctk.CTkLabel(
             stats_frame,
-            text=f"Total Users: {len(self.users)}",
+            text="Total Users: ...",
             font=ctk.CTkFont(size=14),
             text_color="white"
         )
@@ -119,12 +397,21 @@ class AdminPanel:
         # Questions count
         self.questions_count_label = ctk.CTkLabel(
             stats_frame,
-            text=f"Total Questions: {len(self.questions)}",
+            text="Total Questions: ...",
             font=ctk.CTkFont(size=14),
             text_color="white"
         )
         self.questions_count_label.pack(pady=5)
 
+        # Where the data came from, or that it is still loading
+        self.source_label = ctk.CTkLabel(
+            stats_frame,
+            text="Loading...",
+            font=ctk.CTkFont(size=12),
+            text_color="white"
+        )
+        self.source_label.pack(pady=5)
+
     def create_table(self, parent, columns):
         # Create a frame for the table using tkinter Frame instead of CTkFrame
         table_frame = ttk.Frame(parent)
@@ -148,13 +435,18 @@ class AdminPanel:
         tree.configure(yscrollcommand=y_scrollbar.set, xscrollcommand=x_scrollbar.set)
         tree.pack(fill="both", expand=True)
 
-        return tree
+        return tree, y_scrollbar
 
-    def show_users(self):
-        # Clear main content
+    def clear_main_content(self):
+        self.users_table.detach()
+        self.questions_table.detach()
         for widget in self.main_content.winfo_children():
             widget.destroy()
 
+    def show_users(self):
+        # Clear main content
+        self.clear_main_content()
+
         # Header
         header_frame = ctk.CTkFrame(self.main_content, fg_color="transparent")
         header_frame.pack(fill="x", pady=10)
@@ -167,13 +459,12 @@ class AdminPanel:
 
         # Create users table
         columns = ("Username", "Email", "Created Date", "Actions")
-        self.users_tree = self.create_table(self.main_content, columns)  # Ensure users_tree is created
-        self.populate_users()
+        self.users_tree, scrollbar = self.create_table(self.main_content, columns)
+        self.users_table.attach(self.users_tree, scrollbar)
 
     def show_questions(self):
         # Clear main content
-        for widget in self.main_content.winfo_children():
-            widget.destroy()
+        self.clear_main_content()
 
         # Header
         header_frame = ctk.CTkFrame(self.main_content, fg_color="transparent")
@@ -187,108 +478,74 @@ class AdminPanel:
 
         # Create questions table
         columns = ("Title", "Author", "Created Date", "Answers", "Tags")
-        self.questions_tree = self.create_table(self.main_content, columns)
-        self.populate_questions()
+        self.questions_tree, scrollbar = self.create_table(self.main_content, columns)
+        self.questions_table.attach(self.questions_tree, scrollbar)
 
     def load_data(self):
-        try:
-            with open("server/database.pkl", "rb") as f:
-                self.data = pickle.load(f)
-                # Ensure data is a dictionary
-                if isinstance(self.data, list):
-                    self.users = {}
-                    self.questions = self.data  # Assuming the list contains questions
-                else:
-                    self.users = self.data.get("users", {})
-                    self.questions = self.data.get("questions", [])
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to load database: {str(e)}")
-            self.data = {"users": {}, "questions": []}
-            self.users = {}
-            self.questions = []
-
-    def populate_users(self):
-        # Check if users_tree is initialized
-        if not hasattr(self, "users_tree") or self.users_tree is None:
-            messagebox.showerror("Error", "Users view is not initialized.")
+        """Start loading in the background; poll_loads applies the result on the Tk thread"""
+        if self.loading:
             return
+        self.loading = True
+        self.source_label.configure(text="Loading...")
+        threading.Thread(target=self.load_in_background, name="admin-loader", daemon=True).start()
 
-        # Clear existing items
-        for item in self.users_tree.get_children():
-            self.users_tree.delete(item)
-
-        # Add users to treeview
-        for email, user in self.users.items():
-            created_date = user.get("created_date", "N/A")
-            self.users_tree.insert(
-                "",
-                "end",
-                values=(
-                    user.get("username", "N/A"),
-                    email,
-                    created_date,
-                    "🗑️",  # Delete action
-                ),
-            )
-
-    def populate_questions(self):
-        # Check if questions_tree is initialized
-        if not hasattr(self, "questions_tree") or self.questions_tree is None:
-            messagebox.showerror("Error", "Questions view is not initialized.")
-            return
+    def load_in_background(self):
+        try:
+            self.loads.put(("loaded", self.loader.load()))
+        except Exception as e:
+            self.loads.put(("error", e))
 
-        # Clear existing items
-        for item in self.questions_tree.get_children():
-            self.questions_tree.delete(item)
-
-        # Add questions to treeview
-        for question in self.questions:
-            self.questions_tree.insert(
-                "",
-                "end",
-                values=(
-                    question.get("title", "N/A"),
-                    question.get("author_id", question.get("authorId", "N/A")),  # Check both author_id and authorId
-                    question.get("created_date", "N/A"),
-                    len(question.get("answers", [])),
-                    ", ".join(question.get("tags", [])),
-                ),
-            )
+    def poll_loads(self):
+        try:
+            while True:
+                kind, result = self.loads.get_nowait()
+                self.loading = False
+                if kind == "error":
+                    self.source_label.configure(text="Load failed")
+                    messagebox.showerror("Error", f"Failed to load database: {str(result)}")
+                else:
+                    self.apply_load(result)
+        except queue.Empty:
+            pass
+        self.root.after(100, self.poll_loads)
 
-    def refresh_data(self):
-        self.load_data()
-        if hasattr(self, "users_tree") and self.users_tree:
-            self.populate_users()
-        if hasattr(self, "questions_tree") and self.questions_tree:
-            self.populate_questions()
+    def apply_load(self, changes):
+        # Only the rows that changed touch the tables
+        self.users_table.apply(changes["users"], changes["removed_users"])
+        self.questions_table.apply(changes["questions"], changes["removed_questions"])
 
         # Update statistics
-        self.users_count_label.configure(text=f"Total Users: {len(self.users)}")
-        self.questions_count_label.configure(text=f"Total Questions: {len(self.questions)}")
+        self.users_count_label.configure(text=f"Total Users: {changes['user_count']}")
+        self.questions_count_label.configure(text=f"Total Questions: {changes['question_count']}")
+        if changes["source"] == "server":
+            self.source_label.configure(text=f"Live from server (seq {self.loader.seq})")
+        else:
+            self.source_label.configure(text="From database file")
 
-        # Show success message
-        messagebox.showinfo("Success", "Data refreshed successfully!")
+        if self.announce_load:
+            self.announce_load = False
+            changed = len(changes["users"]) + len(changes["questions"])
+            removed = len(changes["removed_users"]) + len(changes["removed_questions"])
+            # Show success message
+            messagebox.showinfo("Success", f"Data refreshed successfully! {changed} rows changed, {removed} removed.")
+
+    def refresh_data(self):
+        self.announce_load = True
+        self.load_data()
 
     def save_question(self, question_data):
         try:
-            with open("server/database.pkl", "rb") as f:
-                data = pickle.load(f)
+            data = read_database()
 
             if isinstance(data, dict):
-                # Ensure the author_id is properly set
-                if "authorId" in question_data:
-                    question_data["author_id"] = question_data["authorId"]
-                elif "author_id" in question_data:
-                    question_data["authorId"] = question_data["author_id"]
-                
-                questions = data.get("questions", [])
-                questions.append(question_data)
-                data["questions"] = questions
-
-                with open("server/database.pkl", "wb") as f:
-                    pickle.dump(data, f)
-
-                print(f"Data saved successfully - {len(questions)} questions and {len(data.get('users', {}))} users")
+                # Snapshots only hold canonical records, whatever shape the old database had
+                questions = [normalize_question(question) for question in data.get("questions", [])]
+                questions.append(normalize_question(question_data))
+                users = {email: normalize_user(email, user) for email, user in data.get("users", {}).items()}
+
+                write_snapshot(SNAPSHOT_PATH, questions, users, data.get("journal_seq", 0))
+
+                print(f"Data saved successfully - {len(questions)} questions and {len(users)} users")
                 messagebox.showinfo("Success", "Question saved successfully!")
             else:
                 print("Error: Loaded data is not a dictionary.")
@@ -320,5 +577,9 @@ class AdminPanel:
 
 
 if __name__ == "__main__":
-    admin_panel = AdminPanel()
+    parser = argparse.ArgumentParser(description="Stack Overflow clone admin panel")
+    parser.add_argument("--host", default="127.0.0.1", help="server to read live data from")
+    parser.add_argument("--port", type=int, default=54321)
+    args = parser.parse_args()
+    admin_panel = AdminPanel(args.host, args.port)
     admin_panel.run()
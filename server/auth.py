@@ -0,0 +1,133 @@
+import base64
+import hashlib
+import hmac
+import itertools
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Stored passwords look like pbkdf2_sha256$<iterations>$<salt>$<hash>; anything
+# else is a plaintext password from before hashing, replaced at the next login
+ALGORITHM = 'pbkdf2_sha256'
+DEFAULT_ITERATIONS = 600000
+SALT_BYTES = 16
+
+
+def encode_password(password, iterations, salt=None):
+    salt = salt or os.urandom(SALT_BYTES)
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, iterations)
+    return '$'.join((
+        ALGORITHM,
+        str(iterations),
+        base64.b64encode(salt).decode('ascii'),
+        base64.b64encode(digest).decode('ascii'),
+    ))
+
+
+def is_hashed(stored):
+    return isinstance(stored, str) and stored.startswith(ALGORITHM + '$')
+
+
+def check_password(stored, password, iterations):
+    """(matches, needs_rehash) for a stored hash or a legacy plaintext password.
+
+    needs_rehash is set when the password matched but is stored in plaintext or
+    with a different iteration count than the current setting.
+    """
+    if not stored:
+        return False, False  # no password set, so nothing can match
+    if not is_hashed(stored):
+        matches = hmac.compare_digest(str(stored).encode('utf-8'), password.encode('utf-8'))
+        return matches, matches
+    try:
+        _, rounds, salt, expected = stored.split('$')
+        rounds = int(rounds)
+        salt = base64.b64decode(salt)
+        expected = base64.b64decode(expected)
+    except ValueError:
+        return False, False
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, rounds)
+    matches = hmac.compare_digest(digest, expected)
+    return matches, matches and rounds != iterations
+
+
+class PasswordHasher:
+    """Hashes and verifies passwords on a small thread pool.
+
+    hashlib releases the GIL while it hashes, so verifications run side by side
+    on every core while connection threads and the event loop keep serving
+    other requests. The pool size also caps how many hashes compete for CPU
+    when a burst of logins arrives.
+    """
+
+    def __init__(self, iterations=DEFAULT_ITERATIONS, threads=None):
+        self.iterations = iterations
+        self.pool = ThreadPoolExecutor(threads or os.cpu_count() or 1, thread_name_prefix='password-hash')
+        self.dummy = None
+
+    def hash(self, password):
+        return self.pool.submit(encode_password, password, self.iterations).result()
+
+    def hash_many(self, passwords):
+        return list(self.pool.map(encode_password, passwords, itertools.repeat(self.iterations)))
+
+    def verify(self, stored, password):
+        """(matches, needs_rehash); stored is None for an unknown user"""
+        if stored is None:
+            # Do the same work as a wrong password, so a miss doesn't reveal which emails exist
+            if self.dummy is None:
+                self.dummy = encode_password('', self.iterations)
+            self.pool.submit(check_password, self.dummy, password, self.iterations).result()
+            return False, False
+        return self.pool.submit(check_password, stored, password, self.iterations).result()
+
+    def close(self):
+        self.pool.shutdown(wait=False)
+
+
+class TokenCache:
+    """Session token -> user email, bounded and expiring.
+
+    Every token lives for the same ttl, so insertion order is also expiry
+    order: expired tokens are dropped from the front of the OrderedDict as new
+    ones are issued, and when the cache is full the oldest session is evicted.
+    Lookups are one dict access.
+    """
+
+    def __init__(self, max_tokens=100000, ttl=24 * 60 * 60):
+        self.max_tokens = max_tokens
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.tokens = OrderedDict()  # token -> (email, expires at, monotonic)
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def issue(self, email):
+        token = secrets.token_urlsafe(32)
+        now = time.monotonic()
+        with self.lock:
+            while self.tokens:
+                oldest = next(iter(self.tokens.values()))
+                if oldest[1] > now and len(self.tokens) < self.max_tokens:
+                    break
+                self.tokens.popitem(last=False)
+            self.tokens[token] = (email, now + self.ttl)
+        return token
+
+    def lookup(self, token):
+        """The email a live token belongs to, or None"""
+        entry = self.tokens.get(token)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            self.revoke(token)
+            return None
+        return entry[0]
+
+    def revoke(self, token):
+        with self.lock:
+            self.tokens.pop(token, None)
@@ -0,0 +1,267 @@
+import json
+import queue
+import threading
+from collections import defaultdict
+
+from framing import encode_frame, frame_header, send_frame
+from records import encode_record
+
+# Subscription topics: every question, one question id, or one tag
+ALL = ('all',)
+# Sent instead of the changes a subscriber fell too far behind to receive; the
+# client catches up with get_changes
+RESYNC = b'{"event":"resync"}'
+
+
+def question_topics(question_id, tags):
+    return [ALL, ('question', question_id), *(('tag', tag) for tag in tags or ())]
+
+
+def op_event(op, result, question):
+    """(topics, event) for a journal operation the store applied, or None if nothing changed.
+
+    question is the affected question record; for deletions, as it was before.
+    """
+    kind = op['op']
+    if result is None or question is None:
+        return None
+    if kind == 'add_question':
+        event = {'type': 'question_added', 'question': result}
+    elif kind == 'add_answer':
+        event = {'type': 'answer_added', 'questionId': op['question_id'], 'answer': op['answer']}
+    elif kind == 'delete_answer':
+        event = {'type': 'answer_deleted', 'questionId': op['question_id'], 'answerId': op['answer_id']}
+    elif kind == 'delete_question':
+        event = {'type': 'question_deleted', 'questionId': op['question_id']}
+    else:
+        return None
+    return question_topics(question['id'], question['tags']), event
+
+
+def vote_events(batch, store):
+    """One event per question in a flushed vote batch: new totals plus the votes that changed"""
+    changed = defaultdict(dict)
+    for question_id, user_id, value in batch:
+        changed[question_id][user_id] = value
+    events = []
+    for question_id, user_votes in changed.items():
+        question = store.get(question_id)
+        if question is None:
+            continue
+        events.append((question_topics(question_id, question['tags']), {
+            'type': 'votes',
+            'questionId': question_id,
+            'upvotes': question['upvotes'],
+            'downvotes': question['downvotes'],
+            'votes': question['votes'],
+            'user_votes': user_votes,
+        }))
+    return events
+
+
+class Subscriber:
+    """One connection's topics and how pushes reach it.
+
+    deliver(payload, compressed) must not block; session is the connection's
+    negotiated settings, read at send time for its compression.
+    """
+
+    def __init__(self, deliver, session):
+        self.deliver = deliver
+        self.session = session
+        self.topics = set()
+
+
+class ChangeFeed:
+    """Fans out change events to subscribed connections in batches.
+
+    Writers only append to a pending list. A feed thread wakes at most every
+    `interval` seconds, encodes each pending event once and sends every
+    subscriber a single frame with the events it asked for. Subscribers to
+    everything share one encoded (and compressed) payload, as does each group
+    of subscribers matching the same events, so the cost of a batch grows with
+    the number of distinct subscriptions rather than the number of connections.
+    """
+
+    def __init__(self, compress, interval=0.05, max_topics=100):
+        self.compress = compress  # compress(payload, compression) -> (payload, compressed)
+        self.interval = interval
+        self.max_topics = max_topics
+        self.lock = threading.Lock()
+        self.ready = threading.Condition(self.lock)
+        self.by_topic = defaultdict(set)
+        self.subscribers = 0
+        self.pending = []
+        self.closed = False
+        self.batches = 0
+        # Runs fanout(batch); the asyncio server swaps in one that hops onto its event loop
+        self.execute = lambda fn, *args: fn(*args)
+        self.thread = threading.Thread(target=self._run, name='change-feed', daemon=True)
+        self.thread.start()
+
+    def subscribe(self, subscriber, topic):
+        with self.lock:
+            if topic in subscriber.topics:
+                return True
+            if len(subscriber.topics) >= self.max_topics:
+                return False
+            if not subscriber.topics:
+                self.subscribers += 1
+            subscriber.topics.add(topic)
+            self.by_topic[topic].add(subscriber)
+            return True
+
+    def unsubscribe(self, subscriber, topic=None):
+        """Drop one topic, or all of them"""
+        with self.lock:
+            topics = [topic] if topic is not None else list(subscriber.topics)
+            for topic in topics:
+                if topic not in subscriber.topics:
+                    continue
+                subscriber.topics.discard(topic)
+                subscribers = self.by_topic[topic]
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self.by_topic[topic]
+            if topics and not subscriber.topics:
+                self.subscribers -= 1
+
+    def publish(self, events):
+        """Queue (topics, event) pairs for the next batch"""
+        if not self.subscribers or not events:
+            return
+        with self.lock:
+            self.pending.extend(events)
+            self.ready.notify()
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.ready.notify()
+
+    def _run(self):
+        while True:
+            with self.lock:
+                while not self.pending and not self.closed:
+                    self.ready.wait()
+                if self.closed:
+                    return
+                # Let a burst of writes collect into one batch
+                self.ready.wait_for(lambda: self.closed, self.interval)
+                batch = self.pending
+                self.pending = []
+            self.batches += 1
+            self.execute(self.fanout, batch)
+
+    def fanout(self, batch):
+        encoded = [json.dumps(event, separators=(',', ':'), default=encode_record).encode('utf-8') for _, event in batch]
+        with self.lock:
+            everything = list(self.by_topic.get(ALL, ()))
+            matches = defaultdict(list)  # subscriber -> indexes of the events it wants
+            for i, (topics, _) in enumerate(batch):
+                for topic in topics:
+                    if topic == ALL:
+                        continue
+                    for subscriber in self.by_topic.get(topic, ()):
+                        wanted = matches[subscriber]
+                        if not wanted or wanted[-1] != i:
+                            wanted.append(i)
+
+        groups = defaultdict(list)
+        if everything:
+            groups[tuple(range(len(batch)))] = everything
+            everything = set(everything)
+        for subscriber, wanted in matches.items():
+            if subscriber not in everything:
+                groups[tuple(wanted)].append(subscriber)
+
+        for wanted, subscribers in groups.items():
+            payload = b'{"event":"changes","changes":[' + b','.join(encoded[i] for i in wanted) + b']}'
+            framed = {}  # compression -> (payload, compressed)
+            for subscriber in subscribers:
+                compression = subscriber.session['compression']
+                frame = framed.get(compression)
+                if frame is None:
+                    frame = framed[compression] = self.compress(payload, compression)
+                subscriber.deliver(*frame)
+
+
+class ThreadSender:
+    """Delivers pushes to a threaded-mode connection from its own sender thread.
+
+    Pushes wait in a bounded queue so a slow client never holds up the feed.
+    When it fills, the backlog is thrown away and replaced by one resync.
+    send_lock is shared with the connection's responses so frames never interleave.
+    """
+
+    def __init__(self, sock, send_lock, max_pending=256):
+        self.sock = sock
+        self.send_lock = send_lock
+        self.queue = queue.Queue(max_pending)
+        self.overflowed = False
+        self.closed = False
+        threading.Thread(target=self._run, name='push-sender', daemon=True).start()
+
+    def __call__(self, payload, compressed):
+        if self.overflowed or self.closed:
+            return
+        try:
+            self.queue.put_nowait((payload, compressed))
+        except queue.Full:
+            self.overflowed = True
+
+    def close(self):
+        self.closed = True
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass  # the sender sees closed after its current item
+
+    def _run(self):
+        while not self.closed:
+            item = self.queue.get()
+            if item is None or self.closed:
+                return
+            if self.overflowed:
+                # Replace the backlog with a single resync
+                try:
+                    while True:
+                        if self.queue.get_nowait() is None:
+                            return
+                except queue.Empty:
+                    pass
+                self.overflowed = False
+                item = (RESYNC, False)
+            try:
+                with self.send_lock:
+                    send_frame(self.sock, *item)
+            except OSError:
+                return
+
+
+class AsyncSender:
+    """Delivers pushes to an asyncio-mode connection; called on the event loop.
+
+    Frames go straight into the transport's buffer. Past max_buffer bytes of
+    unsent data, pushes are dropped and the next one is preceded by a resync.
+    """
+
+    def __init__(self, writer, max_buffer=4 * 1024 * 1024):
+        self.writer = writer
+        self.max_buffer = max_buffer
+        self.overflowed = False
+
+    def __call__(self, payload, compressed):
+        transport = self.writer.transport
+        if transport.is_closing():
+            return
+        if transport.get_write_buffer_size() > self.max_buffer:
+            self.overflowed = True
+            return
+        if self.overflowed:
+            self.overflowed = False
+            self.writer.write(encode_frame(RESYNC))
+        self.writer.writelines([frame_header(payload, compressed), payload])
+
+    def close(self):
+        pass
@@ -0,0 +1,41 @@
+import json
+
+import pytest
+
+from server import StackOverflowServer
+
+
+def start_server(**options):
+    """A server on whatever database is in ./server, without listening on a socket"""
+    return StackOverflowServer(**dict(
+        {'hash_iterations': 1000, 'connection_limits': {}, 'user_limits': {}, 'push_interval': 0.01}, **options
+    ))
+
+
+def stop_server(server):
+    server.close_storage()
+    server.server_socket.close()
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    """A server on an empty database in tmp_path, driven through handle_frame"""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'server').mkdir()
+    server = start_server()
+    yield server
+    stop_server(server)
+
+
+def session(**fields):
+    return dict({'compression': None, 'buckets': {}}, **fields)
+
+
+def call(server, connection=None, **request):
+    payload, _ = server.handle_frame(json.dumps(request).encode('utf-8'), connection or session())
+    return json.loads(payload)
+
+
+def new_question(question_id, author='alice', **fields):
+    return dict({'id': question_id, 'title': f'title {question_id}', 'body': 'body', 'author_id': author,
+                 'tags': ['swift']}, **fields)
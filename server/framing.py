@@ -0,0 +1,107 @@
+import asyncio
+import struct
+import zlib
+
+# Every message on the socket is a 4-byte big-endian payload length followed by
+# that many bytes of UTF-8 encoded JSON. This lets requests of any size arrive
+# split over several recv() calls and lets clients pipeline many requests.
+HEADER = struct.Struct('!I')
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+# The top bit of the length marks a payload compressed with raw deflate. Peers
+# only send such frames after agreeing on it with a 'negotiate' request.
+COMPRESSED_FLAG = 0x80000000
+
+
+class FrameError(Exception):
+    pass
+
+
+def frame_header(payload, compressed=False):
+    if len(payload) > MAX_FRAME_SIZE:
+        raise FrameError(f"Frame of {len(payload)} bytes exceeds limit of {MAX_FRAME_SIZE}")
+    return HEADER.pack(len(payload) | COMPRESSED_FLAG if compressed else len(payload))
+
+
+def encode_frame(payload, compressed=False):
+    return frame_header(payload, compressed) + payload
+
+
+def deflate(payload, level=6):
+    # Raw deflate (no zlib header) is what Apple's Compression framework reads
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return compressor.compress(payload) + compressor.flush()
+
+
+def inflate(payload, max_size=MAX_FRAME_SIZE):
+    decompressor = zlib.decompressobj(-15)
+    try:
+        data = decompressor.decompress(payload, max_size)
+    except zlib.error as e:
+        raise FrameError(f"Invalid compressed frame: {e}")
+    if decompressor.unconsumed_tail:
+        raise FrameError(f"Compressed frame expands beyond {max_size} bytes")
+    return data
+
+
+def split_length(header_value):
+    """Payload length and compressed flag from a raw header value"""
+    return header_value & ~COMPRESSED_FLAG, bool(header_value & COMPRESSED_FLAG)
+
+
+def send_frame(sock, payload, compressed=False):
+    """Write one frame with a single writev-style call, falling back to sendall for the remainder"""
+    header = frame_header(payload, compressed)
+    total = len(header) + len(payload)
+    sent = sock.sendmsg([header, payload])
+    if sent < len(header):
+        sock.sendall(header[sent:])
+        sock.sendall(payload)
+    elif sent < total:
+        sock.sendall(memoryview(payload)[sent - len(header):])
+
+
+class FrameDecoder:
+    """Incrementally reassembles frames from arbitrarily chunked socket reads"""
+
+    def __init__(self, max_frame_size=MAX_FRAME_SIZE):
+        self.max_frame_size = max_frame_size
+        self.buffer = bytearray()
+        self.offset = 0
+
+    def feed(self, data):
+        """Add received bytes and return every frame payload that is now complete"""
+        self.buffer += data
+        frames = []
+        while len(self.buffer) - self.offset >= HEADER.size:
+            (header,) = HEADER.unpack_from(self.buffer, self.offset)
+            length, compressed = split_length(header)
+            if length > self.max_frame_size:
+                raise FrameError(f"Frame of {length} bytes exceeds limit of {self.max_frame_size}")
+            start = self.offset + HEADER.size
+            end = start + length
+            if len(self.buffer) < end:
+                break
+            frame = bytes(self.buffer[start:end])
+            frames.append(inflate(frame, self.max_frame_size) if compressed else frame)
+            self.offset = end
+
+        # Drop consumed bytes once in a while instead of after every frame
+        if self.offset and (self.offset == len(self.buffer) or self.offset > 65536):
+            del self.buffer[:self.offset]
+            self.offset = 0
+        return frames
+
+
+async def read_frame(reader, max_frame_size=MAX_FRAME_SIZE):
+    """Read one frame from an asyncio StreamReader, returning None on a clean EOF"""
+    try:
+        header = await reader.readexactly(HEADER.size)
+    except asyncio.IncompleteReadError as e:
+        if not e.partial:
+            return None
+        raise
+    length, compressed = split_length(HEADER.unpack(header)[0])
+    if length > max_frame_size:
+        raise FrameError(f"Frame of {length} bytes exceeds limit of {max_frame_size}")
+    frame = await reader.readexactly(length)
+    return inflate(frame, max_frame_size) if compressed else frame
@@ -0,0 +1,128 @@
+import base64
+import binascii
+import bisect
+import heapq
+import itertools
+import json
+
+
+class SortedIndex:
+    """Question ids kept sorted by a key so a page is one bisect plus a slice.
+
+    Entries are (key..., question id) tuples in ascending order; pages are
+    served from the high end, so the largest key comes first.
+    """
+
+    def __init__(self):
+        self.entries = []
+        self.entry_by_id = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def update(self, question_id, key):
+        """Insert or move a question; a key of None removes it from the index"""
+        entry = None if key is None else key + (question_id,)
+        old_entry = self.entry_by_id.get(question_id)
+        if old_entry == entry:
+            return
+        if old_entry is not None:
+            del self.entries[bisect.bisect_left(self.entries, old_entry)]
+            del self.entry_by_id[question_id]
+        if entry is not None:
+            bisect.insort(self.entries, entry)
+            self.entry_by_id[question_id] = entry
+
+    def remove(self, question_id):
+        self.update(question_id, None)
+
+    def page(self, after=None, limit=20):
+        """Up to `limit` entries in descending order, starting below the `after` entry"""
+        end = len(self.entries) if after is None else bisect.bisect_left(self.entries, after)
+        start = max(0, end - limit)
+        return self.entries[start:end][::-1], start > 0
+
+    def iter_descending(self, after=None):
+        end = len(self.entries) if after is None else bisect.bisect_left(self.entries, after)
+        for i in range(end - 1, -1, -1):
+            yield self.entries[i]
+
+
+class TagIndex:
+    """tag -> SortedIndex of the questions carrying it, by insertion position"""
+
+    def __init__(self):
+        self.by_tag = {}
+
+    def add(self, question_id, tags, position):
+        for tag in set(tags):
+            index = self.by_tag.get(tag)
+            if index is None:
+                index = self.by_tag[tag] = SortedIndex()
+            index.update(question_id, (position,))
+
+    def remove(self, question_id, tags):
+        for tag in set(tags):
+            index = self.by_tag.get(tag)
+            if index is None:
+                continue
+            index.remove(question_id)
+            if not len(index):
+                del self.by_tag[tag]
+
+    def top(self, limit=50):
+        """The `limit` most used tags with their live question counts"""
+        best = heapq.nlargest(limit, self.by_tag.items(), key=lambda item: len(item[1]))
+        return [{'tag': tag, 'count': len(index)} for tag, index in best]
+
+    def page(self, tags, match_all=True, after=None, limit=20):
+        """Newest questions carrying all (or any) of `tags`, walking only the tag postings"""
+        indexes = [self.by_tag.get(tag) for tag in dict.fromkeys(tags)]
+        if match_all:
+            if not indexes or any(index is None for index in indexes):
+                return [], False
+            # Walk the rarest tag and probe the others
+            indexes.sort(key=len)
+            rest = indexes[1:]
+            entries = (
+                entry for entry in indexes[0].iter_descending(after)
+                if all(entry[-1] in index.entry_by_id for index in rest)
+            )
+        else:
+            merged = heapq.merge(
+                *(index.iter_descending(after) for index in indexes if index is not None),
+                reverse=True
+            )
+            # A question carrying several of the tags shows up once per tag, back to back
+            entries = (entry for entry, _ in itertools.groupby(merged))
+        found = list(itertools.islice(entries, limit + 1))
+        return found[:limit], len(found) > limit
+
+
+# Sort orders served by list_questions. Each maps a question and its insertion
+# position to an index key, or None when the question doesn't belong in the list.
+SORT_KEYS = {
+    'newest': lambda question, position: (position,),
+    'votes': lambda question, position: (question.get('votes', 0), position),
+    'most_answered': lambda question, position: (len(question['answers']), position),
+    'unanswered': lambda question, position: None if question['answers'] else (position,),
+}
+
+
+def encode_cursor(sort_by, entry):
+    """Opaque cursor pointing just past `entry` in the `sort_by` index"""
+    payload = json.dumps([sort_by, *entry], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii')
+
+
+def decode_cursor(sort_by, cursor):
+    """Turn a cursor back into an index entry, or raise ValueError"""
+    if not isinstance(cursor, str):
+        raise ValueError("Invalid cursor")
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (binascii.Error, UnicodeError, ValueError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(payload, list) or len(payload) < 2 or payload[0] != sort_by:
+        raise ValueError("Invalid cursor")
+    return tuple(payload[1:])
@@ -0,0 +1,218 @@
+import json
+import os
+import threading
+import time
+
+import logs
+from records import encode_record
+
+
+class Journal:
+    """Append-only log of store operations with group-committed fsyncs.
+
+    Each line is one JSON operation stamped with a sequence number. A background
+    writer drains everything appended since its last fsync in one write+fsync, so
+    concurrent writers share the cost of a single sync. With a durability window
+    the writer also waits that many seconds after the first pending record, so
+    bursts of writes coalesce into fewer, larger syncs.
+    """
+
+    def __init__(self, path, last_seq=0, compact_every=1000, on_sync=None, durability_window=0):
+        self.path = path
+        self.file = open(path, 'ab')
+        self.compact_every = compact_every
+        self.durability_window = durability_window
+        self.cond = threading.Condition()
+        self.pending = []
+        self.appended_seq = last_seq  # last sequence number handed out
+        self.durable_seq = last_seq   # last sequence number known to be on disk
+        self.records_since_compaction = 0
+        # writing is set while the writer has a batch out of the lock; compacting
+        # holds the writer back from taking another while the file is swapped
+        self.writing = False
+        self.compacting = False
+        self.error = None
+        self.closed = False
+        # Called with the seconds each write+fsync took
+        self.on_sync = on_sync
+        # Called with every encoded record, in sequence order, as it is appended
+        self.on_append = None
+        self.writer = threading.Thread(target=self._write_loop, name='journal-writer', daemon=True)
+        self.writer.start()
+
+    def append(self, op, wait=True):
+        """Log one operation, blocking until it is fsynced unless wait is False"""
+        # Encode outside the lock; the sequence number is spliced in as the first key
+        body = json.dumps(op, separators=(',', ':'), default=encode_record)[1:]
+        with self.cond:
+            if self.closed:
+                raise RuntimeError("Journal is closed")
+            if self.error is not None:
+                raise self.error
+            self.appended_seq += 1
+            seq = self.appended_seq
+            line = f'{{"seq":{seq},{body}\n'.encode('utf-8')
+            self.pending.append(line)
+            if self.on_append is not None:
+                self.on_append(line)
+            self.records_since_compaction += 1
+            self.cond.notify_all()
+            if wait:
+                self._wait_durable(seq)
+        return seq
+
+    def wait_durable(self, seq):
+        with self.cond:
+            self._wait_durable(seq)
+
+    def _wait_durable(self, seq):
+        while self.durable_seq < seq and self.error is None:
+            self.cond.wait()
+        if self.error is not None:
+            raise self.error
+
+    def _write_loop(self):
+        while True:
+            with self.cond:
+                while (not self.pending or self.compacting) and not self.closed:
+                    self.cond.wait()
+                if not self.pending and self.closed:
+                    return
+                if self.durability_window and not self.closed:
+                    deadline = time.monotonic() + self.durability_window
+                    while not self.closed and time.monotonic() < deadline:
+                        self.cond.wait(deadline - time.monotonic())
+                batch = self.pending
+                self.pending = []
+                batch_seq = self.appended_seq
+                self.writing = True
+
+            started = time.perf_counter()
+            try:
+                self.file.write(b''.join(batch))
+                self.file.flush()
+                os.fsync(self.file.fileno())
+            except OSError as e:
+                logs.error('journal_write_failed', path=self.path, error=e)
+                with self.cond:
+                    self.error = e
+                    self.writing = False
+                    self.cond.notify_all()
+                return
+            if self.on_sync is not None:
+                self.on_sync(time.perf_counter() - started)
+
+            with self.cond:
+                self.durable_seq = batch_seq
+                self.writing = False
+                self.cond.notify_all()
+
+    def needs_compaction(self):
+        return self.records_since_compaction >= self.compact_every
+
+    def discard_through(self, seq):
+        """Drop the records up to seq once a snapshot covering them is on disk.
+
+        Records appended after seq are kept. Appends wait only while the records
+        kept are copied, which is bounded by how much was written while the
+        snapshot was being saved, not by the size of the database. Records still
+        pending are written to the new file once it is in place. Replay skips
+        records the snapshot already covers, so a crash at any point here is safe.
+        """
+        with self.cond:
+            self.compacting = True
+            try:
+                # The writer takes no new batch now; wait out the one it may be writing
+                while self.writing and self.error is None:
+                    self.cond.wait()
+                if self.error is not None:
+                    raise self.error
+                self._swap_file(seq)
+            finally:
+                self.compacting = False
+                self.cond.notify_all()
+
+    def _swap_file(self, seq):
+        """discard_through's file work, run under cond while the writer is held back"""
+        if self.durable_seq <= seq:
+            self.file.truncate(0)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.records_since_compaction = len(self.pending)
+            return
+
+        kept = []
+        with open(self.path, 'rb') as f:
+            for line in f:
+                # Every record starts with {"seq":N, so the number is read without parsing the line
+                try:
+                    record_seq = int(line[7:line.index(b',')])
+                except ValueError:
+                    continue  # a torn record left by an earlier crash
+                if record_seq > seq:
+                    kept.append(line)
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(b''.join(kept))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+        self.file.close()
+        self.file = open(self.path, 'ab')
+        self.records_since_compaction = len(kept) + len(self.pending)
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        self.writer.join()
+        self.file.close()
+
+
+def replay(path, store, after_seq=0):
+    """Apply every journal record newer than after_seq to store.
+
+    Returns the highest sequence number seen and the length in bytes of the
+    complete records. Replay stops at a torn record left by a crash mid-write;
+    the file must be truncated to that length before appending to it again, or
+    the next record would be glued onto the torn one.
+    """
+    last_seq = after_seq
+    end = 0
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return last_seq, end
+
+    with f:
+        for line in f:
+            try:
+                # A record is only complete with its newline
+                record = json.loads(line) if line.endswith(b'\n') else None
+            except ValueError:
+                record = None
+            if record is None:
+                logs.warning('journal_torn_record', path=path, offset=end)
+                break
+            end += len(line)
+            seq = record.get('seq', 0)
+            if seq <= after_seq:
+                continue
+            store.apply(record)
+            last_seq = max(last_seq, seq)
+    return last_seq, end
+
+
+def truncate_torn(path, end):
+    """Cut a torn tail found by replay off the journal, before it is opened for appending"""
+    try:
+        f = open(path, 'r+b')
+    except FileNotFoundError:
+        return
+    with f:
+        size = os.fstat(f.fileno()).st_size
+        if size > end:
+            f.truncate(end)
+            f.flush()
+            os.fsync(f.fileno())
+            logs.warning('journal_truncated', path=path, bytes=size - end)
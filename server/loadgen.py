@@ -0,0 +1,405 @@
+"""Load generator and benchmark harness for the socket protocol.
+
+Generate a synthetic database into a scratch directory, start the server
+there, then drive it with simulated clients and read throughput and tail
+latency per action:
+
+    python server/loadgen.py generate --output /tmp/bench/server/database.snap --questions 50000
+    (cd /tmp/bench && python /path/to/server/server.py --connection-limits '' --user-limits '')
+    python server/loadgen.py run --clients 200 --duration 30 --mix get_questions=10,vote=70,add_answer=20
+
+Every client sends as fast as the server answers, far past the server's
+default per-connection rate limits, so benchmark a server started without
+them as above. Replies rejected with rate_limited are counted in their own
+column rather than as errors, so a run against a limited server shows how
+much of its traffic the limiter turned away.
+
+Everything runs against localhost only. Each client sends one request, waits
+for the response and sends the next, so latency is measured under the
+concurrency the --clients count sets. Requests started during the measured
+window are counted even if they finish after it, and throughput is taken
+over the time until the last of them completed. Throughput only counts
+successful replies; errors and rate-limited replies show up in the error
+rate instead.
+"""
+import argparse
+import asyncio
+import ipaddress
+import json
+import os
+import random
+import socket
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from framing import FrameError, encode_frame, read_frame
+from schema import normalize_question, normalize_user, timestamp
+from snapshot import write_snapshot
+
+ACTIONS = ('get_questions', 'add_question', 'add_answer', 'vote', 'login')
+DEFAULT_MIX = 'get_questions=30,vote=40,add_answer=15,add_question=10,login=5'
+# Generated users sign in as user<i>@bench.local with password password<i>
+USER_EMAIL = 'user{}@bench.local'
+USER_PASSWORD = 'password{}'
+
+WORDS = (
+    'swift python socket thread queue async await index cache snapshot journal vote answer question '
+    'memory latency buffer frame request response server client error crash leak closure optional '
+    'protocol struct enum array dictionary string parse encode decode compile build test deploy'
+).split()
+
+
+def text(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def generate_questions(count, answers, users, tags, seed):
+    """Canonical questions, newest first, as a generator so large sets stream to disk"""
+    rng = random.Random(seed)
+    tag_names = [f'tag{i}' for i in range(tags)]
+    start = datetime.now(timezone.utc)
+    for i in range(count):
+        question_id = f'bench-q{i}'
+        created = timestamp(start - timedelta(minutes=i))
+        voters = rng.sample(range(users), min(users, rng.randint(0, 5)))
+        yield normalize_question({
+            'id': question_id,
+            'title': text(rng, rng.randint(4, 12)).capitalize() + '?',
+            'body': text(rng, rng.randint(20, 120)),
+            'author_id': f'user{rng.randrange(users)}',
+            'created_date': created,
+            'upvotes': len(voters),
+            'user_votes': {f'user{voter}': 1 for voter in voters},
+            'tags': rng.sample(tag_names, min(tags, rng.randint(1, 4))),
+            'answers': [
+                {
+                    'id': f'bench-a{i}-{j}',
+                    'authorId': f'user{rng.randrange(users)}',
+                    'body': text(rng, rng.randint(10, 80)),
+                    'created_date': created,
+                }
+                for j in range(rng.randint(0, answers * 2))
+            ],
+        })
+
+
+def generate_users(count):
+    return {
+        USER_EMAIL.format(i): normalize_user(USER_EMAIL.format(i), {
+            'username': f'user{i}',
+            'password': USER_PASSWORD.format(i),
+            'created_date': timestamp(),
+        })
+        for i in range(count)
+    }
+
+
+def parse_mix(value):
+    """'get_questions=60,vote=40' -> {'get_questions': 60.0, 'vote': 40.0}"""
+    mix = {}
+    for part in value.split(','):
+        action, _, weight = part.partition('=')
+        action = action.strip()
+        if action not in ACTIONS:
+            raise argparse.ArgumentTypeError(f"unknown action {action!r}, expected one of {', '.join(ACTIONS)}")
+        try:
+            mix[action] = float(weight or 1)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"bad weight for {action}: {weight!r}")
+    if not any(weight > 0 for weight in mix.values()):
+        raise argparse.ArgumentTypeError("the mix needs at least one action with a positive weight")
+    return mix
+
+
+def check_localhost(host):
+    """The harness only ever targets this machine"""
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, None)}
+    except socket.gaierror as e:
+        sys.exit(f"Cannot resolve {host}: {e}")
+    if not all(ipaddress.ip_address(address.split('%')[0]).is_loopback for address in addresses):
+        sys.exit(f"{host} is not a loopback address; the load generator only runs against localhost")
+
+
+class SimulatedClient:
+    def __init__(self, host, port, rng, question_ids, users, compress):
+        self.host = host
+        self.port = port
+        self.rng = rng
+        self.question_ids = question_ids
+        self.users = users
+        self.compress = compress
+        self.user = rng.randrange(max(users, 1))
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        if self.compress:
+            await self.call({'action': 'negotiate', 'compression': ['deflate']})
+
+    async def call(self, request):
+        self.writer.write(encode_frame(json.dumps(request).encode('utf-8')))
+        await self.writer.drain()
+        frame = await read_frame(self.reader)
+        if frame is None:
+            raise ConnectionError("server closed the connection")
+        return json.loads(frame)
+
+    def request(self, action):
+        rng = self.rng
+        user_id = f'user{self.user}'
+        if action == 'get_questions':
+            return {'action': 'get_questions'}
+        if action == 'add_question':
+            return {
+                'action': 'add_question',
+                'question': {
+                    'id': f'load-{uuid.uuid4().hex}',
+                    'title': text(rng, 8).capitalize() + '?',
+                    'body': text(rng, 60),
+                    'author_id': user_id,
+                    'tags': [f'tag{rng.randrange(50)}'],
+                },
+            }
+        if action == 'add_answer':
+            return {
+                'action': 'add_answer',
+                'questionId': rng.choice(self.question_ids),
+                'answer': {'id': f'load-{uuid.uuid4().hex}', 'authorId': user_id, 'body': text(rng, 40)},
+            }
+        if action == 'vote':
+            return {
+                'action': 'vote',
+                'questionId': rng.choice(self.question_ids),
+                'voteType': rng.choice(('upvote', 'downvote')),
+                'userId': user_id,
+            }
+        return {
+            'action': 'login',
+            'email': USER_EMAIL.format(self.user),
+            'password': USER_PASSWORD.format(self.user),
+        }
+
+    async def run(self, actions, weights, warmup_until, stop_at, results):
+        await self.connect()
+        try:
+            while True:
+                action = self.rng.choices(actions, weights)[0]
+                request = self.request(action)
+                started = time.perf_counter()
+                if started >= stop_at:
+                    return
+                response = await self.call(request)
+                elapsed = time.perf_counter() - started
+                if started < warmup_until:
+                    continue
+                stats = results[action]
+                stats['latencies'].append(elapsed)
+                if response.get('code') == 'rate_limited':
+                    stats['limited'] += 1
+                elif response.get('status') != 'success':
+                    stats['errors'] += 1
+        finally:
+            self.writer.close()
+
+
+async def known_question_ids(host, port):
+    """Ids to answer and vote on: the newest page of whatever database the server has"""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(encode_frame(json.dumps({'action': 'list_questions', 'limit': 200}).encode('utf-8')))
+        await writer.drain()
+        response = json.loads(await read_frame(reader))
+    finally:
+        writer.close()
+    return [question['id'] for question in response.get('data') or []]
+
+
+async def run_clients(options, clients, seed):
+    question_ids = await known_question_ids(options['host'], options['port'])
+    mix = dict(options['mix'])
+    if not question_ids:
+        # Nothing to answer or vote on yet
+        mix.pop('add_answer', None)
+        mix.pop('vote', None)
+    actions, weights = list(mix), list(mix.values())
+    results = {action: {'latencies': [], 'errors': 0, 'limited': 0} for action in ACTIONS}
+    failures = 0
+
+    now = time.perf_counter()
+    warmup_until = now + options['warmup']
+    stop_at = warmup_until + options['duration']
+    tasks = [
+        SimulatedClient(
+            options['host'], options['port'], random.Random(seed * 100003 + i),
+            question_ids, options['users'], options['compress']
+        ).run(actions, weights, warmup_until, stop_at, results)
+        for i in range(clients)
+    ]
+    for outcome in await asyncio.gather(*tasks, return_exceptions=True):
+        if isinstance(outcome, (OSError, FrameError, ValueError)):
+            failures += 1
+        elif isinstance(outcome, BaseException):
+            raise outcome
+    return {'results': results, 'failed_clients': failures, 'elapsed': time.perf_counter() - warmup_until}
+
+
+def run_worker(options, clients, seed):
+    return asyncio.run(run_clients(options, clients, seed))
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def summarize(parts):
+    """Merge per-process results into per-action and overall throughput and latency"""
+    duration = max(part['elapsed'] for part in parts)
+    merged = {action: {'latencies': [], 'errors': 0, 'limited': 0} for action in ACTIONS}
+    failed_clients = 0
+    for part in parts:
+        failed_clients += part['failed_clients']
+        for action, stats in part['results'].items():
+            merged[action]['latencies'].extend(stats['latencies'])
+            merged[action]['errors'] += stats['errors']
+            merged[action]['limited'] += stats['limited']
+
+    def row(latencies, errors, limited):
+        latencies.sort()
+        failed = errors + limited
+        return {
+            'requests': len(latencies),
+            'errors': errors,
+            'limited': limited,
+            'error_rate': round(failed / len(latencies), 4) if latencies else 0.0,
+            'throughput': round((len(latencies) - failed) / duration, 1),
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+            'max_ms': round((latencies[-1] if latencies else 0.0) * 1000, 3),
+        }
+
+    actions = {
+        action: row(list(stats['latencies']), stats['errors'], stats['limited'])
+        for action, stats in merged.items() if stats['latencies']
+    }
+    total = row(
+        [latency for stats in merged.values() for latency in stats['latencies']],
+        sum(stats['errors'] for stats in merged.values()),
+        sum(stats['limited'] for stats in merged.values())
+    )
+    return {'duration': round(duration, 3), 'failed_clients': failed_clients, 'actions': actions, 'total': total}
+
+
+def print_report(report, out=sys.stdout):
+    header = f"{'action':<16}{'requests':>10}{'errors':>8}{'limited':>9}{'err %':>8}{'ok/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+    print(header, file=out)
+    print('-' * len(header), file=out)
+    for name, stats in [*report['actions'].items(), ('total', report['total'])]:
+        print(
+            f"{name:<16}{stats['requests']:>10}{stats['errors']:>8}{stats['limited']:>9}{stats['error_rate'] * 100:>8.2f}{stats['throughput']:>10.1f}"
+            f"{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}{stats['max_ms']:>10.2f}",
+            file=out
+        )
+    print(f"measured over {report['duration']:.2f} s", file=out)
+    if report['failed_clients']:
+        print(f"{report['failed_clients']} clients lost their connection", file=out)
+    if report['total']['limited']:
+        print("some requests were rate limited; start the server with --connection-limits '' --user-limits '' to benchmark it", file=out)
+
+
+def generate_command(args):
+    if os.path.exists(args.output) and not args.force:
+        sys.exit(f"{args.output} exists; pass --force to replace it")
+    directory = os.path.dirname(args.output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # A journal next to the snapshot would be replayed on top of the generated data
+    journal_path = os.path.join(directory, 'database.journal')
+    if os.path.exists(journal_path) and os.path.getsize(journal_path):
+        sys.exit(f"{journal_path} has unsaved changes; remove it or generate into another directory")
+
+    started = time.perf_counter()
+    questions = generate_questions(args.questions, args.answers, args.users, args.tags, args.seed)
+    write_snapshot(args.output, questions, generate_users(args.users))
+    print(
+        f"Wrote {args.questions} questions and {args.users} users to {args.output} "
+        f"({os.path.getsize(args.output):,} bytes, {time.perf_counter() - started:.1f} s)"
+    )
+
+
+def run_command(args):
+    check_localhost(args.host)
+    options = {
+        'host': args.host,
+        'port': args.port,
+        'mix': args.mix,
+        'users': args.users,
+        'compress': args.compress,
+        'warmup': args.warmup,
+        'duration': args.duration,
+    }
+    processes = max(1, min(args.processes, args.clients))
+    # Spread the clients over several processes so the generator is not the bottleneck
+    shares = [args.clients // processes + (i < args.clients % processes) for i in range(processes)]
+    print(
+        f"{args.clients} clients in {processes} process(es) against {args.host}:{args.port} "
+        f"for {args.duration:g} s after {args.warmup:g} s warmup",
+        file=sys.stderr
+    )
+    if processes == 1:
+        parts = [run_worker(options, args.clients, args.seed)]
+    else:
+        with ProcessPoolExecutor(processes) as pool:
+            parts = list(pool.map(run_worker, [options] * processes, shares,
+                                  [args.seed + i for i in range(processes)]))
+
+    report = summarize(parts)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic data and load generation for the server")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate = commands.add_parser('generate', help="write a synthetic database snapshot")
+    generate.add_argument('--output', required=True,
+                          help="snapshot path, e.g. /tmp/bench/server/database.snap; start the server from /tmp/bench")
+    generate.add_argument('--questions', type=int, default=10000)
+    generate.add_argument('--answers', type=int, default=2, help="average answers per question")
+    generate.add_argument('--users', type=int, default=1000)
+    generate.add_argument('--tags', type=int, default=50)
+    generate.add_argument('--seed', type=int, default=1)
+    generate.add_argument('--force', action='store_true', help="replace an existing snapshot")
+
+    run = commands.add_parser('run', help="drive a running server and report throughput and latency")
+    run.add_argument('--host', default='127.0.0.1')
+    run.add_argument('--port', type=int, default=54321)
+    run.add_argument('--clients', type=int, default=50, help="concurrent connections")
+    run.add_argument('--processes', type=int, default=1, help="processes to spread the clients over")
+    run.add_argument('--duration', type=float, default=10, help="measured seconds")
+    run.add_argument('--warmup', type=float, default=2, help="seconds run before measuring")
+    run.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                     help=f"action weights, default {DEFAULT_MIX}")
+    run.add_argument('--users', type=int, default=1000,
+                     help="generated users the clients act as (match generate --users)")
+    run.add_argument('--compress', action='store_true', help="negotiate deflate-compressed responses")
+    run.add_argument('--seed', type=int, default=1)
+    run.add_argument('--json', help="also write the report as JSON to this path, to compare runs")
+
+    args = parser.parse_args()
+    if args.command == 'generate':
+        generate_command(args)
+    else:
+        run_command(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+
+from records import Record, encode_record
+
+# Values under these keys never reach the log, at any level
+SECRET_FIELDS = {'password', 'password_hash', 'token', 'session_token', 'secret'}
+# Longest debug payload written; the rest is cut off
+MAX_PAYLOAD_CHARS = 4096
+
+log = logging.getLogger('stackoverflow')
+log.addHandler(logging.NullHandler())
+_debug_sample_rate = 0.0
+_listener = None
+
+
+class StructuredFormatter(logging.Formatter):
+    """One line per event: time, level, event name, then key=value fields"""
+
+    def format(self, record):
+        parts = [self.formatTime(record, '%Y-%m-%dT%H:%M:%S'), record.levelname, record.getMessage()]
+        for key, value in getattr(record, 'fields', {}).items():
+            value = str(value)
+            if not value or any(c in value for c in ' ="\n'):
+                value = json.dumps(value)
+            parts.append(f'{key}={value}')
+        return ' '.join(parts)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the writer thread; when it falls behind, records are dropped and counted"""
+
+    dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+
+def setup_logging(level='INFO', debug_sample_rate=0.01, queue_size=10000, stream=None):
+    """Route the server log through a bounded queue to a writer thread.
+
+    Request threads and the event loop only pay for an enqueue; formatting
+    and the write happen on the listener thread.
+    """
+    global _debug_sample_rate, _listener
+    stop_logging()
+    _debug_sample_rate = debug_sample_rate
+    records = queue.Queue(queue_size)
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(StructuredFormatter())
+    log.handlers = [DroppingQueueHandler(records)]
+    log.setLevel(level)
+    log.propagate = False
+    _listener = logging.handlers.QueueListener(records, handler)
+    _listener.start()
+
+
+def stop_logging():
+    """Write out everything still queued"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def event(level, name, exc_info=False, **fields):
+    if log.isEnabledFor(level):
+        log.log(level, name, exc_info=exc_info, extra={'fields': fields})
+
+
+def debug(name, **fields):
+    event(logging.DEBUG, name, **fields)
+
+
+def info(name, **fields):
+    event(logging.INFO, name, **fields)
+
+
+def warning(name, **fields):
+    event(logging.WARNING, name, **fields)
+
+
+def error(name, exc_info=False, **fields):
+    event(logging.ERROR, name, exc_info=exc_info, **fields)
+
+
+def redact(value):
+    """A copy of a request or response with every secret field masked"""
+    if isinstance(value, Record):
+        value = value.to_dict()
+    if isinstance(value, dict):
+        return {
+            key: '***' if key in SECRET_FIELDS else redact(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [redact(item) for item in value]
+    return value
+
+
+def debug_payload(name, payload, **fields):
+    """Log a full, redacted payload at DEBUG for a sampled fraction of calls"""
+    if not log.isEnabledFor(logging.DEBUG) or random.random() >= _debug_sample_rate:
+        return
+    text = json.dumps(redact(payload), default=encode_record)
+    if len(text) > MAX_PAYLOAD_CHARS:
+        text = text[:MAX_PAYLOAD_CHARS] + '...'
+    debug(name, payload=text, **fields)
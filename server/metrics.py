@@ -0,0 +1,162 @@
+import bisect
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Latency bucket upper bounds in seconds: 10us to ~40s, each 1.5x the last
+BUCKETS = [0.00001 * 1.5 ** i for i in range(38)]
+
+
+def label_value(value):
+    """value escaped for a quoted label in the Prometheus text format"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Histogram:
+    """Counts of observations per latency bucket; percentiles are bucket upper bounds"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q):
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(BUCKETS[i], self.max) if i < len(BUCKETS) else self.max
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'p50_ms': round(self.percentile(0.50) * 1000, 3),
+            'p95_ms': round(self.percentile(0.95) * 1000, 3),
+            'p99_ms': round(self.percentile(0.99) * 1000, 3),
+            'max_ms': round(self.max * 1000, 3),
+            'mean_ms': round(self.total / self.count * 1000, 3) if self.count else 0.0,
+        }
+
+
+class ActionStats:
+    def __init__(self):
+        self.latency = Histogram()
+        self.errors = 0
+        self.response_bytes = 0
+
+
+class Metrics:
+    """Per-action request counts, latencies and response sizes, plus persistence timings.
+
+    Clients choose action names, so only the given known actions get their own
+    series; the rest are counted under 'unknown' and requests that are not
+    even JSON objects with a string action under 'invalid'.
+    One lock guards everything; each observation holds it for a bisect and a
+    few additions.
+    """
+
+    def __init__(self, actions=()):
+        self.known_actions = frozenset(actions)
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.actions = {}
+        self.persistence = {}  # 'journal_sync' / 'snapshot' -> Histogram
+        self.gauges = {}       # name -> zero-argument callable read at report time
+
+    def observe_request(self, action, seconds, response_bytes, ok=True):
+        if not isinstance(action, str):
+            action = 'invalid'
+        elif action != 'invalid' and action not in self.known_actions:
+            action = 'unknown'
+        with self.lock:
+            stats = self.actions.get(action)
+            if stats is None:
+                stats = self.actions[action] = ActionStats()
+            stats.latency.observe(seconds)
+            stats.response_bytes += response_bytes
+            if not ok:
+                stats.errors += 1
+
+    def observe_persistence(self, kind, seconds):
+        with self.lock:
+            histogram = self.persistence.get(kind)
+            if histogram is None:
+                histogram = self.persistence[kind] = Histogram()
+            histogram.observe(seconds)
+
+    def gauge(self, name, read):
+        self.gauges[name] = read
+
+    def snapshot(self):
+        """Everything as plain JSON-ready data, for the stats action"""
+        with self.lock:
+            actions = {
+                action: dict(stats.latency.summary(), errors=stats.errors, response_bytes=stats.response_bytes)
+                for action, stats in sorted(self.actions.items())
+            }
+            persistence = {kind: histogram.summary() for kind, histogram in sorted(self.persistence.items())}
+        return {
+            'uptime_seconds': round(time.time() - self.started, 1),
+            'gauges': {name: read() for name, read in sorted(self.gauges.items())},
+            'actions': actions,
+            'persistence': persistence,
+        }
+
+    def render_text(self):
+        """The same data in the Prometheus text exposition format"""
+        data = self.snapshot()
+        lines = [f"stackoverflow_uptime_seconds {data['uptime_seconds']}"]
+        for name, value in data['gauges'].items():
+            lines.append(f"stackoverflow_{name} {value}")
+        for action, stats in data['actions'].items():
+            label = f'action="{label_value(action)}"'
+            lines.append(f"stackoverflow_requests_total{{{label}}} {stats['count']}")
+            lines.append(f"stackoverflow_request_errors_total{{{label}}} {stats['errors']}")
+            lines.append(f"stackoverflow_response_bytes_total{{{label}}} {stats['response_bytes']}")
+            for q in ('p50', 'p95', 'p99'):
+                lines.append(
+                    f"stackoverflow_request_latency_seconds{{{label},quantile=\"0.{q[1:]}\"}} "
+                    f"{stats[q + '_ms'] / 1000:.6g}"
+                )
+        for kind, stats in data['persistence'].items():
+            label = f'kind="{label_value(kind)}"'
+            lines.append(f"stackoverflow_persistence_total{{{label}}} {stats['count']}")
+            for q in ('p50', 'p95', 'p99'):
+                lines.append(
+                    f"stackoverflow_persistence_seconds{{{label},quantile=\"0.{q[1:]}\"}} "
+                    f"{stats[q + '_ms'] / 1000:.6g}"
+                )
+        return '\n'.join(lines) + '\n'
+
+
+def serve_metrics(metrics, host, port):
+    """Serve render_text() over plain HTTP from a daemon thread"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = metrics.render_text().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    httpd = ThreadingHTTPServer((host, port), Handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, name='metrics-http', daemon=True).start()
+    return httpd
@@ -0,0 +1,129 @@
+"""Offline migration of the database to the canonical schema.
+
+Reads the legacy database.pkl (or an existing snapshot), rewrites every
+record in the canonical schema from schema.py, hashes any plaintext
+passwords and writes a compact snapshot.
+Run it with the server stopped:
+
+    python server/migrate.py
+    python server/migrate.py --input server/database.pkl --output server/database.snap
+"""
+import argparse
+import os
+import sys
+import time
+
+from auth import DEFAULT_ITERATIONS, PasswordHasher, is_hashed
+from schema import ANSWER_FIELDS, QUESTION_FIELDS, USER_FIELDS, normalize_question, normalize_user
+from snapshot import DATABASE_PATH, JOURNAL_PATH, SNAPSHOT_PATH, open_database, write_snapshot
+
+
+def time_load(path):
+    """Seconds to read and decode every record of a database file"""
+    start = time.perf_counter()
+    database = open_database(path)
+    for question in database['questions']:
+        pass
+    database['close']()
+    return time.perf_counter() - start
+
+
+class Report:
+    def __init__(self):
+        self.questions = 0
+        self.answers = 0
+        self.users = 0
+        self.hashed_passwords = 0
+        self.dropped_fields = 0
+        self.filled_fields = 0
+        self.shared_strings = 0  # tags and author/voter ids, counted per occurrence
+        self.distinct_strings = set()
+
+    def count(self, record, fields):
+        self.dropped_fields += len(set(record) - set(fields))
+        self.filled_fields += len(set(fields) - set(record))
+
+    def add_question(self, question, canonical):
+        self.questions += 1
+        self.count(question, QUESTION_FIELDS)
+        # authorId was the legacy spelling; normalizing renames it rather than filling a new field
+        if 'authorId' in question and 'author_id' not in question:
+            self.dropped_fields -= 1
+            self.filled_fields -= 1
+        strings = [canonical['author_id'], *canonical['tags'], *canonical['user_votes']]
+        for answer, canonical_answer in zip(question.get('answers') or [], canonical['answers']):
+            self.answers += 1
+            self.count(answer, ANSWER_FIELDS)
+            if 'author_id' in answer and 'authorId' not in answer:
+                self.dropped_fields -= 1
+                self.filled_fields -= 1
+            strings.append(canonical_answer['authorId'])
+        self.shared_strings += len(strings)
+        self.distinct_strings.update(strings)
+
+    def add_user(self, user):
+        self.users += 1
+        self.count(user, USER_FIELDS)
+
+
+def migrate(input_path, output_path, hash_iterations=DEFAULT_ITERATIONS):
+    database = open_database(input_path)
+    report = Report()
+
+    def canonical_questions():
+        # A generator, so records stream from the input to the output one at a time
+        for question in database['questions']:
+            canonical = normalize_question(question)
+            report.add_question(question, canonical)
+            yield canonical
+
+    canonical_users = {}
+    for email, user in database['users'].items():
+        canonical_users[email] = normalize_user(email, user)
+        report.add_user(user)
+    # Passwords stored before hashing; each hash is slow, so they run across every core
+    plaintext = [user for user in canonical_users.values() if user['password'] and not is_hashed(user['password'])]
+    hasher = PasswordHasher(hash_iterations)
+    for user, hashed in zip(plaintext, hasher.hash_many([user['password'] for user in plaintext])):
+        user['password'] = hashed
+    hasher.close()
+    report.hashed_passwords = len(plaintext)
+    try:
+        write_snapshot(output_path, canonical_questions(), canonical_users, database['journal_seq'])
+    finally:
+        database['close']()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rewrite the database in the canonical compact schema")
+    parser.add_argument('--input', help="snapshot or legacy pickle to read (default: the snapshot, else database.pkl)")
+    parser.add_argument('--output', default=SNAPSHOT_PATH)
+    parser.add_argument('--hash-iterations', type=int, default=DEFAULT_ITERATIONS,
+                        help="PBKDF2-SHA256 iterations for plaintext passwords hashed during the migration")
+    args = parser.parse_args()
+
+    input_path = args.input or (SNAPSHOT_PATH if os.path.exists(SNAPSHOT_PATH) else DATABASE_PATH)
+    if not os.path.exists(input_path):
+        sys.exit(f"No database at {input_path}")
+    # Journal records would be replayed on top of the migrated snapshot in their old shape
+    if os.path.exists(JOURNAL_PATH) and os.path.getsize(JOURNAL_PATH):
+        sys.exit(f"{JOURNAL_PATH} has unsaved changes; start and stop the server once to fold them in")
+
+    input_size = os.path.getsize(input_path)
+    input_load = time_load(input_path)
+    report = migrate(input_path, args.output, args.hash_iterations)
+    output_size = os.path.getsize(args.output)
+    output_load = time_load(args.output)
+
+    print(f"Migrated {input_path} -> {args.output}")
+    print(f"  records: {report.questions} questions, {report.answers} answers, {report.users} users")
+    print(f"  fields:  {report.dropped_fields} dead fields dropped, {report.filled_fields} missing fields filled")
+    print(f"  users:   {report.hashed_passwords} plaintext passwords hashed")
+    print(f"  strings: {report.shared_strings} tag/author/voter strings share {len(report.distinct_strings)} interned values")
+    print(f"  size:    {input_size:,} -> {output_size:,} bytes ({(output_size - input_size) / max(input_size, 1):+.1%})")
+    print(f"  load:    {input_load * 1000:.1f} ms -> {output_load * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+import argparse
+import threading
+import time
+from collections import OrderedDict
+
+# Each action spends tokens from the bucket of its class; anything not listed is a read
+ACTION_CLASSES = {
+    'vote': 'vote',
+    'add_question': 'write',
+    'add_answer': 'write',
+    'delete_answer': 'write',
+    'delete_question': 'write',
+    'login': 'auth',
+    'sign_up': 'auth',
+    'logout': 'auth',
+}
+CLASSES = ('read', 'write', 'vote', 'auth')
+
+# rate per second / burst, for one connection and for one user across all their connections
+DEFAULT_CONNECTION_LIMITS = 'read=200/400,write=20/40,vote=50/100,auth=5/10'
+DEFAULT_USER_LIMITS = 'write=20/40,vote=50/100,auth=1/10'
+
+
+def parse_limits(value):
+    """'read=200/400,vote=50' -> {'read': (200.0, 400.0), 'vote': (50.0, 50.0)}; '' means no limits"""
+    limits = {}
+    for part in filter(None, (part.strip() for part in value.split(','))):
+        action_class, _, limit = part.partition('=')
+        action_class = action_class.strip()
+        if action_class not in CLASSES:
+            raise argparse.ArgumentTypeError(f"unknown action class {action_class!r}, expected one of {', '.join(CLASSES)}")
+        rate, _, burst = limit.partition('/')
+        try:
+            rate = float(rate)
+            burst = float(burst or rate)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"bad limit for {action_class}: {limit!r}, expected rate[/burst]")
+        if rate <= 0 or burst < 1:
+            raise argparse.ArgumentTypeError(f"limit for {action_class} needs a positive rate and a burst of at least 1")
+        limits[action_class] = (rate, burst)
+    return limits
+
+
+def user_key(request, sessions, peer):
+    """Who a request comes from: the account behind its session token, else the client's address.
+
+    User ids and emails in the request are whatever the client claims, so a
+    client could dodge its limits by naming someone else or spend another
+    user's; they are never used. sessions maps a token to its email, peer is
+    the client's host, or None when there is no address to go by.
+    """
+    token = request.get('token')
+    email = sessions.lookup(token) if sessions is not None and isinstance(token, str) else None
+    if email is not None:
+        return ('user', email)
+    if peer is not None:
+        return ('peer', peer)
+    return None
+
+
+class TokenBucket:
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, now):
+        """Spend one token: 0 if there was one, else the seconds until there will be"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Token buckets per connection and per user, for each action class.
+
+    A connection's buckets live in its session and are only touched by the
+    thread serving it. User buckets are shared, so they sit behind one lock in
+    an LRU bounded by max_users; a user evicted from it starts again with a
+    full bucket. A user is the account a session token from `sessions` belongs
+    to, or for requests without one, the client's address (see user_key).
+    """
+
+    def __init__(self, connection_limits, user_limits, sessions=None, max_users=100000):
+        self.connection_limits = connection_limits
+        self.user_limits = user_limits
+        self.sessions = sessions
+        self.max_users = max_users
+        self.lock = threading.Lock()
+        self.users = OrderedDict()  # (user, class) -> TokenBucket
+        self.limited = 0
+
+    def check(self, buckets, request, action, peer=None):
+        """Spend tokens for one request: 0 if it may run, else the seconds to wait before retrying.
+
+        buckets is the connection's own dict of buckets, kept in its session,
+        and peer the host it connected from.
+        """
+        action_class = ACTION_CLASSES.get(action, 'read')
+        now = time.monotonic()
+        limit = self.connection_limits.get(action_class)
+        if limit is not None:
+            bucket = buckets.get(action_class)
+            if bucket is None:
+                bucket = buckets[action_class] = TokenBucket(*limit, now)
+            wait = bucket.take(now)
+            if wait:
+                self.limited += 1
+                return wait
+        limit = self.user_limits.get(action_class)
+        user = user_key(request, self.sessions, peer) if limit is not None else None
+        if user is not None:
+            key = (user, action_class)
+            with self.lock:
+                bucket = self.users.get(key)
+                if bucket is None:
+                    bucket = self.users[key] = TokenBucket(*limit, now)
+                    if len(self.users) > self.max_users:
+                        self.users.popitem(last=False)
+                else:
+                    self.users.move_to_end(key)
+                wait = bucket.take(now)
+            if wait:
+                self.limited += 1
+                return wait
+        return 0.0
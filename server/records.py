@@ -0,0 +1,145 @@
+import sys
+
+
+class Record:
+    """A fixed-field record stored in __slots__ instead of a per-instance dict.
+
+    Fields are the canonical schema keys from schema.py and can be read and
+    written with the same subscript and get() calls a dict record took, so the
+    indexes and request handlers work on either. to_dict() gives the exact JSON
+    object the wire format has always used.
+    """
+    __slots__ = ()
+    FIELDS = ()
+
+    def __getitem__(self, name):
+        try:
+            return getattr(self, name)
+        except (AttributeError, TypeError):
+            raise KeyError(name)
+
+    def __setitem__(self, name, value):
+        if name not in self.FIELDS:
+            raise KeyError(name)
+        setattr(self, name, value)
+
+    def __contains__(self, name):
+        return name in self.FIELDS
+
+    def get(self, name, default=None):
+        return getattr(self, name, default) if name in self.FIELDS else default
+
+    def keys(self):
+        return self.FIELDS
+
+    def __iter__(self):
+        return iter(self.FIELDS)
+
+    def copy(self):
+        record = object.__new__(type(self))
+        for name in self.FIELDS:
+            setattr(record, name, getattr(self, name))
+        return record
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.FIELDS)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class Answer(Record):
+    FIELDS = ('id', 'questionId', 'authorId', 'body', 'created_date', 'votes', 'is_accepted')
+    __slots__ = FIELDS
+
+    def __init__(self, id, questionId, authorId, body, created_date, votes, is_accepted):
+        self.id = id
+        self.questionId = questionId
+        self.authorId = authorId
+        self.body = body
+        self.created_date = created_date
+        self.votes = votes
+        self.is_accepted = is_accepted
+
+
+class Question(Record):
+    FIELDS = (
+        'id', 'title', 'body', 'author_id', 'created_date', 'votes', 'upvotes',
+        'downvotes', 'user_votes', 'tags', 'answers',
+    )
+    __slots__ = FIELDS
+
+    def __init__(self, id, title, body, author_id, created_date, votes, upvotes, downvotes, user_votes, tags, answers):
+        self.id = id
+        self.title = title
+        self.body = body
+        self.author_id = author_id
+        self.created_date = created_date
+        self.votes = votes
+        self.upvotes = upvotes
+        self.downvotes = downvotes
+        self.user_votes = user_votes
+        self.tags = tags
+        self.answers = answers
+
+    def copy(self):
+        # Copy-on-write updates replace the answer list, never edit it in place
+        record = super().copy()
+        record.answers = list(self.answers)
+        return record
+
+    def to_dict(self):
+        fields = super().to_dict()
+        fields['answers'] = [answer.to_dict() for answer in self.answers]
+        return fields
+
+
+class User(Record):
+    FIELDS = ('username', 'email', 'password', 'created_date')
+    __slots__ = FIELDS
+
+    def __init__(self, username, email, password, created_date):
+        self.username = username
+        self.email = email
+        self.password = password
+        self.created_date = created_date
+
+
+def as_answer(value):
+    """An Answer from a canonical answer dict (e.g. out of a journal record) or Answer"""
+    if isinstance(value, Answer):
+        return value
+    fields = dict(value)
+    fields['questionId'] = sys.intern(fields['questionId'])
+    fields['authorId'] = sys.intern(fields['authorId'])
+    return Answer(**fields)
+
+
+def as_question(value):
+    """A Question the caller may keep, from a canonical question dict or another Question"""
+    if isinstance(value, Question):
+        return value.copy()
+    fields = dict(value)
+    fields['author_id'] = sys.intern(fields['author_id'])
+    fields['tags'] = [sys.intern(tag) for tag in fields['tags']]
+    fields['user_votes'] = {sys.intern(user_id): vote for user_id, vote in fields['user_votes'].items()}
+    fields['answers'] = [as_answer(answer) for answer in fields['answers']]
+    return Question(**fields)
+
+
+def as_user(value):
+    if isinstance(value, User):
+        return value
+    return User(**value)
+
+
+def encode_record(value):
+    """json.dumps default= hook: records go out as the same JSON objects as before"""
+    if isinstance(value, Record):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
@@ -0,0 +1,201 @@
+import itertools
+import json
+import pickle
+import struct
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import logs
+from store import QuestionStore
+
+# Actions that change data or sessions; worker processes forward them to the
+# owner, which also holds the session tokens the writes are authenticated with
+MUTATING_ACTIONS = {
+    'add_question', 'add_answer', 'delete_answer', 'delete_question', 'vote', 'sign_up', 'login', 'logout',
+}
+
+# Messages between the owner and a worker over a multiprocessing Pipe, tagged by their first byte
+STATE = b'S'    # owner -> worker: pickled (questions, users, journal seq), where the replica starts
+UPDATES = b'U'  # owner -> worker: journal lines in sequence order, applied with store.apply
+REQUEST = b'R'  # worker -> owner: request id + a mutating request frame
+REPLY = b'A'    # owner -> worker: request id + the encoded response
+REQUEST_ID = struct.Struct('!Q')
+
+
+class WorkerChannel:
+    """The owner's end of one worker's pipe.
+
+    Journal lines and replies share one outbound queue, so a worker always
+    applies a write to its replica before it sees the reply to it.
+    """
+
+    def __init__(self, conn, handle_request, executor, state):
+        self.conn = conn
+        self.handle_request = handle_request
+        self.executor = executor
+        self.cond = threading.Condition()
+        # (tag, payload) in send order; the state goes first and is pickled by the sender thread
+        self.outbox = [(STATE, state)]
+        self.closed = False
+        threading.Thread(target=self._send_loop, name='replica-sender', daemon=True).start()
+        threading.Thread(target=self._receive_loop, name='replica-receiver', daemon=True).start()
+
+    def enqueue(self, tag, payload):
+        with self.cond:
+            if not self.closed:
+                self.outbox.append((tag, payload))
+                self.cond.notify()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        self.conn.close()
+
+    def _messages(self, items):
+        lines = []
+        for tag, payload in items:
+            if tag == UPDATES:
+                # Consecutive journal lines go out as one message
+                lines.append(payload)
+                continue
+            if lines:
+                yield UPDATES + b''.join(lines)
+                lines = []
+            if tag == STATE:
+                yield STATE + pickle.dumps(payload, pickle.HIGHEST_PROTOCOL)
+            else:
+                yield tag + payload
+        if lines:
+            yield UPDATES + b''.join(lines)
+
+    def _send_loop(self):
+        while True:
+            with self.cond:
+                while not self.outbox and not self.closed:
+                    self.cond.wait()
+                if self.closed:
+                    return
+                items = self.outbox
+                self.outbox = []
+            try:
+                for message in self._messages(items):
+                    self.conn.send_bytes(message)
+            except (OSError, EOFError, ValueError):
+                return
+
+    def _receive_loop(self):
+        while True:
+            try:
+                message = self.conn.recv_bytes()
+            except (OSError, EOFError):
+                with self.cond:
+                    self.closed = True
+                    self.cond.notify()
+                return
+            if message[:1] == REQUEST:
+                self.executor.submit(self._answer, message[1:1 + REQUEST_ID.size], message[1 + REQUEST_ID.size:])
+
+    def _answer(self, request_id, frame):
+        try:
+            payload = self.handle_request(frame)
+        except Exception as e:
+            logs.error('replica_request_failed', exc_info=True, error=e)
+            payload = json.dumps({'status': 'error', 'message': str(e)}).encode('utf-8')
+        self.enqueue(REPLY, request_id + payload)
+
+
+class ReplicationHub:
+    """Owner side of --workers mode: the journal feeds every worker's replica.
+
+    handle_request(frame) runs a forwarded write and returns the encoded
+    response. Writes from all workers run on a shared thread pool, so they
+    still share group-committed journal syncs.
+    """
+
+    def __init__(self, handle_request, max_threads=32):
+        self.handle_request = handle_request
+        self.executor = ThreadPoolExecutor(max_threads, thread_name_prefix='replica-write')
+        self.channels = []
+
+    def add(self, conn, state):
+        """Start replicating to a worker from `state`.
+
+        The caller holds the store still while capturing state and calling
+        this, so the worker gets exactly the journal lines after it.
+        """
+        channel = WorkerChannel(conn, self.handle_request, self.executor, state)
+        self.channels = self.channels + [channel]
+        return channel
+
+    def broadcast(self, line):
+        """Journal.on_append hook: called in sequence order with each encoded journal line"""
+        for channel in self.channels:
+            channel.enqueue(UPDATES, line)
+
+    def close(self):
+        for channel in self.channels:
+            channel.close()
+        self.executor.shutdown(wait=False)
+
+
+class ReplicaLink:
+    """A worker's end: holds the read replica and forwards writes to the owner"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.send_lock = threading.Lock()
+        self.pending = {}
+        self.ids = itertools.count()
+        self.lost = False
+        message = conn.recv_bytes()
+        if message[:1] != STATE:
+            raise RuntimeError("Owner did not start with the replica state")
+        questions, users, self.journal_seq = pickle.loads(message[1:])
+        self.store = QuestionStore(questions, users, defer_search=True)
+
+    def start(self, apply, on_lost):
+        """Apply journal records from the owner with apply(record) until the owner goes away"""
+        self.apply = apply
+        self.on_lost = on_lost
+        threading.Thread(target=self._read_loop, name='replica-reader', daemon=True).start()
+
+    def call(self, frame):
+        """Run a write on the owner and return its encoded response"""
+        future = Future()
+        request_id = next(self.ids)
+        self.pending[request_id] = future
+        try:
+            with self.send_lock:
+                if self.lost:
+                    raise ConnectionError("Owner process is gone")
+                self.conn.send_bytes(REQUEST + REQUEST_ID.pack(request_id) + frame)
+        except (OSError, ValueError) as e:
+            self.pending.pop(request_id, None)
+            raise ConnectionError(f"Owner process is gone: {e}")
+        return future.result()
+
+    def _read_loop(self):
+        while True:
+            try:
+                message = self.conn.recv_bytes()
+            except (OSError, EOFError):
+                break
+            tag = message[:1]
+            if tag == UPDATES:
+                for line in message[1:].splitlines():
+                    record = json.loads(line)
+                    self.apply(record)
+                    self.journal_seq = record['seq']
+            elif tag == REPLY:
+                (request_id,) = REQUEST_ID.unpack_from(message, 1)
+                future = self.pending.pop(request_id, None)
+                if future is not None:
+                    future.set_result(message[1 + REQUEST_ID.size:])
+
+        with self.send_lock:
+            self.lost = True
+        for future in list(self.pending.values()):
+            future.set_exception(ConnectionError("Owner process is gone"))
+        self.pending.clear()
+        self.on_lost()
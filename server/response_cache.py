@@ -0,0 +1,63 @@
+import json
+import threading
+from collections import OrderedDict
+
+# Read-only actions whose responses depend only on the request and the store contents
+CACHEABLE_ACTIONS = {
+    'get_questions', 'get_changes', 'list_questions', 'sort_questions',
+    'filter_questions', 'get_tags', 'questions_by_tag',
+}
+
+
+def cache_key(request):
+    """Canonical form of a read request, so equal requests share one entry"""
+    try:
+        return json.dumps(request, sort_keys=True, separators=(',', ':'))
+    except (TypeError, ValueError):
+        return None
+
+
+class ResponseCache:
+    """Encoded response payloads for read actions, bounded by an LRU byte budget.
+
+    Each entry remembers the store version (its change sequence) it was built
+    at and is only served while the store is still at that version. Mutations
+    also call invalidate() so stale payloads don't sit in the budget.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (version, payload, compressed)
+        self.size = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version):
+        """(payload, compressed) cached for key at this version, or None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, key, version, payload, compressed=False):
+        if len(payload) > self.max_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old[1])
+            self.entries[key] = (version, payload, compressed)
+            self.size += len(payload)
+            while self.size > self.max_bytes:
+                _, (_, evicted, _) = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def invalidate(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
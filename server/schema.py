@@ -0,0 +1,136 @@
+import sys
+import uuid
+from datetime import datetime, timezone
+
+from records import Answer, Question, User
+
+# The one record layout the server stores and sends. Keys follow the Swift
+# models: questions use author_id, answers use authorId and questionId.
+# Anything else on a record is dropped when it is normalized.
+QUESTION_FIELDS = (
+    'id', 'title', 'body', 'author_id', 'created_date', 'votes', 'upvotes',
+    'downvotes', 'user_votes', 'tags', 'answers',
+)
+ANSWER_FIELDS = ('id', 'questionId', 'authorId', 'body', 'created_date', 'votes', 'is_accepted')
+USER_FIELDS = ('username', 'email', 'password', 'created_date')
+
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+def timestamp(moment=None):
+    """A UTC time in the format every record's created_date uses"""
+    return (moment or datetime.now(timezone.utc)).strftime(TIMESTAMP_FORMAT)
+
+
+def normalize_timestamp(value):
+    """Rewrite any ISO 8601 variant (space separator, offset, fractions) as TIMESTAMP_FORMAT"""
+    if not isinstance(value, str):
+        return timestamp()
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        return value
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return timestamp(moment.astimezone(timezone.utc))
+
+
+def _string(value):
+    return sys.intern(value) if isinstance(value, str) else ''
+
+
+def _text(value):
+    # Titles and bodies are free text, not worth interning; anything but a string becomes empty
+    return value if isinstance(value, str) else ''
+
+
+def _id(value):
+    return value if isinstance(value, str) and value else str(uuid.uuid4()).upper()
+
+
+def normalize_answer(answer, question_id):
+    """A canonical copy of an answer belonging to question_id"""
+    return Answer(
+        id=_id(answer.get('id')),
+        questionId=_string(question_id),
+        authorId=_string(answer.get('authorId', answer.get('author_id'))),
+        body=_text(answer.get('body')),
+        created_date=normalize_timestamp(answer.get('created_date')),
+        votes=int(answer.get('votes') or 0),
+        is_accepted=bool(answer.get('is_accepted', False)),
+    )
+
+
+def normalize_question(question):
+    """A canonical copy of a question and its answers"""
+    question_id = _id(question.get('id'))
+    user_votes = {
+        _string(user_id): value
+        for user_id, value in (question.get('user_votes') or {}).items()
+        if value in (1, -1)
+    }
+    upvotes = int(question.get('upvotes') or 0)
+    downvotes = int(question.get('downvotes') or 0)
+    return Question(
+        id=question_id,
+        title=_text(question.get('title')),
+        body=_text(question.get('body')),
+        author_id=_string(question.get('author_id', question.get('authorId'))),
+        created_date=normalize_timestamp(question.get('created_date')),
+        votes=upvotes - downvotes,
+        upvotes=upvotes,
+        downvotes=downvotes,
+        user_votes=user_votes,
+        tags=[_string(tag) for tag in dict.fromkeys(question.get('tags') or []) if isinstance(tag, str)],
+        answers=[normalize_answer(answer, question_id) for answer in question.get('answers') or []],
+    )
+
+
+def normalize_user(email, user):
+    return User(
+        username=_string(user.get('username')),
+        email=_string(user.get('email') or email),
+        password=user.get('password') or '',
+        created_date=normalize_timestamp(user.get('created_date')),
+    )
+
+
+def pack_question(question, ref):
+    """The positional row a snapshot stores for a canonical question.
+
+    ref(string) returns the string's index in the snapshot's shared string
+    table, so each tag and author id is stored once. votes and questionId
+    are implied by the rest of the row.
+    """
+    return [
+        question['id'], question['title'], question['body'], ref(question['author_id']),
+        question['created_date'], question['upvotes'], question['downvotes'],
+        [[ref(user_id), value] for user_id, value in question['user_votes'].items()],
+        [ref(tag) for tag in question['tags']],
+        [
+            [answer['id'], ref(answer['authorId']), answer['body'], answer['created_date'],
+             answer['votes'], answer['is_accepted']]
+            for answer in question['answers']
+        ],
+    ]
+
+
+def unpack_question(row, strings):
+    """Rebuild a canonical question from a pack_question row and the string table"""
+    question_id, title, body, author, created_date, upvotes, downvotes, user_votes, tags, answers = row
+    return Question(
+        id=question_id,
+        title=title,
+        body=body,
+        author_id=strings[author],
+        created_date=created_date,
+        votes=upvotes - downvotes,
+        upvotes=upvotes,
+        downvotes=downvotes,
+        user_votes={strings[user_id]: value for user_id, value in user_votes},
+        tags=[strings[tag] for tag in tags],
+        answers=[
+            Answer(answer_id, question_id, strings[answer_author], answer_body, answer_date, answer_votes, is_accepted)
+            for answer_id, answer_author, answer_body, answer_date, answer_votes, is_accepted in answers
+        ],
+    )
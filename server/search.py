@@ -0,0 +1,162 @@
+import bisect
+import heapq
+import math
+import re
+from collections import Counter
+
+TOKEN_RE = re.compile(r'\w+')
+# A title hit counts as much as this many body or answer hits
+TITLE_WEIGHT = 3
+# Prefix matches score lower than an exact term match
+PREFIX_FACTOR = 0.5
+MIN_PREFIX_LENGTH = 2
+MAX_PREFIX_EXPANSION = 64
+
+
+def tokenize(text):
+    if not text:
+        return []
+    return TOKEN_RE.findall(text.lower())
+
+
+class SearchIndex:
+    """Incremental inverted index over question titles, bodies and answer text.
+
+    Each question is one document; its answers add their terms to it. Postings
+    map a term to {question id: weight}, and a sorted vocabulary lets a query
+    term match every indexed term it is a prefix of.
+    """
+
+    def __init__(self):
+        self.postings = {}
+        self.vocabulary = []
+        self.question_terms = {}  # question id -> Counter from title and body
+        self.answer_terms = {}    # question id -> {answer id -> Counter from the answer body}
+
+    def __len__(self):
+        return len(self.question_terms)
+
+    def _add_terms(self, question_id, counts):
+        for term, weight in counts.items():
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = self.postings[term] = {}
+                bisect.insort(self.vocabulary, term)
+            posting[question_id] = posting.get(question_id, 0) + weight
+
+    def _remove_terms(self, question_id, counts):
+        for term, weight in counts.items():
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            remaining = posting.get(question_id, 0) - weight
+            if remaining > 0:
+                posting[question_id] = remaining
+                continue
+            posting.pop(question_id, None)
+            if not posting:
+                del self.postings[term]
+                del self.vocabulary[bisect.bisect_left(self.vocabulary, term)]
+
+    def question_counts(self, question):
+        """(term counts of the title and body, {answer id -> term counts}), without touching the index"""
+        counts = Counter(tokenize(question.get('body')))
+        for term in tokenize(question.get('title')):
+            counts[term] += TITLE_WEIGHT
+        return counts, {answer['id']: self.answer_counts(answer) for answer in question.get('answers', [])}
+
+    def answer_counts(self, answer):
+        return Counter(tokenize(answer.get('body')))
+
+    def add_question(self, question, counts=None):
+        """Index a question, with counts from question_counts() if the caller tokenized it already"""
+        question_id = question['id']
+        counts, answer_counts = counts or self.question_counts(question)
+        if question_id in self.question_terms:
+            self.remove_question(question_id)
+        self.question_terms[question_id] = counts
+        self.answer_terms[question_id] = answer_counts
+        self._add_terms(question_id, counts)
+        for answer_count in answer_counts.values():
+            self._add_terms(question_id, answer_count)
+
+    def remove_question(self, question_id):
+        counts = self.question_terms.pop(question_id, None)
+        if counts is None:
+            return
+        self._remove_terms(question_id, counts)
+        for answer_counts in self.answer_terms.pop(question_id).values():
+            self._remove_terms(question_id, answer_counts)
+
+    def add_answer(self, question_id, answer, counts=None):
+        answers = self.answer_terms.get(question_id)
+        if answers is None:
+            return
+        if counts is None:
+            counts = self.answer_counts(answer)
+        if answer['id'] in answers:
+            self.remove_answer(question_id, answer['id'])
+        answers[answer['id']] = counts
+        self._add_terms(question_id, counts)
+
+    def remove_answer(self, question_id, answer_id):
+        counts = self.answer_terms.get(question_id, {}).pop(answer_id, None)
+        if counts is not None:
+            self._remove_terms(question_id, counts)
+
+    def _expand(self, term):
+        """Indexed terms matching a query term: the exact term plus terms it prefixes"""
+        matches = []
+        if term in self.postings:
+            matches.append((term, 1.0))
+        if len(term) < MIN_PREFIX_LENGTH:
+            return matches
+        i = bisect.bisect_right(self.vocabulary, term)
+        while i < len(self.vocabulary) and len(matches) < MAX_PREFIX_EXPANSION:
+            candidate = self.vocabulary[i]
+            if not candidate.startswith(term):
+                break
+            matches.append((candidate, PREFIX_FACTOR))
+            i += 1
+        return matches
+
+    def search(self, text, limit=50):
+        """Question ids matching every query term, best tf-idf score first"""
+        query = list(dict.fromkeys(tokenize(text)))
+        if not query:
+            return []
+
+        document_count = max(len(self.question_terms), 1)
+        expansions = []
+        for term in query:
+            matches = self._expand(term)
+            if not matches:
+                return []
+            postings = [
+                (self.postings[t], factor * math.log(1 + document_count / len(self.postings[t])))
+                for t, factor in matches
+            ]
+            expansions.append(postings)
+        # Start from the rarest term so the candidate set is small from the outset
+        expansions.sort(key=lambda postings: sum(len(posting) for posting, _ in postings))
+
+        scores = None
+        for postings in expansions:
+            term_scores = {}
+            candidates = scores if scores is not None else {
+                question_id: 0.0 for posting, _ in postings for question_id in posting
+            }
+            for question_id, score in candidates.items():
+                best = 0.0
+                for posting, idf in postings:
+                    weight = posting.get(question_id)
+                    if weight:
+                        best = max(best, (1 + math.log(weight)) * idf)
+                if best:
+                    term_scores[question_id] = score + best
+            scores = term_scores
+            if not scores:
+                return []
+
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [question_id for question_id, _ in best]
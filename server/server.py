@@ -2,126 +2,669 @@ import socket
 import json
 import threading
 from datetime import datetime, timezone
-import pickle
 import signal
 import sys
 import os
 import shutil
+import asyncio
+import argparse
+import math
+import struct
+import multiprocessing
+import multiprocessing.connection
+import time
+from concurrent.futures import ThreadPoolExecutor
+from store import QuestionStore
+from journal import Journal, replay, truncate_torn
+from snapshot import DATABASE_PATH, JOURNAL_PATH, SNAPSHOT_PATH, SnapshotError, open_database, write_snapshot
+from records import encode_record
+import logs
+from schema import normalize_answer, normalize_question, normalize_user, timestamp
+from votes import VOTE_VALUES
+from response_cache import CACHEABLE_ACTIONS, ResponseCache, cache_key
+from framing import FrameDecoder, FrameError, deflate, frame_header, read_frame, send_frame
+from metrics import Metrics, serve_metrics
+from changefeed import ALL, AsyncSender, ChangeFeed, Subscriber, ThreadSender, op_event, vote_events
+from replication import MUTATING_ACTIONS, ReplicaLink, ReplicationHub
+from auth import DEFAULT_ITERATIONS, PasswordHasher, TokenCache, is_hashed
+from ratelimit import DEFAULT_CONNECTION_LIMITS, DEFAULT_USER_LIMITS, RateLimiter, parse_limits
+
+# Every response is encoded from a dict whose first key is 'status'
+SUCCESS_PREFIX = b'{"status": "success"'
+# Requests that hash a password, recognized in the raw frame so asyncio mode can keep them off the event loop
+PASSWORD_ACTIONS = (b'"login"', b'"sign_up"')
+# Writes that wait for their journal fsync, recognized the same way
+JOURNALED_ACTIONS = (b'"add_question"', b'"add_answer"', b'"delete_answer"', b'"delete_question"')
+# Requests a worker forwards to the owner and waits for
+FORWARDED_ACTIONS = tuple(json.dumps(action).encode('utf-8') for action in sorted(MUTATING_ACTIONS))
+# Threads asyncio mode runs those requests on; writes waiting together share one fsync
+BLOCKING_THREADS = 32
+# Actions that act as a user, which a session token can authenticate
+AUTHENTICATED_ACTIONS = {'add_question', 'add_answer', 'vote', 'delete_answer', 'delete_question'}
+# The request field naming the acting user; new questions and answers carry it in the record
+IDENTITY_FIELDS = {'vote': 'userId', 'delete_answer': 'authorId', 'delete_question': 'author_id'}
+# Every action the server answers; metrics count anything else under 'unknown'
+ACTIONS = frozenset({
+    'negotiate', 'subscribe', 'unsubscribe', 'get_questions', 'get_changes', 'list_questions', 'sort_questions',
+    'filter_questions', 'get_tags', 'questions_by_tag', 'add_question', 'add_answer', 'delete_answer', 'vote',
+    'login', 'logout', 'sign_up', 'stats', 'delete_question',
+})
+
+def page_limit(request, default, maximum):
+    """The page size a request asks for, clamped to 1..maximum; a missing or 0 limit means default"""
+    limit = request.get('limit') or default
+    if isinstance(limit, bool) or not isinstance(limit, int):
+        raise ValueError("Invalid limit")
+    return min(max(limit, 1), maximum)
+
 
 class StackOverflowServer:
-    def __init__(self):
-        self.data = self.load_data()  # Load saved data (questions and users)
-        self.questions = self.data.get('questions', [])
-        self.users = self.data.get('users', {})  # Assuming users are stored in a dictionary
+    def __init__(self, host='127.0.0.1', port=54321, backlog=128, max_connections=10000, compact_every=1000,
+                 vote_flush_interval=0.2, response_cache_bytes=64 * 1024 * 1024,
+                 compress_threshold=1024, compress_level=6, metrics_port=0, durability_window=0,
+                 push_interval=0.05, hash_iterations=DEFAULT_ITERATIONS, session_ttl=24 * 60 * 60,
+                 max_sessions=100000, connection_limits=None, user_limits=None, send_buffer=256 * 1024,
+                 send_timeout=30, require_tokens=False, replica=None):
+        # Request counts and latencies, persistence timings and live gauges for 'stats'
+        self.metrics = Metrics(ACTIONS)
+        # In a worker process (--workers), the owner process holds the data and
+        # the journal; this process serves reads from a replica and forwards writes
+        self.replica = replica
+        self.replication = None
+        self.workers = []
+        self.storage_closed = False
+        self.stopping = threading.Event()
+        if replica is None:
+            # Load saved data (questions and users), indexed by question id so mutations don't walk the whole list
+            self.store, journal_seq = self.load_data()
+            self.open_storage(journal_seq, compact_every, durability_window, vote_flush_interval)
+        else:
+            self.store = replica.store
+        # Encoded responses to read actions, reused until the next mutation
+        self.response_cache = ResponseCache(response_cache_bytes)
+        # Connections that negotiate compression get responses of at least this many bytes deflated
+        self.compress_threshold = compress_threshold
+        self.compress_level = compress_level
+        # Password hashing runs on its own thread pool; logins get a session token
+        # that authenticates later requests with one lookup
+        self.passwords = PasswordHasher(hash_iterations)
+        self.sessions = TokenCache(max_sessions, session_ttl)
+        # Held while a sign_up checks its username is free and claims it
+        self.sign_up_lock = threading.Lock()
+        # Without this, a request with no token is still trusted to act as the
+        # user ids it names, as every client did before tokens existed
+        self.require_tokens = require_tokens
+        # Token buckets per connection and per user, so one busy client can't crowd out the rest
+        self.limiter = RateLimiter(
+            parse_limits(DEFAULT_CONNECTION_LIMITS) if connection_limits is None else connection_limits,
+            parse_limits(DEFAULT_USER_LIMITS) if user_limits is None else user_limits,
+            self.sessions
+        )
+        # Bytes a connection may have queued for sending before the server stops
+        # reading its requests, and how long a stalled reader keeps its connection
+        self.send_buffer = send_buffer
+        self.send_timeout = send_timeout
+        # Change events for subscribed connections, sent in batches at most every push_interval seconds
+        self.change_feed = ChangeFeed(self.compress, interval=push_interval)
+        threading.Thread(target=self.index_search_backlog, name='search-indexer', daemon=True).start()
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.host = '127.0.0.1'
-        self.port = 54321
+        if replica is not None:
+            # Every worker binds the same port; the kernel spreads connections across them
+            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        self.host = host
+        self.port = port
+        # Size of the kernel accept queue and the cap on simultaneously open clients
+        self.backlog = backlog
+        self.max_connections = max_connections
+        self.connection_count = 0
+        self.connection_lock = threading.Lock()
         # Add signal handlers for graceful shutdown
         signal.signal(signal.SIGINT, self.shutdown_handler)
         signal.signal(signal.SIGTERM, self.shutdown_handler)
         # Add last_modified timestamp to track changes
         self.last_modified = datetime.now(timezone.utc)
+        self.metrics.gauge('connections', lambda: self.connection_count)
+        self.metrics.gauge('questions', lambda: len(self.store))
+        self.metrics.gauge('users', lambda: len(self.store.users))
+        self.metrics.gauge('change_seq', lambda: self.store.seq)
+        self.metrics.gauge('response_cache_hits', lambda: self.response_cache.hits)
+        self.metrics.gauge('response_cache_misses', lambda: self.response_cache.misses)
+        self.metrics.gauge('sessions', lambda: len(self.sessions))
+        self.metrics.gauge('rate_limited', lambda: self.limiter.limited)
+        self.metrics.gauge('subscribers', lambda: self.change_feed.subscribers)
+        self.metrics.gauge('push_batches', lambda: self.change_feed.batches)
+        self.metrics.gauge('log_records_dropped', lambda: logs.DroppingQueueHandler.dropped)
+        # Plain-text metrics over HTTP, for scrapers; bound to loopback only
+        self.metrics_port = metrics_port
+        if metrics_port:
+            serve_metrics(self.metrics, '127.0.0.1', metrics_port)
+            logs.info('metrics_listening', host='127.0.0.1', port=metrics_port)
+        if replica is not None:
+            # Everything the replica applies from here on needs the caches and feed set up above
+            replica.start(self.apply_replicated, self.owner_lost)
+
+    def open_storage(self, journal_seq, compact_every, durability_window, vote_flush_interval):
+        """The journal and the background threads that persist the store"""
+        # Mutations are appended here; the full database is only rewritten on compaction
+        # With a durability window, writes are acknowledged before their fsync and
+        # synced together at most this many seconds later; 0 waits for every sync
+        self.durability_window = durability_window
+        self.journal = Journal(
+            JOURNAL_PATH,
+            last_seq=journal_seq,
+            compact_every=compact_every,
+            on_sync=lambda seconds: self.metrics.observe_persistence('journal_sync', seconds),
+            durability_window=durability_window
+        )
+        self.compaction_lock = threading.Lock()
+        # Journal position of the last snapshot this process wrote
+        self.saved_seq = None
+        # Votes are counted in memory at once and written out in batches; a crash
+        # loses at most the votes cast within this many seconds
+        self.vote_flush_interval = vote_flush_interval
+        self.vote_flush_lock = threading.Lock()
+        self.vote_flusher = threading.Thread(target=self.vote_flush_loop, name='vote-flusher', daemon=True)
+        self.vote_flusher.start()
+        # Snapshots are written here, never on a request thread
+        self.snapshot_requested = threading.Event()
+        self.snapshot_writer = threading.Thread(target=self.snapshot_loop, name='snapshot-writer', daemon=True)
+        self.snapshot_writer.start()
 
     def shutdown_handler(self, signum, frame):
         """Handle shutdown signals gracefully"""
-        print("\nReceived shutdown signal. Saving data and closing server...")
-        self.save_data()  # Save data before shutting down
+        logs.info('shutdown_signal', signal=signum)
+        self.close_storage()  # Save data before shutting down
         if hasattr(self, 'server_socket'):
             self.server_socket.close()
         sys.exit(0)
 
-    def load_questions(self):
-        try:
-            with open('server/database.pkl', 'rb') as f:
-                return pickle.load(f)
-        except:
-            return []
-
-    def save_questions(self):
-        with open('server/database.pkl', 'wb') as f:
-            pickle.dump(self.questions, f)
+    def exit_handler(self, signum, frame):
+        logs.info('shutdown_signal', signal=signum)
+        sys.exit(0)
 
     def load_data(self):
-        print("Attempting to load database...")
+        """Load the last snapshot and replay the journal written after it"""
+        snapshot = self.load_snapshot()
+        questions, users = snapshot['questions'], snapshot['users']
+        if snapshot['legacy']:
+            # Older formats may mix authorId/author_id, miss fields or carry dead ones
+            questions = [normalize_question(question) for question in questions]
+            users = {email: normalize_user(email, user) for email, user in users.items()}
         try:
-            with open('server/database.pkl', 'rb') as f:
-                data = pickle.load(f)
-                print(f"Successfully loaded database with {len(data.get('questions', []))} questions and {len(data.get('users', {}))} users")
-                if isinstance(data, dict):
-                    # Initialize missing keys if they don't exist
-                    if 'questions' not in data:
-                        data['questions'] = []
-                    if 'users' not in data:
-                        data['users'] = {}
-                    return data
+            # Records are decoded straight out of the mapped file; the text index is built in the background
+            store = QuestionStore(questions, users, defer_search=True)
+        finally:
+            snapshot['close']()
+        snapshot_seq = snapshot['journal_seq']
+        journal_seq, journal_end = replay(JOURNAL_PATH, store, snapshot_seq)
+        truncate_torn(JOURNAL_PATH, journal_end)
+        if journal_seq > snapshot_seq:
+            logs.info('journal_replayed', records=journal_seq - snapshot_seq)
+            if snapshot['legacy']:
+                # Journal records written by an older server need the same cleanup
+                store = QuestionStore(
+                    [normalize_question(question) for question in store.all()],
+                    {email: normalize_user(email, user) for email, user in store.users.items()},
+                    defer_search=True
+                )
+        return store, journal_seq
+
+    def load_snapshot(self):
+        """The saved questions, users and journal position, from the snapshot or a legacy pickle"""
+        empty = {'questions': [], 'users': {}, 'journal_seq': 0, 'legacy': False, 'close': lambda: None}
+        try:
+            database = open_database()
         except FileNotFoundError:
-            print("Warning: Database file not found. Creating new database.")
-            initial_data = {'questions': [], 'users': {}}
-            # Save the initial data immediately
-            with open('server/database.pkl', 'wb') as f:
-                pickle.dump(initial_data, f)
-            return initial_data
+            logs.warning('database_missing', path=SNAPSHOT_PATH)
+            return empty
+        except (SnapshotError, ValueError) as e:
+            logs.error('snapshot_load_failed', path=SNAPSHOT_PATH, error=e)
+            return empty
         except Exception as e:
-            print(f"Error loading data: {e}")
-            return {'questions': [], 'users': {}}
+            logs.error('database_load_failed', path=DATABASE_PATH, error=e)
+            return empty
+        logs.info(
+            'snapshot_loaded' if database['path'] == SNAPSHOT_PATH else 'legacy_database_loaded',
+            path=database['path'],
+            questions=len(database['questions']),
+            users=len(database['users'])
+        )
+        return database
+
+    def index_search_backlog(self):
+        """Finish the text index deferred at startup, a batch at a time"""
+        while self.store.index_search_backlog():
+            pass
+        logs.info('search_index_ready', questions=len(self.store.search_index))
 
     def start(self):
         try:
-            print(f"\nBinding to {self.host}:{self.port}...")
             self.server_socket.bind((self.host, self.port))
-            self.server_socket.listen(1)
-            print("Server is listening!")
+            self.server_socket.listen(self.backlog)
+            logs.info('listening', host=self.host, port=self.port, mode='threaded')
 
             while True:
-                print("\nWaiting for new connection...")
                 client_socket, address = self.server_socket.accept()
-                print(f"New connection from {address}")
+
+                if not self.acquire_connection_slot():
+                    logs.warning('connection_rejected', peer=address, max_connections=self.max_connections)
+                    client_socket.close()
+                    continue
                 
                 client_thread = threading.Thread(
                     target=self.handle_client,
-                    args=(client_socket, address)
+                    args=(client_socket, address),
+                    daemon=True
                 )
                 client_thread.start()
 
         except Exception as e:
-            print(f"Server error: {e}")
+            logs.error('server_error', exc_info=True, error=e)
         finally:
-            print("Saving data before shutting down...")
-            self.save_data()  # Save data before shutting down
+            self.close_storage()  # Save data before shutting down
             self.server_socket.close()
 
     def handle_client(self, client_socket, address):
-        print(f"\nHandling client {address}")
+        logs.debug('client_connected', peer=address)
         try:
+            decoder = FrameDecoder()
+            # Pushes to subscribed clients are written by another thread, so sends take this lock
+            send_lock = threading.Lock()
+            session = {
+                'compression': None,
+                'open_pusher': lambda: ThreadSender(client_socket, send_lock),
+                'buckets': {},
+                'peer': address[0] if address else None
+            }
+            # Responses are sent before the next request is read, so a client that
+            # stops reading stalls only itself; give up on it after send_timeout
+            seconds, fraction = divmod(self.send_timeout, 1)
+            client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDTIMEO, struct.pack('ll', int(seconds), int(fraction * 1e6)))
             while True:
-                data = client_socket.recv(4096)
+                data = client_socket.recv(65536)
                 if not data:
-                    print(f"Client {address} disconnected")
+                    logs.debug('client_disconnected', peer=address)
                     break
                 
-                print(f"Received from {address}: {data}")
-                try:
-                    request = json.loads(data.decode('utf-8'))
+                # A single recv may hold part of a request or several pipelined ones
+                for frame in decoder.feed(data):
+                    response_data, compressed = self.handle_frame(frame, session)
+                    with send_lock:
+                        send_frame(client_socket, response_data, compressed)
+        except FrameError as e:
+            logs.warning('framing_error', peer=address, error=e)
+        except BlockingIOError:
+            logs.warning('send_timeout', peer=address, seconds=self.send_timeout)
+        except Exception as e:
+            logs.error('client_error', exc_info=True, peer=address, error=e)
+        finally:
+            logs.debug('connection_closed', peer=address)
+            self.end_subscription(session)
+            client_socket.close()
+            self.release_connection_slot()
+
+    def handle_frame(self, frame, session):
+        """Decode one request frame, run it and return the response payload and whether it is compressed.
+
+        session holds the per-connection settings agreed through 'negotiate'.
+        """
+        started = time.perf_counter()
+        action, ok, (payload, compressed) = self.dispatch_frame(frame, session)
+        self.metrics.observe_request(action, time.perf_counter() - started, len(payload), ok)
+        return payload, compressed
+
+    def dispatch_frame(self, frame, session):
+        """handle_frame without the timing: returns the action, whether it succeeded and the encoded response"""
+        action = 'invalid'
+        try:
+            request = json.loads(frame.decode('utf-8'))
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            logs.warning('invalid_request', bytes=len(frame), error=e)
+            response = {
+                'status': 'error',
+                'message': f'Invalid JSON request: {e}'
+            }
+        else:
+            if isinstance(request, dict) and not isinstance(request.get('action'), str):
+                # Answered before any set or dict lookup, which an unhashable action would break
+                response = {
+                    'status': 'error',
+                    'message': f"Unknown action: {request.get('action')}"
+                }
+            elif isinstance(request, dict):
+                action = request['action']
+                # Writes forwarded from a worker come without buckets: the worker already counted them
+                retry_after = (
+                    self.limiter.check(session['buckets'], request, action, session.get('peer'))
+                    if 'buckets' in session else 0
+                )
+                if retry_after:
+                    response = {
+                        'status': 'error',
+                        'code': 'rate_limited',
+                        'message': 'Too many requests, slow down',
+                        'retry_after': math.ceil(retry_after * 1000) / 1000
+                    }
+                elif action == 'negotiate':
+                    # Answered uncompressed; the new settings apply from the next response on
+                    return action, True, (json.dumps(self.negotiate(request, session)).encode('utf-8'), False)
+                elif self.replica is not None and action in MUTATING_ACTIONS:
+                    payload = self.forward(frame)
+                    return action, payload.startswith(SUCCESS_PREFIX), self.compress(payload, session['compression'])
+                elif action in CACHEABLE_ACTIONS:
+                    return (action, *self.cached_response(request, session['compression']))
+                elif action in ('subscribe', 'unsubscribe'):
+                    response = self.subscription(request, session)
+                else:
                     response = self.process_request(request)
-                    response_data = json.dumps(response).encode('utf-8')
-                    print(f"Sending to {address}: {response_data}")
-                    client_socket.send(response_data)
-                except json.JSONDecodeError as e:
-                    print(f"JSON decode error: {e}")
+            else:
+                response = {
+                    'status': 'error',
+                    'message': 'Request must be a JSON object'
+                }
+        encoded = self.compress(json.dumps(response, default=encode_record).encode('utf-8'), session['compression'])
+        return action, response.get('status') == 'success', encoded
+
+    def forward(self, frame):
+        """Run a write on the owner process; this worker's replica has it applied by the time it returns"""
+        try:
+            payload = self.replica.call(frame)
+        except ConnectionError as e:
+            logs.error('owner_unavailable', error=e)
+            return json.dumps({
+                'status': 'error',
+                'message': 'Server is shutting down'
+            }).encode('utf-8')
+        if payload.startswith(SUCCESS_PREFIX) and b'"seq": ' in payload:
+            # The owner's seq counts its own store's changes; clients sync with
+            # get_changes against this replica, which has its own seq and epoch
+            response = json.loads(payload)
+            if 'seq' in response:
+                response['seq'] = self.store.seq
+                payload = json.dumps(response).encode('utf-8')
+        return payload
+
+    def negotiate(self, request, session):
+        """Pick the first compression codec the client offers that the server supports"""
+        offered = request.get('compression') or []
+        if not isinstance(offered, list):
+            offered = [offered]
+        session['compression'] = 'deflate' if 'deflate' in offered else None
+        return {
+            'status': 'success',
+            'compression': session['compression'],
+            'compression_threshold': self.compress_threshold
+        }
+
+    def subscription(self, request, session):
+        """Add or drop this connection's change subscriptions.
+
+        'question_id' or 'tag' narrows a subscription; without either it covers
+        every question. unsubscribe without either drops them all. Events are
+        then pushed as {"event": "changes", "changes": [...]} frames, which
+        carry no 'status' and so are never confused with a response.
+        """
+        question_id = request.get('question_id') or request.get('questionId')
+        tag = request.get('tag')
+        topic = ('question', question_id) if question_id else ('tag', tag) if tag else None
+        if topic is not None and not isinstance(topic[1], str):
+            return {
+                'status': 'error',
+                'message': 'question_id and tag must be strings'
+            }
+        subscriber = session.get('subscriber')
+        if request['action'] == 'subscribe':
+            if subscriber is None:
+                subscriber = session['subscriber'] = Subscriber(session['open_pusher'](), session)
+            if not self.change_feed.subscribe(subscriber, topic or ALL):
+                return {
+                    'status': 'error',
+                    'message': f'At most {self.change_feed.max_topics} subscriptions per connection'
+                }
+        elif subscriber is not None:
+            self.change_feed.unsubscribe(subscriber, topic)
+        logs.debug('subscription', action=request['action'], topic=':'.join(topic or ALL))
+        return {
+            'status': 'success',
+            'subscriptions': sorted(':'.join(t) for t in (subscriber.topics if subscriber else ())),
+            # Changes up to here are not pushed; get_changes with this seq and epoch fills the gap
+            'seq': self.store.seq,
+            'epoch': self.store.epoch
+        }
+
+    def end_subscription(self, session):
+        subscriber = session.get('subscriber')
+        if subscriber is not None:
+            self.change_feed.unsubscribe(subscriber)
+            subscriber.deliver.close()
+
+    def compress(self, payload, compression):
+        """Deflate payloads over the threshold when the connection asked for it"""
+        if compression != 'deflate' or len(payload) < self.compress_threshold:
+            return payload, False
+        compressed = deflate(payload, self.compress_level)
+        if len(compressed) >= len(payload):
+            return payload, False
+        return compressed, True
+
+    def cached_response(self, request, compression=None):
+        """Serve a read action from the response cache, encoding it only on a miss.
+
+        Returns whether the response is a success along with the encoded payload.
+        """
+        key = cache_key(request)
+        # Read the version first: a mutation racing with the build leaves the entry stale, never wrong
+        version = self.store.seq
+        if key is not None:
+            # Plain and compressed encodings are cached separately
+            key = (key, compression)
+            cached = self.response_cache.get(key, version)
+            if cached is not None:
+                # Only successful responses are cached
+                return True, cached
+        response = self.process_request(request)
+        encoded = self.compress(json.dumps(response, default=encode_record).encode('utf-8'), compression)
+        ok = response.get('status') == 'success'
+        if key is not None and ok:
+            self.response_cache.put(key, version, *encoded)
+        return ok, encoded
+
+    def acquire_connection_slot(self):
+        with self.connection_lock:
+            if self.connection_count >= self.max_connections:
+                return False
+            self.connection_count += 1
+            return True
+
+    def release_connection_slot(self):
+        with self.connection_lock:
+            self.connection_count -= 1
+
+    def start_async(self):
+        """Serve all clients from a single asyncio event loop instead of one thread each"""
+        try:
+            asyncio.run(self.serve_async())
+        except Exception as e:
+            logs.error('server_error', exc_info=True, error=e)
+        finally:
+            self.close_storage()  # Save data before shutting down
+            self.server_socket.close()
+
+    async def serve_async(self):
+        self.server_socket.bind((self.host, self.port))
+        self.server_socket.setblocking(False)
+        server = await asyncio.start_server(
+            self.handle_client_async,
+            sock=self.server_socket,
+            backlog=self.backlog
+        )
+        logs.info('listening', host=self.host, port=self.port, mode='asyncio')
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(BLOCKING_THREADS, thread_name_prefix='blocking-request'))
+        # Fan out on the event loop, where the connections' writers live
+        self.change_feed.execute = loop.call_soon_threadsafe
+
+        # Let the event loop wind down instead of exiting from inside a callback
+        stop_event = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop_event.set)
+
+        async with server:
+            await stop_event.wait()
+            logs.info('shutdown_signal')
+
+    def runs_off_loop(self, frame):
+        # Writes on a worker wait for the owner process, password checks wait for
+        # the hashing pool and other writes wait for their journal fsync, so they
+        # all keep the event loop free meanwhile; on the loop, every write would
+        # get an fsync of its own. A substring match is enough: a false positive
+        # only costs a hop to the executor
+        if self.replica is not None:
+            return any(action in frame for action in FORWARDED_ACTIONS)
+        if any(action in frame for action in PASSWORD_ACTIONS):
+            return True
+        return not self.durability_window and any(action in frame for action in JOURNALED_ACTIONS)
+
+    async def handle_client_async(self, reader, writer):
+        address = writer.get_extra_info('peername')
+        if not self.acquire_connection_slot():
+            logs.warning('connection_rejected', peer=address, max_connections=self.max_connections)
+            writer.close()
+            return
+
+        logs.debug('client_connected', peer=address)
+        loop = asyncio.get_running_loop()
+        # Past send_buffer unsent bytes, drain() below holds off reading the next request
+        writer.transport.set_write_buffer_limits(high=self.send_buffer)
+        session = {
+            'compression': None,
+            'open_pusher': lambda: AsyncSender(writer, max_buffer=self.send_buffer),
+            'buckets': {},
+            'peer': address[0] if address else None
+        }
+        try:
+            while True:
+                frame = await read_frame(reader)
+                if frame is None:
+                    logs.debug('client_disconnected', peer=address)
                     break
+
+                if self.runs_off_loop(frame):
+                    response_data, compressed = await loop.run_in_executor(None, self.handle_frame, frame, session)
+                else:
+                    response_data, compressed = self.handle_frame(frame, session)
+                writer.writelines([frame_header(response_data, compressed), response_data])
+                await asyncio.wait_for(writer.drain(), self.send_timeout or None)
+        except FrameError as e:
+            logs.warning('framing_error', peer=address, error=e)
+        except asyncio.TimeoutError:
+            logs.warning('send_timeout', peer=address, seconds=self.send_timeout)
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            logs.debug('connection_error', peer=address, error=e)
         except Exception as e:
-            print(f"Error handling request: {e}")
+            logs.error('client_error', exc_info=True, peer=address, error=e)
         finally:
-            print(f"Closing connection with {address}")
-            client_socket.close()
+            logs.debug('connection_closed', peer=address)
+            self.end_subscription(session)
+            writer.close()
+            self.release_connection_slot()
+
+    def serve_workers(self, count, worker_options):
+        """Run as the owner of `count` worker processes that share the listening port.
+
+        Workers parse requests and encode responses on their own cores and
+        serve reads from replicas of this store. Writes are forwarded here,
+        applied in order and streamed to every replica as journal records.
+        """
+        # Shut down from the finally below rather than in the handler, which could
+        # otherwise run while this thread holds the store still in add_replica
+        signal.signal(signal.SIGINT, self.exit_handler)
+        signal.signal(signal.SIGTERM, self.exit_handler)
+        self.replication = ReplicationHub(self.handle_owner_request)
+        self.journal.on_append = self.replication.broadcast
+        context = multiprocessing.get_context('spawn')
+        try:
+            for i in range(count):
+                owner_end, worker_end = context.Pipe()
+                options = dict(worker_options)
+                if options.get('metrics_port'):
+                    options['metrics_port'] += 1 + i
+                process = context.Process(target=run_worker, args=(worker_end, options), name=f'worker-{i}', daemon=True)
+                process.start()
+                worker_end.close()
+                self.add_replica(owner_end)
+                self.workers.append(process)
+            logs.info('workers_started', host=self.host, port=self.port, workers=count)
+
+            running = {process.sentinel: process for process in self.workers}
+            while running:
+                for sentinel in multiprocessing.connection.wait(list(running)):
+                    process = running.pop(sentinel)
+                    logs.error('worker_exited', worker=process.name, exitcode=process.exitcode)
+        except Exception as e:
+            logs.error('server_error', exc_info=True, error=e)
+        finally:
+            self.close_storage()
+
+    def add_replica(self, conn):
+        # Captured with every writer held still, so the worker gets exactly the journal records after its state
+        with self.vote_flush_lock, self.store.frozen():
+            state = (self.store.all(), dict(self.store.users), self.journal.appended_seq)
+            self.replication.add(conn, state)
+
+    def handle_owner_request(self, frame):
+        """A write forwarded by a worker; the worker compresses the response for its client"""
+        return self.handle_frame(frame, {'compression': None})[0]
+
+    def apply_replicated(self, record):
+        """Apply one journal record from the owner to this worker's replica"""
+        kind = record['op']
+        # Deleting an answer returns the answer, but events are routed by its question
+        question = self.store.get(record['question_id']) if kind == 'delete_answer' else None
+        result = self.store.apply(record)
+        self.response_cache.invalidate()
+        if kind != 'votes' and kind != 'put_user':
+            self.last_modified = datetime.now(timezone.utc)
+        if not self.change_feed.subscribers:
+            return
+        if kind == 'votes':
+            self.change_feed.publish(vote_events(record['votes'], self.store))
+        else:
+            event = op_event(record, result, question if kind == 'delete_answer' else result)
+            if event is not None:
+                self.change_feed.publish([event])
+
+    def owner_lost(self):
+        # Without the owner this worker can neither write nor stay current
+        logs.error('owner_lost')
+        os.kill(os.getpid(), signal.SIGTERM)
 
     def process_request(self, request):
         action = request.get('action')
-        print(f"\nReceived request with action: {action}")
-        print(f"Full request: {request}")
+        logs.debug('request', action=action)
+        logs.debug_payload('request_payload', request, action=action)
         
         try:
+            if action in AUTHENTICATED_ACTIONS and self.require_tokens and 'token' not in request:
+                return {
+                    'status': 'error',
+                    'code': 'invalid_token',
+                    'message': 'Please log in first'
+                }
+            if action in AUTHENTICATED_ACTIONS and 'token' in request:
+                # A session token stands in for the user ids a client would otherwise send
+                token = request['token']
+                email = self.sessions.lookup(token) if isinstance(token, str) else None
+                user = self.find_user_by_email(email) if email is not None else None
+                if user is None:
+                    return {
+                        'status': 'error',
+                        'code': 'invalid_token',
+                        'message': 'Session expired, please log in again'
+                    }
+                request = self.act_as(request, user['username'])
+
             if action == 'get_questions':
                 # Add client's last update time to request
                 client_last_update = request.get('last_update')
@@ -139,43 +682,134 @@ class StackOverflowServer:
                     except (ValueError, TypeError):
                         pass  # Invalid timestamp, continue with normal response
                 
-                print(f"Returning {len(self.questions)} questions")
                 return {
                     'status': 'success',
-                    'data': self.questions,
+                    'data': self.store.all(),
                     'last_modified': self.last_modified.isoformat()
                 }
             
+            elif action == 'get_changes':
+                # Only records changed after the client's last seen sequence number
+                since = request.get('since') or 0
+                changes = self.store.changes_since(since, request.get('epoch'))
+                return {
+                    'status': 'success',
+                    'seq': self.store.seq,
+                    'epoch': self.store.epoch,
+                    **changes
+                }
+            
+            elif action in ('list_questions', 'sort_questions'):
+                # One page from a maintained sort order; pass next_cursor back for the following page
+                sort_by = request.get('sort_by') or 'newest'
+                search_text = request.get('search_text')
+                try:
+                    limit = page_limit(request, 20, 200)
+                    if search_text:
+                        # Search results are a single ranked page
+                        page, next_cursor = self.store.search(search_text, limit, sort_by), None
+                    else:
+                        page, next_cursor = self.store.page(sort_by, request.get('cursor'), limit)
+                except ValueError as e:
+                    return {
+                        'status': 'error',
+                        'message': str(e)
+                    }
+                return {
+                    'status': 'success',
+                    'data': page,
+                    'next_cursor': next_cursor,
+                    'seq': self.store.seq
+                }
+            
+            elif action == 'filter_questions':
+                # Ranked full-text search over titles, bodies and answers
+                try:
+                    limit = page_limit(request, 50, 200)
+                except ValueError as e:
+                    return {
+                        'status': 'error',
+                        'message': str(e)
+                    }
+                results = self.store.search(request.get('search_text') or '', limit)
+                return {
+                    'status': 'success',
+                    'data': results
+                }
+            
+            elif action == 'get_tags':
+                try:
+                    limit = page_limit(request, 50, 1000)
+                except ValueError as e:
+                    return {
+                        'status': 'error',
+                        'message': str(e)
+                    }
+                return {
+                    'status': 'success',
+                    'data': self.store.tag_index.top(limit),
+                    'total_tags': len(self.store.tag_index.by_tag)
+                }
+            
+            elif action == 'questions_by_tag':
+                # 'tags' with match 'all' (default) or 'any'; a single 'tag' also works
+                tags = request.get('tags') or [request.get('tag')]
+                if not isinstance(tags, list) or not all(isinstance(tag, str) for tag in tags):
+                    return {
+                        'status': 'error',
+                        'message': 'tags must be a list of strings'
+                    }
+                try:
+                    limit = page_limit(request, 20, 200)
+                    page, next_cursor = self.store.questions_by_tag(
+                        tags,
+                        match_all=request.get('match', 'all') != 'any',
+                        cursor=request.get('cursor'),
+                        limit=limit
+                    )
+                except ValueError as e:
+                    return {
+                        'status': 'error',
+                        'message': str(e)
+                    }
+                return {
+                    'status': 'success',
+                    'data': page,
+                    'next_cursor': next_cursor
+                }
+            
             elif action == 'add_question':
                 # Update last_modified when data changes
                 self.last_modified = datetime.now(timezone.utc)
                 question = request.get('question')
-                print(f"Adding question: {question}")
-                question['created_date'] = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
-                self.questions.insert(0, question)
-                self.save_data()  # Changed from save_questions() to save_data()
-                print(f"Questions after adding: {len(self.questions)}")
-                return {
-                    'status': 'success',
-                    'data': self.questions
-                }
+                question['created_date'] = timestamp()
+                question = normalize_question(question)
+                # Checked under the id's stripe, so two adds of one id can't both pass;
+                # only journal replay may replace an existing question
+                with self.store.stripe(question['id']):
+                    if question['id'] in self.store:
+                        return {
+                            'status': 'error',
+                            'message': f"A question with id {question['id']} already exists"
+                        }
+                    question = self.commit({'op': 'add_question', 'question': question})
+                logs.info('question_added', question_id=question['id'], body_bytes=len(question['body']))
+                return self.mutation_response(request, question=question)
             
             elif action == 'add_answer':
                 # Update last_modified when data changes
                 self.last_modified = datetime.now(timezone.utc)
                 question_id = request.get('questionId')
                 answer = request.get('answer')
-                answer['created_date'] = datetime.now(timezone.utc).isoformat()
+                answer['created_date'] = timestamp()
+                answer = normalize_answer(answer, question_id)
                 
-                for q in self.questions:
-                    if q['id'] == question_id:
-                        if 'answers' not in q:
-                            q['answers'] = []
-                        q['answers'].append(answer)
-                        self.save_questions()  # Save after adding answer
-                        break
+                if question_id in self.store:
+                    # A question deleted in the meantime makes this a logged no-op
+                    self.commit({'op': 'add_answer', 'question_id': question_id, 'answer': answer})
+                    logs.info('answer_added', question_id=question_id, answer_id=answer['id'], body_bytes=len(answer['body']))
                 
-                return {'status': 'success', 'data': self.questions}
+                return self.mutation_response(request, questionId=question_id, answer=answer)
 
             elif action == 'delete_answer':
                 # Update last_modified when data changes
@@ -184,40 +818,30 @@ class StackOverflowServer:
                 question_id = request.get('questionId')
                 author_id = request.get('authorId')
                 
-                print(f"Deleting answer {answer_id} from question {question_id}")
-                print(f"Request author_id: {author_id}")
-                
-                # Find the question
-                for question in self.questions:
-                    if question['id'] == question_id:
-                        # Find the answer and verify the author
-                        answer_to_delete = None
-                        for answer in question.get('answers', []):
-                            if answer['id'] == answer_id:
-                                # Get author ID from either authorId or author_id
-                                answer_author = answer.get('authorId') or answer.get('author_id')
-                                print(f"Answer author_id: {answer_author}")
-                                print(f"Answer full data: {answer}")
-                                
-                                # Verify the author
-                                if answer_author != author_id:
-                                    return {
-                                        'status': 'error',
-                                        'message': f"Unauthorized: Only the author can delete this answer. Request author: {author_id}, Answer author: {answer_author}"
-                                    }
-                                answer_to_delete = answer
-                                break
+                # Find the answer and verify the author; the stripe lock keeps the
+                # check and the delete atomic against other writers on this question
+                with self.store.stripe(question_id):
+                    answer = self.store.get_answer(question_id, answer_id)
+                    if answer is not None:
+                        answer_author = answer['authorId']
                         
-                        if answer_to_delete:
-                            # Remove the answer
-                            question['answers'] = [a for a in question['answers'] if a['id'] != answer_id]
-                            # Save the changes
-                            self.save_data()  # Make sure to save after deletion
+                        # Verify the author
+                        if answer_author != author_id:
                             return {
-                                'status': 'success',
-                                'message': 'Answer deleted successfully',
-                                'data': self.questions
+                                'status': 'error',
+                                'message': f"Unauthorized: Only the author can delete this answer. Request author: {author_id}, Answer author: {answer_author}"
                             }
+                        
+                        # Remove the answer and log the deletion
+                        self.commit({'op': 'delete_answer', 'question_id': question_id, 'answer_id': answer_id})
+                        logs.info('answer_deleted', question_id=question_id, answer_id=answer_id)
+                if answer is not None:
+                    return self.mutation_response(
+                        request,
+                        message='Answer deleted successfully',
+                        questionId=question_id,
+                        answerId=answer_id
+                    )
                 
                 return {
                     'status': 'error',
@@ -227,93 +851,148 @@ class StackOverflowServer:
             elif action == 'vote':
                 question_id = request.get('questionId')
                 vote_type = request.get('voteType')
+                user_id = request.get('userId') or request.get('user_id')
                 
-                for q in self.questions:
-                    if q['id'] == question_id:
-                        if vote_type == 'upvote':
-                            q['upvotes'] = q.get('upvotes', 0) + 1
-                        elif vote_type == 'downvote':
-                            q['downvotes'] = q.get('downvotes', 0) + 1
-                        q['votes'] = q.get('upvotes', 0) - q.get('downvotes', 0)
-                        break
+                # One vote per user per question, so the voter must be known
+                if not isinstance(user_id, str) or not user_id:
+                    return {
+                        'status': 'error',
+                        'message': 'userId is required to vote'
+                    }
+                value = VOTE_VALUES.get(vote_type) if isinstance(vote_type, (str, int)) else None
+                if value is None:
+                    return {
+                        'status': 'error',
+                        'message': f'Invalid voteType: {vote_type}'
+                    }
                 
-                return {'status': 'success'}
+                totals = self.store.cast_vote(question_id, user_id, value)
+                if totals is None:
+                    return {
+                        'status': 'error',
+                        'message': 'Question not found'
+                    }
+                upvotes, downvotes = totals
+                return {
+                    'status': 'success',
+                    'questionId': question_id,
+                    'upvotes': upvotes,
+                    'downvotes': downvotes,
+                    'votes': upvotes - downvotes,
+                    'user_vote': value
+                }
             
             elif action == 'login':
                 email = request.get('email')
                 password = request.get('password')
-                
-                print(f"Attempting to log in with email: {email} and password: {password}")
+                if not isinstance(email, str) or not isinstance(password, str):
+                    return {
+                        'status': 'error',
+                        'message': 'Invalid email or password'
+                    }
                 
                 user = self.find_user_by_email(email)  # Check if user exists
-                if user:
-                    print(f"User found: {user}")
-                    if user['password'] == password:  # Check password
-                        return {
-                            'status': 'success',
-                            'message': 'Login successful',
-                            'username': user['username']
-                        }
-                    else:
-                        print("Password does not match.")
-                        return {
-                            'status': 'error',
-                            'message': 'Invalid email or password'
-                        }
-                else:
-                    print("No user found with that email.")
+                # Unknown emails are checked against a dummy hash so they take as long as a wrong password
+                matches, rehash = self.passwords.verify(user['password'] if user else None, password)
+                if not matches:
+                    logs.info('login_failed', email=email, reason='password' if user else 'unknown_user')
                     return {
                         'status': 'error',
                         'message': 'Invalid email or password'
                     }
+                if rehash:
+                    self.upgrade_password(email, user, password)
+                return {
+                    'status': 'success',
+                    'message': 'Login successful',
+                    'username': user['username'],
+                    'token': self.sessions.issue(email),
+                    'expires_in': self.sessions.ttl
+                }
+            
+            elif action == 'logout':
+                token = request.get('token')
+                if isinstance(token, str):
+                    self.sessions.revoke(token)
+                return {
+                    'status': 'success',
+                    'message': 'Logged out'
+                }
             
             elif action == 'sign_up':
                 username = request.get('username')
                 email = request.get('email')
                 password = request.get('password')
-
-                # Check if the user already exists
-                if self.find_user_by_email(email):
+                if not isinstance(email, str) or not isinstance(password, str) or not password:
                     return {
                         'status': 'error',
-                        'message': 'Account already exists'
+                        'message': 'Email and password are required'
                     }
+                # Session tokens act as the username, so it must name exactly one account
+                if not isinstance(username, str) or not username.strip():
+                    return {
+                        'status': 'error',
+                        'message': 'Username is required'
+                    }
+                error = self.sign_up_conflict(email, username)
+                if error:
+                    return error
+                # Hashed before taking the lock, so a slow hash never holds up other writers
+                hashed = self.passwords.hash(password)
+
+                with self.sign_up_lock, self.store.stripe(email):
+                    # Check again: someone may have signed up with this email or username while hashing
+                    error = self.sign_up_conflict(email, username)
+                    if error:
+                        return error
 
-                # Create a new user account
-                new_user = {
+                    # Create a new user account
+                    new_user = {
+                        'username': username,
+                        'email': email,
+                        'password': hashed,
+                        'created_date': timestamp()
+                    }
+                    # Store user in the database
+                    self.commit({'op': 'put_user', 'email': email, 'user': new_user})
+                    logs.info('user_signed_up', email=email)
+
+                return {
+                    'status': 'success',
+                    'message': 'Account created successfully',
                     'username': username,
-                    'email': email,
-                    'password': password,  # In a real application, hash the password
-                    'created_date': datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+                    'token': self.sessions.issue(email),
+                    'expires_in': self.sessions.ttl
                 }
-                self.data['users'][email] = new_user  # Store user in the database
-                self.save_data()  # Save the updated user data
-
+            
+            elif action == 'stats':
                 return {
                     'status': 'success',
-                    'message': 'Account created successfully'
+                    **self.metrics.snapshot()
                 }
             
             elif action == 'delete_question':
                 question_id = request.get('question_id')
                 author_id = request.get('author_id')
                 
-                # Find and remove the question
-                questions = self.data.get('questions', [])
-                updated_questions = [q for q in questions if q['id'] != question_id]
-                
-                # Update both in-memory and file storage
-                self.questions = updated_questions
-                self.data['questions'] = updated_questions
-                
-                # Save to file immediately
-                self.save_data()
+                # Find the question and verify the author under its stripe, as for answers
+                with self.store.stripe(question_id):
+                    question = self.store.get(question_id)
+                    if question is not None:
+                        if question['author_id'] != author_id:
+                            return {
+                                'status': 'error',
+                                'message': f"Unauthorized: Only the author can delete this question. Request author: {author_id}, Question author: {question['author_id']}"
+                            }
+                        self.last_modified = datetime.now(timezone.utc)
+                        self.commit({'op': 'delete_question', 'question_id': question_id})
+                        logs.info('question_deleted', question_id=question_id)
                 
-                return {
-                    'status': 'success',
-                    'message': 'Question deleted successfully',
-                    'data': updated_questions
-                }
+                return self.mutation_response(
+                    request,
+                    message='Question deleted successfully',
+                    question_id=question_id
+                )
             
             else:
                 return {
@@ -322,47 +1001,280 @@ class StackOverflowServer:
                 }
                 
         except Exception as e:
-            print(f"Error processing request: {e}")
-            import traceback
-            traceback.print_exc()
+            logs.error('request_failed', exc_info=True, action=action, error=e)
             return {
                 'status': 'error',
                 'message': str(e)
             }
 
+    def act_as(self, request, username):
+        """A copy of request acting as username, whatever ids the client put in it"""
+        request = dict(request)
+        field = IDENTITY_FIELDS.get(request.get('action'))
+        if field is not None:
+            request[field] = username
+        if isinstance(request.get('question'), dict):
+            request['question'] = dict(request['question'], author_id=username)
+        if isinstance(request.get('answer'), dict):
+            request['answer'] = dict(request['answer'], authorId=username)
+        return request
+
+    def upgrade_password(self, email, user, password):
+        """Store a fresh hash for a plaintext or outdated password the user just proved they know"""
+        hashed = self.passwords.hash(password)
+        with self.store.stripe(email):
+            current = self.find_user_by_email(email)
+            # Leave it alone if the password changed while hashing
+            if current is None or current['password'] != user['password']:
+                return
+            self.commit({'op': 'put_user', 'email': email, 'user': dict(current.to_dict(), password=hashed)})
+        logs.info('password_rehashed', email=email, was_plaintext=not is_hashed(user['password']))
+
     def find_user_by_email(self, email):
-        return self.users.get(email)  # Return user data if email exists, otherwise None
+        return self.store.users.get(email)  # Return user data if email exists, otherwise None
+
+    def sign_up_conflict(self, email, username):
+        """The error response for a sign_up whose email or username is taken, else None"""
+        if self.find_user_by_email(email):
+            return {
+                'status': 'error',
+                'message': 'Account already exists'
+            }
+        if username in self.store.usernames:
+            return {
+                'status': 'error',
+                'message': 'Username is already taken'
+            }
+        return None
+
+    def mutation_response(self, request, **fields):
+        """Acknowledge a write with just the affected record and the new change sequence.
+
+        Older clients that still expect the whole question list back can send
+        'include_questions': true.
+        """
+        response = {'status': 'success', 'seq': self.store.seq, **fields}
+        if request.get('include_questions'):
+            response['data'] = self.store.all()
+        return response
+
+    def commit(self, op):
+        """Apply a mutation to the store and make it durable with one journal append"""
+        # The record's stripe keeps apply order and journal order the same for that record
+        with self.store.stripe(self.store.op_key(op)):
+            result = self.store.apply(op)
+            seq = self.journal.append(op, wait=False)
+            if self.change_feed.subscribers:
+                # Published under the stripe, so events for one question go out in order
+                question = self.store.get(op['question_id']) if op['op'] == 'delete_answer' else result
+                event = op_event(op, result, question)
+                if event is not None:
+                    self.change_feed.publish([event])
+        self.response_cache.invalidate()
+        if not self.durability_window:
+            # Wait for the fsync without holding any lock, so writers share one sync
+            self.journal.wait_durable(seq)
+        # Fold the journal into a fresh snapshot once it has grown long enough
+        if self.journal.needs_compaction():
+            self.snapshot_requested.set()
+        return result
+
+    def snapshot_loop(self):
+        while True:
+            self.snapshot_requested.wait()
+            if self.stopping.is_set():
+                return
+            self.snapshot_requested.clear()
+            if self.journal.needs_compaction():
+                self.save_data()
+
+    def vote_flush_loop(self):
+        while not self.stopping.wait(self.vote_flush_interval):
+            try:
+                self.flush_votes()
+            except Exception as e:
+                logs.error('vote_flush_failed', exc_info=True, error=e)
+
+    def flush_votes(self):
+        """Publish the votes cast since the last flush and log them as one journal record"""
+        with self.vote_flush_lock:
+            batch = self.store.take_vote_batch()
+            if not batch:
+                return
+            self.store.publish_votes({question_id for question_id, _, _ in batch})
+            self.response_cache.invalidate()
+            if self.change_feed.subscribers:
+                self.change_feed.publish(vote_events(batch, self.store))
+            self.journal.append({'op': 'votes', 'votes': batch}, wait=False)
+
+    def close_storage(self):
+        if self.storage_closed:
+            return
+        self.stopping.set()
+        if self.replica is not None:
+            # Nothing to save: the owner process holds the data
+            self.change_feed.close()
+            self.storage_closed = True
+            return
+        # Stop the workers first so no more writes arrive
+        for process in self.workers:
+            process.terminate()
+        for process in self.workers:
+            process.join(5)
+        if self.replication is not None:
+            self.replication.close()
+        # Let a snapshot in progress finish, then write the final one here
+        self.snapshot_requested.set()
+        if self.snapshot_writer is not threading.current_thread():
+            self.snapshot_writer.join()
+        self.flush_votes()
+        self.save_data()
+        self.journal.close()
+        self.change_feed.close()
+        self.storage_closed = True
 
     def save_data(self):
-        print("Saving data to database...")
+        """Compact: write a full snapshot and drop the journal records it covers.
+
+        The store is only locked while the current record lists are captured;
+        records are copy-on-write, so they are encoded and written out while
+        requests keep mutating the store.
+        """
+        with self.compaction_lock:
+            return self._save_data()
+
+    def _save_data(self):
         try:
-            data_to_save = {
-                'questions': self.questions,
-                'users': self.users
-            }
-            
-            # Save to a temporary file first
-            temp_file = 'server/database.temp.pkl'
-            with open(temp_file, 'wb') as f:
-                pickle.dump(data_to_save, f)
-            
-            # If save was successful, replace the original file
-            os.replace(temp_file, 'server/database.pkl')
-            
-            print(f"Data saved successfully - {len(self.questions)} questions and {len(self.users)} users")
+            started = time.perf_counter()
+            # With every stripe held no write is between being applied and being
+            # journaled, so the capture holds exactly the records up to seq
+            with self.vote_flush_lock, self.store.frozen():
+                questions = self.store.all()
+                users = dict(self.store.users)
+                seq = self.journal.appended_seq
+            if seq == self.saved_seq:
+                return True  # nothing written since
+            write_snapshot(SNAPSHOT_PATH, questions, users, seq)
+            self.journal.discard_through(seq)
+            self.saved_seq = seq
+            self.metrics.observe_persistence('snapshot', time.perf_counter() - started)
+            logs.info('snapshot_saved', questions=len(questions), users=len(users), journal_seq=seq)
             return True
         except Exception as e:
-            print(f"Error saving data: {e}")
+            logs.error('snapshot_save_failed', exc_info=True, error=e)
             # Clean up temp file if it exists
-            if os.path.exists('server/database.temp.pkl'):
-                os.remove('server/database.temp.pkl')
+            if os.path.exists(SNAPSHOT_PATH + '.tmp'):
+                os.remove(SNAPSHOT_PATH + '.tmp')
             return False
 
+def run_worker(conn, options):
+    """Entry point of a --workers process"""
+    options = dict(options)
+    mode = options.pop('mode')
+    logs.setup_logging(options.pop('log_level'), options.pop('debug_sample_rate'))
+    try:
+        server = StackOverflowServer(replica=ReplicaLink(conn), **options)
+        if mode == 'asyncio':
+            server.start_async()
+        else:
+            server.start()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        logs.stop_logging()
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Stack Overflow clone server")
+    parser.add_argument('--mode', choices=['threaded', 'asyncio'], default='threaded',
+                        help="threaded spawns one thread per client, asyncio serves every client from one event loop")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=54321)
+    parser.add_argument('--workers', type=int, default=1,
+                        help="with more than 1, this process owns the data and that many worker processes "
+                             "serve clients on a shared SO_REUSEPORT listener, each in --mode")
+    parser.add_argument('--backlog', type=int, default=128, help="listen() backlog")
+    parser.add_argument('--max-connections', type=int, default=10000, help="maximum simultaneously open clients")
+    parser.add_argument('--compact-every', type=int, default=1000,
+                        help="journal records to accumulate before rewriting the database snapshot")
+    parser.add_argument('--durability-window', type=float, default=0,
+                        help="seconds of acknowledged writes a crash may lose, coalesced into one sync; "
+                             "0 acknowledges writes only after their fsync")
+    parser.add_argument('--push-interval', type=float, default=0.05,
+                        help="seconds change events collect before being pushed to subscribers in one batch")
+    parser.add_argument('--vote-flush-interval', type=float, default=0.2,
+                        help="seconds between batched vote writes")
+    parser.add_argument('--response-cache-mb', type=int, default=64,
+                        help="memory budget for cached read responses, 0 disables the cache")
+    parser.add_argument('--compress-threshold', type=int, default=1024,
+                        help="smallest response in bytes to deflate for clients that negotiated compression")
+    parser.add_argument('--compress-level', type=int, default=6, choices=range(1, 10), metavar='1-9')
+    parser.add_argument('--hash-iterations', type=int, default=DEFAULT_ITERATIONS,
+                        help="PBKDF2-SHA256 iterations for stored passwords; older hashes are upgraded at login")
+    parser.add_argument('--session-ttl', type=int, default=24 * 60 * 60,
+                        help="seconds a login's session token stays valid")
+    parser.add_argument('--max-sessions', type=int, default=100000,
+                        help="session tokens kept in memory; the oldest is dropped when a new login exceeds it")
+    parser.add_argument('--require-tokens', action='store_true',
+                        help="reject writes and votes that carry no session token; by default they are still "
+                             "trusted to act as the user ids they name, as clients did before login tokens")
+    parser.add_argument('--connection-limits', type=parse_limits, default=DEFAULT_CONNECTION_LIMITS,
+                        help="token buckets per connection as class=rate[/burst],... for the classes "
+                             "read, write, vote and auth; '' disables them")
+    parser.add_argument('--user-limits', type=parse_limits, default=DEFAULT_USER_LIMITS,
+                        help="the same per user across connections: the account a session token belongs to, "
+                             "else the client's address")
+    parser.add_argument('--send-buffer-kb', type=int, default=256,
+                        help="unsent response bytes per connection before the server stops reading its requests")
+    parser.add_argument('--send-timeout', type=float, default=30,
+                        help="seconds a client may leave a response unread before it is disconnected, 0 waits forever")
+    parser.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'])
+    parser.add_argument('--debug-sample-rate', type=float, default=0.01,
+                        help="fraction of requests whose redacted payload is logged at DEBUG")
+    parser.add_argument('--metrics-port', type=int, default=0,
+                        help="serve plain-text metrics over HTTP on 127.0.0.1 at this port, 0 disables it; "
+                             "with --workers, worker i serves on the port + 1 + i")
+    args = parser.parse_args()
+    logs.setup_logging(args.log_level, args.debug_sample_rate)
+
     try:
-        server = StackOverflowServer()
-        server.start()
+        options = dict(
+            host=args.host,
+            port=args.port,
+            backlog=args.backlog,
+            max_connections=args.max_connections,
+            response_cache_bytes=args.response_cache_mb * 1024 * 1024,
+            compress_threshold=args.compress_threshold,
+            compress_level=args.compress_level,
+            metrics_port=args.metrics_port,
+            push_interval=args.push_interval,
+            connection_limits=args.connection_limits,
+            user_limits=args.user_limits,
+            send_buffer=args.send_buffer_kb * 1024,
+            send_timeout=args.send_timeout
+        )
+        # Only the owner of the data needs these; workers forward writes and logins to it
+        storage = dict(
+            compact_every=args.compact_every,
+            vote_flush_interval=args.vote_flush_interval,
+            durability_window=args.durability_window,
+            hash_iterations=args.hash_iterations,
+            session_ttl=args.session_ttl,
+            max_sessions=args.max_sessions,
+            require_tokens=args.require_tokens
+        )
+        server = StackOverflowServer(**options, **storage)
+        if args.workers > 1:
+            # The owner serves no clients itself; its metrics port reports the writes it applied
+            server.serve_workers(args.workers, dict(
+                options, mode=args.mode, log_level=args.log_level, debug_sample_rate=args.debug_sample_rate
+            ))
+        elif args.mode == 'asyncio':
+            server.start_async()
+        else:
+            server.start()
     except KeyboardInterrupt:
-        print("\nServer shutting down...")
+        logs.info('shutdown')
     except Exception as e:
-        print(f"Fatal error: {e}") 
\ No newline at end of file
+        logs.error('fatal_error', exc_info=True, error=e)
+    finally:
+        logs.stop_logging() 
\ No newline at end of file
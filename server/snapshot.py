@@ -0,0 +1,197 @@
+import json
+import mmap
+import os
+import pickle
+import struct
+import sys
+
+from records import encode_record
+from schema import pack_question, unpack_question
+
+# Snapshot file layout, all integers little-endian:
+#
+#   header   magic, format version, question count, journal seq,
+#            users offset, users length, table offset,
+#            strings offset, strings length
+#   records  one compact JSON row per question (schema.pack_question), newest first
+#   users    one JSON object mapping email -> user
+#   strings  JSON list of the tags and user ids the rows refer to by index
+#   table    (offset, length) of every question record, in record order
+#
+# The header and table are fixed-size, so a reader can mmap the file and
+# decode any single question without touching the others. Unlike pickle,
+# loading a snapshot never runs code from the file.
+#
+# Version 1 stored each question as a keyed JSON object and had no string
+# table; it is still read so older snapshots load.
+MAGIC = b'SOQSNAP\x00'
+VERSION = 2
+PREFIX = struct.Struct('<8sI')
+HEADERS = {
+    1: struct.Struct('<8sIIQQQQ'),
+    2: struct.Struct('<8sIIQQQQQQ'),
+}
+ENTRY = struct.Struct('<QI')
+
+# Where the server keeps its data, relative to the repository root it runs from
+SNAPSHOT_PATH = 'server/database.snap'
+# Databases from before the snapshot format; read once and migrated on the next save
+DATABASE_PATH = 'server/database.pkl'
+# Writes made since the last snapshot, replayed on top of it
+JOURNAL_PATH = 'server/database.journal'
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def write_snapshot(path, questions, users, journal_seq=0):
+    """Atomically replace path with a snapshot of canonical questions (newest first) and users.
+
+    questions may be any iterable; records are encoded and written one at a time.
+    """
+    header = HEADERS[VERSION]
+    temp_path = path + '.tmp'
+    strings = {}
+
+    def ref(value):
+        index = strings.get(value)
+        if index is None:
+            index = strings[value] = len(strings)
+        return index
+
+    table = bytearray()
+    offset = header.size
+    with open(temp_path, 'wb') as f:
+        f.write(bytes(header.size))
+        for question in questions:
+            record = json.dumps(pack_question(question, ref), separators=(',', ':')).encode('utf-8')
+            f.write(record)
+            table += ENTRY.pack(offset, len(record))
+            offset += len(record)
+        users_record = json.dumps(users, separators=(',', ':'), default=encode_record).encode('utf-8')
+        strings_record = json.dumps(list(strings), separators=(',', ':')).encode('utf-8')
+        f.write(users_record)
+        f.write(strings_record)
+        f.write(table)
+        f.seek(0)
+        f.write(header.pack(
+            MAGIC, VERSION, len(table) // ENTRY.size, journal_seq,
+            offset, len(users_record),
+            offset + len(users_record) + len(strings_record),
+            offset + len(users_record), len(strings_record)
+        ))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+class Snapshot:
+    """Memory-mapped, read-only view of a snapshot file.
+
+    Behaves as a sequence of Question records, newest first; each one is
+    decoded from the mapping only when it is indexed.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < PREFIX.size:
+                raise SnapshotError(f"{path} is too short to be a snapshot")
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            magic, self.version = PREFIX.unpack_from(self.map, 0)
+            if magic != MAGIC:
+                raise SnapshotError(f"{path} is not a snapshot file")
+            header = HEADERS.get(self.version)
+            if header is None:
+                raise SnapshotError(f"{path} has unsupported snapshot version {self.version}")
+            if size < header.size:
+                raise SnapshotError(f"{path} is truncated")
+            fields = header.unpack_from(self.map, 0)
+            (self.count, self.journal_seq, self.users_offset,
+             self.users_length, self.table_offset) = fields[2:7]
+            if self.table_offset + self.count * ENTRY.size > size or self.users_offset + self.users_length > size:
+                raise SnapshotError(f"{path} is truncated")
+            self.strings = None
+            if self.version >= 2:
+                strings_offset, strings_length = fields[7:9]
+                if strings_offset + strings_length > size:
+                    raise SnapshotError(f"{path} is truncated")
+                # Shared by every record, so equal tags and ids are one object in memory
+                self.strings = [
+                    sys.intern(value)
+                    for value in json.loads(self.map[strings_offset:strings_offset + strings_length])
+                ]
+        except (SnapshotError, ValueError):
+            self.close()
+            raise
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        offset, length = ENTRY.unpack_from(self.map, self.table_offset + i * ENTRY.size)
+        record = json.loads(self.map[offset:offset + length])
+        if self.strings is None:
+            return record
+        return unpack_question(record, self.strings)
+
+    def users(self):
+        return json.loads(self.map[self.users_offset:self.users_offset + self.users_length])
+
+    def close(self):
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_database(path=None):
+    """A saved database as a dict of questions, users, journal_seq, legacy, path and close.
+
+    path may be a snapshot or a legacy pickle, told apart by the snapshot
+    magic. Without one, the snapshot is read, or the legacy pickle while
+    there is no snapshot yet. Snapshot questions are decoded one at a time as
+    they are used, so call close() once done with them. legacy is set for
+    records that predate the canonical schema and need normalizing.
+
+    Raises FileNotFoundError when there is no database and SnapshotError for
+    a damaged snapshot; a damaged pickle raises whatever unpickling raised.
+    """
+    if path is None:
+        path = SNAPSHOT_PATH if os.path.exists(SNAPSHOT_PATH) else DATABASE_PATH
+    with open(path, 'rb') as f:
+        is_snapshot = f.read(len(MAGIC)) == MAGIC
+    if is_snapshot:
+        snapshot = Snapshot(path)
+        return {
+            'questions': snapshot,
+            'users': snapshot.users(),
+            'journal_seq': snapshot.journal_seq,
+            'legacy': snapshot.version < VERSION,
+            'path': path,
+            'close': snapshot.close,
+        }
+
+    with open(path, 'rb') as f:
+        data = pickle.load(f)
+    if isinstance(data, list):
+        # Older databases only stored the question list
+        data = {'questions': data, 'users': {}}
+    return {
+        'questions': data.get('questions', []),
+        'users': data.get('users', {}),
+        'journal_seq': data.get('journal_seq', 0),
+        'legacy': True,
+        'path': path,
+        'close': lambda: None,
+    }
@@ -0,0 +1,435 @@
+import threading
+import uuid
+from collections import OrderedDict
+from contextlib import ExitStack, contextmanager
+
+from records import as_answer, as_question, as_user
+from indexes import SORT_KEYS, SortedIndex, TagIndex, decode_cursor, encode_cursor
+from search import SearchIndex
+from votes import VoteCounter
+
+
+class QuestionStore:
+    """In-memory questions and users with id indexes so mutations never scan the whole list.
+
+    Question records are copy-on-write: a mutation builds a new record and swaps it
+    in, so a list handed to a reader is never modified underneath it. Writers
+    hold the striped lock of the record they change while they read-modify-write
+    it, and take index_lock only to publish the new record into the shared
+    indexes. get_questions reads a published snapshot without locking.
+    """
+
+    def __init__(self, questions=None, users=None, max_tombstones=10000, stripe_count=64, defer_search=False):
+        # question id -> question dict; dicts keep insertion order, so this is oldest first
+        self.questions_by_id = {}
+        # question id -> {answer id -> answer dict} for the answers of that question
+        self.answers_by_id = {}
+        self.users = {email: as_user(user) for email, user in (users or {}).items()}
+        # username -> email. Session tokens act as their user's username, so sign_up
+        # keeps usernames unique; older databases may repeat one, and the first keeps it
+        self.usernames = {}
+        for email, user in self.users.items():
+            if isinstance(user.username, str) and user.username:
+                self.usernames.setdefault(user.username, email)
+        # (seq, newest-first list) published for lock-free readers
+        self._snapshot = None
+
+        self.stripes = [threading.RLock() for _ in range(stripe_count)]
+        self.index_lock = threading.RLock()
+
+        # Sorted indexes behind list_questions, one per sort order. Positions
+        # count insertions so "newest" and tie-breaks never compare dates.
+        self.positions = {}
+        self._next_position = 0
+        self.sorted_indexes = {sort_by: SortedIndex() for sort_by in SORT_KEYS}
+        self.search_index = SearchIndex()
+        # Tokenizing every body dominates a cold start, so with defer_search the
+        # loaded questions are queued here and text-indexed later by
+        # index_search_backlog() or the first search, whichever comes first
+        self.search_backlog = []
+        self._defer_search = defer_search
+        self.tag_index = TagIndex()
+        self.votes = VoteCounter()
+
+        # Change tracking for get_changes. Every insert/update/delete takes the next
+        # sequence number; change_log maps a record key (question id, or
+        # (question id, answer id) for an answer) to its latest sequence number and
+        # is kept in sequence order, so changes since N are read from the tail.
+        self.seq = 0
+        self.change_log = OrderedDict()
+        self.tombstones = OrderedDict()
+        self.max_tombstones = max_tombstones
+        # Clients that last synced before this point may have missed a trimmed tombstone
+        self.horizon = 0
+        # Sequence numbers restart with the process, so clients must resync when it changes
+        self.epoch = uuid.uuid4().hex
+
+        # `questions` is newest first, the same order get_questions returns
+        for question in reversed(questions or []):
+            self.add_question(question)
+        self._defer_search = False
+
+    def __len__(self):
+        return len(self.questions_by_id)
+
+    def __contains__(self, question_id):
+        return question_id in self.questions_by_id
+
+    def stripe(self, key):
+        """The lock guarding one question id (or user email)"""
+        return self.stripes[hash(key) % len(self.stripes)]
+
+    @contextmanager
+    def frozen(self):
+        """Hold every stripe lock, so no mutation is part way through.
+
+        Writers never hold two different stripes at once, so taking them all in
+        order cannot deadlock. Meant for brief captures such as a snapshot's
+        record lists; records themselves are copy-on-write and stay valid after.
+        """
+        with ExitStack() as stack:
+            for lock in self.stripes:
+                stack.enter_context(lock)
+            yield
+
+    def _index_question(self, question, counts=None):
+        """Publish a question into every index; counts are its search terms, unless search is deferred"""
+        question_id = question['id']
+        if question_id in self.questions_by_id:
+            # Re-adding an id moves it to the newest position
+            old_question = self.questions_by_id.pop(question_id)
+            self.tag_index.remove(question_id, old_question.get('tags') or [])
+            for answer_id in self.answers_by_id[question_id]:
+                self.change_log.pop((question_id, answer_id), None)
+        self.questions_by_id[question_id] = question
+        self.answers_by_id[question_id] = {a['id']: a for a in question['answers']}
+        self._next_position += 1
+        self.positions[question_id] = self._next_position
+        self._reindex(question_id)
+        if self._defer_search:
+            self.search_backlog.append(question_id)
+        else:
+            self.search_index.add_question(question, counts)
+        self.tag_index.add(question_id, question.get('tags') or [], self.positions[question_id])
+        self.votes.load(question)
+        self.touch(question_id)
+
+    def _reindex(self, question_id):
+        question = self.questions_by_id[question_id]
+        position = self.positions[question_id]
+        for sort_by, index in self.sorted_indexes.items():
+            index.update(question_id, SORT_KEYS[sort_by](question, position))
+
+    def touch(self, key):
+        """Record that a question (key = id) or answer (key = (question id, answer id)) changed.
+
+        Called last in every mutation: bumping seq is what invalidates the snapshot.
+        """
+        self.seq += 1
+        self.tombstones.pop(key, None)
+        self.change_log[key] = self.seq
+        self.change_log.move_to_end(key)
+        return self.seq
+
+    def _bury(self, key):
+        self.seq += 1
+        self.change_log.pop(key, None)
+        self.tombstones[key] = self.seq
+        self.tombstones.move_to_end(key)
+        while len(self.tombstones) > self.max_tombstones:
+            _, trimmed_seq = self.tombstones.popitem(last=False)
+            self.horizon = max(self.horizon, trimmed_seq)
+
+    def all(self):
+        """All questions, newest first, without taking any lock.
+
+        The snapshot is tagged with the seq read before building it; a writer
+        bumps seq only after its change is in place, so a snapshot that raced
+        with a write is never reused once that write completes.
+        """
+        snapshot = self._snapshot
+        seq = self.seq
+        if snapshot is not None and snapshot[0] == seq:
+            return snapshot[1]
+        questions = list(reversed(self.questions_by_id.values()))
+        self._snapshot = (seq, questions)
+        return questions
+
+    def get(self, question_id):
+        return self.questions_by_id.get(question_id)
+
+    def add_question(self, question):
+        # The store owns its copy; callers keep theirs
+        question = as_question(question)
+        # Tokenized before anything shared changes, so a record that fails here leaves no trace
+        counts = None if self._defer_search else self.search_index.question_counts(question)
+        with self.stripe(question['id']), self.index_lock:
+            self._index_question(question, counts)
+        return question
+
+    def delete_question(self, question_id):
+        with self.stripe(question_id), self.index_lock:
+            question = self.questions_by_id.pop(question_id, None)
+            if question is not None:
+                for answer_id in self.answers_by_id.pop(question_id):
+                    self.change_log.pop((question_id, answer_id), None)
+                    self.tombstones.pop((question_id, answer_id), None)
+                for index in self.sorted_indexes.values():
+                    index.remove(question_id)
+                del self.positions[question_id]
+                self.search_index.remove_question(question_id)
+                self.tag_index.remove(question_id, question.get('tags') or [])
+                self.votes.forget(question_id)
+                self._bury(question_id)
+        return question
+
+    def get_answer(self, question_id, answer_id):
+        answers = self.answers_by_id.get(question_id)
+        if answers is None:
+            return None
+        return answers.get(answer_id)
+
+    def _replace_question(self, question):
+        """Publish a new version of an existing question (same position and key)"""
+        self.questions_by_id[question['id']] = question
+        self._reindex(question['id'])
+
+    def add_answer(self, question_id, answer):
+        with self.stripe(question_id):
+            question = self.questions_by_id.get(question_id)
+            if question is None:
+                return None
+            answer = as_answer(answer)
+            counts = self.search_index.answer_counts(answer)
+            updated = question.copy()
+            existing = self.answers_by_id[question_id].get(answer['id'])
+            if existing is not None:
+                # Same answer id again (e.g. a replayed journal record): replace it
+                updated['answers'] = [answer if a is existing else a for a in question['answers']]
+            else:
+                updated['answers'] = question['answers'] + [answer]
+
+            with self.index_lock:
+                self.answers_by_id[question_id][answer['id']] = answer
+                self._replace_question(updated)
+                self.search_index.add_answer(question_id, answer, counts)
+                self.touch((question_id, answer['id']))
+        return updated
+
+    def delete_answer(self, question_id, answer_id):
+        with self.stripe(question_id):
+            answer = self.get_answer(question_id, answer_id)
+            if answer is None:
+                return None
+            updated = self.questions_by_id[question_id].copy()
+            # Identity match, so this only touches the answers of one question
+            updated['answers'] = [a for a in updated['answers'] if a is not answer]
+
+            with self.index_lock:
+                del self.answers_by_id[question_id][answer_id]
+                self._replace_question(updated)
+                self.search_index.remove_answer(question_id, answer_id)
+                self._bury((question_id, answer_id))
+        return answer
+
+    def cast_vote(self, question_id, user_id, value):
+        """Count one user's vote right away; the record is refreshed by the next publish_votes.
+
+        Returns the question's (upvotes, downvotes), or None if it doesn't exist.
+        """
+        with self.stripe(question_id):
+            changed = self.votes.cast(question_id, user_id, value)
+            if changed is None:
+                return None
+            if changed:
+                self.votes.mark_pending(question_id, user_id, value)
+            return tuple(self.votes.totals[question_id])
+
+    def take_vote_batch(self):
+        return self.votes.take_pending()
+
+    def publish_votes(self, question_ids):
+        """Copy the current vote totals into the records of the given questions"""
+        for question_id in question_ids:
+            with self.stripe(question_id):
+                question = self.questions_by_id.get(question_id)
+                if question is None:
+                    continue
+                upvotes, downvotes = self.votes.totals[question_id]
+                updated = question.copy()
+                updated['upvotes'] = upvotes
+                updated['downvotes'] = downvotes
+                updated['votes'] = upvotes - downvotes
+                updated['user_votes'] = dict(self.votes.user_votes[question_id])
+
+                with self.index_lock:
+                    self._replace_question(updated)
+                    self.touch(question_id)
+
+    def page(self, sort_by='newest', cursor=None, limit=20):
+        """One page of questions in a maintained sort order plus the cursor for the next page"""
+        index = self.sorted_indexes.get(sort_by)
+        if index is None:
+            raise ValueError(f"Unknown sort order: {sort_by}")
+        after = decode_cursor(sort_by, cursor) if cursor else None
+        with self.index_lock:
+            try:
+                entries, has_more = index.page(after, limit)
+            except TypeError:
+                raise ValueError("Invalid cursor")
+            questions = [self.questions_by_id[entry[-1]] for entry in entries]
+        next_cursor = encode_cursor(sort_by, entries[-1]) if has_more and entries else None
+        return questions, next_cursor
+
+    def questions_by_tag(self, tags, match_all=True, cursor=None, limit=20):
+        """One page of the newest questions tagged with all (or any) of `tags`"""
+        after = decode_cursor('tags', cursor) if cursor else None
+        with self.index_lock:
+            try:
+                entries, has_more = self.tag_index.page(tags, match_all, after, limit)
+            except TypeError:
+                raise ValueError("Invalid cursor")
+            questions = [self.questions_by_id[entry[-1]] for entry in entries]
+        next_cursor = encode_cursor('tags', entries[-1]) if has_more and entries else None
+        return questions, next_cursor
+
+    def index_search_backlog(self, batch=500):
+        """Text-index up to `batch` deferred questions; returns how many are still waiting.
+
+        Works in batches so writers only wait for index_lock one batch at a time.
+        A question changed since loading was already indexed by that change, and
+        a deleted one is simply skipped.
+        """
+        with self.index_lock:
+            for question_id in self.search_backlog[-batch:]:
+                question = self.questions_by_id.get(question_id)
+                if question is not None and question_id not in self.search_index.question_terms:
+                    self.search_index.add_question(question)
+            del self.search_backlog[-batch:]
+            return len(self.search_backlog)
+
+    def search(self, text, limit=50, sort_by=None):
+        """Questions matching every word of `text` (prefixes included), best match first.
+
+        With a sort order, the best matches are reordered by that order instead.
+        """
+        key = None
+        if sort_by is not None:
+            key = SORT_KEYS.get(sort_by)
+            if key is None:
+                raise ValueError(f"Unknown sort order: {sort_by}")
+
+        while self.search_backlog and self.index_search_backlog():
+            pass
+        with self.index_lock:
+            if key is None:
+                question_ids = self.search_index.search(text, limit)
+            else:
+                question_ids = self.search_index.search(text, max(limit, 1000))
+                keyed = [
+                    (key(self.questions_by_id[question_id], self.positions[question_id]), question_id)
+                    for question_id in question_ids
+                ]
+                question_ids = [question_id for k, question_id in sorted(
+                    (item for item in keyed if item[0] is not None), reverse=True
+                )[:limit]]
+            return [self.questions_by_id[question_id] for question_id in question_ids]
+
+    def changes_since(self, since, epoch=None):
+        """Records inserted, updated or deleted after sequence number `since`.
+
+        Falls back to a full reset when the client synced against another server
+        run or before the oldest tombstone still kept.
+        """
+        with self.index_lock:
+            return self._changes_since(since, epoch)
+
+    def _changes_since(self, since, epoch):
+        if epoch != self.epoch or since < self.horizon or since > self.seq:
+            return {
+                'reset': True,
+                'questions': self.all(),
+                'answers': [],
+                'deleted_questions': [],
+                'deleted_answers': []
+            }
+
+        questions = []
+        answer_keys = []
+        for key, seq in reversed(self.change_log.items()):
+            if seq <= since:
+                break
+            if isinstance(key, tuple):
+                answer_keys.append(key)
+            else:
+                questions.append(self.questions_by_id[key])
+
+        # A changed question already carries all of its answers
+        changed_ids = {q['id'] for q in questions}
+        answers = [
+            {'questionId': question_id, 'answer': self.answers_by_id[question_id][answer_id]}
+            for question_id, answer_id in reversed(answer_keys)
+            if question_id not in changed_ids
+        ]
+
+        deleted_questions = []
+        deleted_answers = []
+        for key, seq in reversed(self.tombstones.items()):
+            if seq <= since:
+                break
+            if isinstance(key, tuple):
+                deleted_answers.append({'questionId': key[0], 'answerId': key[1]})
+            else:
+                deleted_questions.append(key)
+
+        return {
+            'reset': False,
+            'questions': questions,
+            'answers': answers,
+            'deleted_questions': deleted_questions,
+            'deleted_answers': deleted_answers
+        }
+
+    def put_user(self, email, user):
+        with self.stripe(email):
+            user = self.users[email] = as_user(user)
+            if isinstance(user.username, str) and user.username:
+                self.usernames.setdefault(user.username, email)
+        return user
+
+    def op_key(self, op):
+        """The stripe key an operation mutates: its question id, or the user's email"""
+        if op['op'] == 'put_user':
+            return op['email']
+        if op['op'] == 'add_question':
+            return op['question']['id']
+        return op['question_id']
+
+    def apply(self, op):
+        """Apply one journal operation; the live request path and startup replay share this"""
+        kind = op['op']
+        if kind == 'add_question':
+            return self.add_question(op['question'])
+        elif kind == 'add_answer':
+            return self.add_answer(op['question_id'], op['answer'])
+        elif kind == 'delete_answer':
+            return self.delete_answer(op['question_id'], op['answer_id'])
+        elif kind == 'delete_question':
+            return self.delete_question(op['question_id'])
+        elif kind == 'put_user':
+            return self.put_user(op['email'], op['user'])
+        elif kind == 'votes':
+            # Votes hold absolute per-user values, so replaying a batch twice is harmless
+            for question_id, user_id, value in op['votes']:
+                with self.stripe(question_id):
+                    self.votes.cast(question_id, user_id, value)
+            self.publish_votes({question_id for question_id, _, _ in op['votes']})
+        else:
+            raise ValueError(f"Unknown store operation: {kind}")
+
+    def to_dict(self):
+        """The {'questions', 'users'} shape written to a snapshot"""
+        return {
+            'questions': self.all(),
+            'users': dict(self.users)
+        }
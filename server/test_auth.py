@@ -0,0 +1,85 @@
+import threading
+
+from auth import TokenCache
+from conftest import call, new_question
+
+
+def sign_up(server, username, email=None, password='secret'):
+    return call(server, action='sign_up', username=username, email=email or f'{username}@example.com', password=password)
+
+
+def test_token_acts_as_its_user(server):
+    token = sign_up(server, 'alice')['token']
+    response = call(server, action='add_question', token=token, question=new_question('Q1', author='mallory'))
+    assert response['status'] == 'success' and server.store.get('Q1')['author_id'] == 'alice'
+
+    login = call(server, action='login', email='alice@example.com', password='secret')
+    assert login['status'] == 'success' and login['username'] == 'alice'
+    assert call(server, action='login', email='alice@example.com', password='wrong')['status'] == 'error'
+
+    call(server, action='logout', token=token)
+    response = call(server, action='add_answer', token=token, questionId='Q1', answer={'id': 'A1', 'body': 'text'})
+    assert response['code'] == 'invalid_token'
+    assert call(server, action='vote', token='made up', questionId='Q1', voteType='upvote')['code'] == 'invalid_token'
+
+
+def test_only_the_author_deletes_a_question(server):
+    call(server, action='add_question', question=new_question('Q1', author='alice'))
+    mallory = sign_up(server, 'mallory')['token']
+    # The token's user replaces whatever author the request names
+    response = call(server, action='delete_question', token=mallory, question_id='Q1', author_id='alice')
+    assert response['status'] == 'error' and 'Q1' in server.store
+    assert call(server, action='delete_question', question_id='Q1', author_id='bob')['status'] == 'error'
+
+    alice = sign_up(server, 'alice')['token']
+    assert call(server, action='delete_question', token=alice, question_id='Q1')['status'] == 'success'
+
+
+def test_require_tokens(server):
+    server.require_tokens = True
+    response = call(server, action='add_question', question=new_question('Q1'))
+    assert response['code'] == 'invalid_token' and 'Q1' not in server.store
+    token = sign_up(server, 'alice')['token']
+    assert call(server, action='add_question', token=token, question=new_question('Q1'))['status'] == 'success'
+
+
+def test_usernames_are_unique_and_required(server):
+    assert sign_up(server, 'alice')['status'] == 'success'
+    response = sign_up(server, 'alice', email='other@example.com')
+    assert response == {'status': 'error', 'message': 'Username is already taken'}
+    assert sign_up(server, 'alice')['message'] == 'Account already exists'
+    for username in (None, '', '  ', 5, ['alice']):
+        response = sign_up(server, username, email='new@example.com')
+        assert response == {'status': 'error', 'message': 'Username is required'}, username
+    assert set(server.store.users) == {'alice@example.com'}
+
+
+def test_concurrent_sign_ups_claim_a_username_once(server, monkeypatch):
+    # Every sign_up passes the first check before any of them commits
+    barrier = threading.Barrier(8)
+    hash_password = server.passwords.hash
+
+    def hash_together(password):
+        barrier.wait(5)
+        return hash_password(password)
+
+    monkeypatch.setattr(server.passwords, 'hash', hash_together)
+    results = []
+    threads = [
+        threading.Thread(target=lambda i=i: results.append(sign_up(server, 'alice', email=f'alice{i}@example.com')))
+        for i in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(r['status'] for r in results) == ['error'] * 7 + ['success']
+    assert len(server.store.users) == 1
+
+
+def test_tokens_expire():
+    sessions = TokenCache(ttl=0)
+    assert sessions.lookup(sessions.issue('alice@example.com')) is None
+    sessions = TokenCache(max_tokens=2)
+    first, second, third = (sessions.issue(f'{name}@example.com') for name in ('a', 'b', 'c'))
+    assert sessions.lookup(first) is None and sessions.lookup(third) == 'c@example.com' and len(sessions) == 2
@@ -0,0 +1,82 @@
+import json
+import threading
+import time
+
+from changefeed import ALL, ChangeFeed, Subscriber, question_topics
+from conftest import call, new_question, session
+
+
+class Pusher:
+    """Stands in for a connection's sender, collecting the events pushed to it"""
+
+    def __init__(self):
+        self.payloads = []
+        self.received = threading.Condition()
+
+    def __call__(self, payload, compressed):
+        with self.received:
+            self.payloads.append(payload)
+            self.received.notify_all()
+
+    def close(self):
+        pass
+
+    def events(self, count, timeout=2):
+        """The first count events pushed, waiting for them to arrive"""
+        deadline = time.monotonic() + timeout
+        with self.received:
+            while True:
+                events = [event for payload in self.payloads for event in json.loads(payload)['changes']]
+                if len(events) >= count or time.monotonic() >= deadline:
+                    return events
+                self.received.wait(deadline - time.monotonic())
+
+
+def test_each_subscriber_gets_only_its_topics():
+    feed = ChangeFeed(lambda payload, compression: (payload, False), interval=0.01)
+    everything, swift, question = Pusher(), Pusher(), Pusher()
+    first, second = Subscriber(everything, session()), Subscriber(everything, session())
+    feed.subscribe(first, ALL)
+    feed.subscribe(second, ALL)
+    feed.subscribe(Subscriber(swift, session()), ('tag', 'swift'))
+    feed.subscribe(Subscriber(question, session()), ('question', 'Q2'))
+
+    feed.publish([
+        (question_topics('Q1', ['swift']), {'type': 'question_added', 'id': 'Q1'}),
+        (question_topics('Q2', ['python']), {'type': 'question_added', 'id': 'Q2'}),
+    ])
+    assert [e['id'] for e in everything.events(4)] == ['Q1', 'Q2', 'Q1', 'Q2']
+    assert [e['id'] for e in swift.events(1)] == ['Q1']
+    assert [e['id'] for e in question.events(1)] == ['Q2']
+    # Subscribers to everything share one encoded payload
+    assert everything.payloads[0] is everything.payloads[1]
+    feed.close()
+
+
+def test_topics_per_subscriber_are_capped():
+    feed = ChangeFeed(lambda payload, compression: (payload, False), max_topics=2)
+    subscriber = Subscriber(Pusher(), session())
+    assert feed.subscribe(subscriber, ('tag', 'a')) and feed.subscribe(subscriber, ('tag', 'b'))
+    assert feed.subscribe(subscriber, ('tag', 'c')) is False
+    feed.unsubscribe(subscriber)
+    assert feed.subscribers == 0 and not feed.by_topic
+    feed.close()
+
+
+def test_server_pushes_writes_to_subscribers(server):
+    pusher = Pusher()
+    connection = session(open_pusher=lambda: pusher)
+    response = call(server, connection, action='subscribe', tag='swift')
+    assert response['status'] == 'success' and response['subscriptions'] == ['tag:swift']
+
+    call(server, action='add_question', question=new_question('Q1'))
+    call(server, action='add_question', question=new_question('Q2', tags=['python']))
+    call(server, action='add_answer', questionId='Q1', answer={'id': 'A1', 'body': 'text', 'authorId': 'bob'})
+    call(server, action='vote', questionId='Q1', userId='bob', voteType='upvote')
+    events = pusher.events(3)
+    assert [e['type'] for e in events] == ['question_added', 'answer_added', 'votes']
+    assert events[0]['question']['id'] == 'Q1' and events[2]['upvotes'] == 1
+
+    assert call(server, connection, action='unsubscribe')['subscriptions'] == []
+    call(server, action='add_question', question=new_question('Q3'))
+    assert len(pusher.events(4, timeout=0.2)) == 3
@@ -0,0 +1,36 @@
+import json
+
+import pytest
+
+from framing import FrameDecoder, FrameError, deflate, encode_frame
+
+
+def test_frames_reassemble_from_any_chunking():
+    payloads = [json.dumps({'action': 'vote', 'n': i}).encode('utf-8') for i in range(5)] + [b'x' * 100000]
+    stream = b''.join(encode_frame(payload) for payload in payloads)
+    for size in (1, 3, 4, 7, 4096, len(stream)):
+        decoder = FrameDecoder()
+        frames = []
+        for i in range(0, len(stream), size):
+            frames.extend(decoder.feed(stream[i:i + size]))
+        assert frames == payloads
+
+
+def test_compressed_frames_are_inflated():
+    payload = json.dumps({'status': 'success', 'data': ['swift'] * 1000}).encode('utf-8')
+    stream = encode_frame(b'plain') + encode_frame(deflate(payload), compressed=True) + encode_frame(b'after')
+    decoder = FrameDecoder()
+    frames = []
+    for i in range(0, len(stream), 5):
+        frames.extend(decoder.feed(stream[i:i + 5]))
+    assert frames == [b'plain', payload, b'after']
+
+
+def test_oversized_and_corrupt_frames_are_rejected():
+    with pytest.raises(FrameError):
+        FrameDecoder(max_frame_size=10).feed(encode_frame(b'x' * 11))
+    with pytest.raises(FrameError):
+        FrameDecoder().feed(encode_frame(b'not deflate', compressed=True))
+    # A small compressed frame may not expand past the limit either
+    with pytest.raises(FrameError):
+        FrameDecoder(max_frame_size=1000).feed(encode_frame(deflate(b'a' * 5000), compressed=True))
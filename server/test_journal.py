@@ -0,0 +1,133 @@
+import threading
+
+from journal import Journal, replay, truncate_torn
+from schema import normalize_question
+from store import QuestionStore
+
+
+def question(question_id):
+    return normalize_question({'id': question_id, 'title': f'title {question_id}', 'body': 'body', 'author_id': 'u1', 'tags': ['swift']})
+
+
+def restart(path):
+    """What the server does at startup: replay into a fresh store, then cut any torn tail"""
+    store = QuestionStore()
+    seq, end = replay(path, store)
+    truncate_torn(path, end)
+    return store, seq
+
+
+def write(path, last_seq, question_ids):
+    journal = Journal(path, last_seq=last_seq)
+    for question_id in question_ids:
+        journal.append({'op': 'add_question', 'question': question(question_id)})
+    journal.close()
+
+
+def test_replay_applies_records_after_seq(tmp_path):
+    path = str(tmp_path / 'journal')
+    write(path, 0, ['T0', 'T1', 'T2'])
+    store = QuestionStore()
+    seq, end = replay(path, store, after_seq=1)
+    assert seq == 3
+    assert end == (tmp_path / 'journal').stat().st_size
+    assert [q['id'] for q in store.all()] == ['T2', 'T1']
+
+
+def test_torn_tail_then_more_writes_survive_restart(tmp_path):
+    path = str(tmp_path / 'journal')
+    write(path, 0, ['T0', 'T1', 'T2'])
+    # A crash mid-write leaves the last record cut short
+    data = (tmp_path / 'journal').read_bytes()
+    (tmp_path / 'journal').write_bytes(data[:-10])
+
+    store, seq = restart(path)
+    assert seq == 2
+    assert set(store.questions_by_id) == {'T0', 'T1'}
+
+    write(path, seq, ['T3', 'T4', 'T5'])
+    store, seq = restart(path)
+    assert seq == 5
+    assert set(store.questions_by_id) == {'T0', 'T1', 'T3', 'T4', 'T5'}
+
+
+def test_record_without_newline_is_torn(tmp_path):
+    path = str(tmp_path / 'journal')
+    write(path, 0, ['T0', 'T1'])
+    data = (tmp_path / 'journal').read_bytes()
+    (tmp_path / 'journal').write_bytes(data[:-1])
+
+    store, seq = restart(path)
+    assert seq == 1
+    assert (tmp_path / 'journal').read_bytes() == data[:data.index(b'\n') + 1]
+
+
+def test_compaction_keeps_only_records_after_the_snapshot(tmp_path):
+    path = str(tmp_path / 'journal')
+    journal = Journal(path)
+    for question_id in ('T0', 'T1', 'T2', 'T3'):
+        journal.append({'op': 'add_question', 'question': question(question_id)})
+    assert journal.needs_compaction() is False
+    journal.discard_through(2)
+    journal.append({'op': 'add_question', 'question': question('T4')})
+    journal.close()
+
+    store = QuestionStore()
+    seq, _ = replay(path, store, after_seq=2)
+    assert seq == 5
+    assert [q['id'] for q in store.all()] == ['T4', 'T3', 'T2']
+
+    # A snapshot covering everything empties the journal
+    journal = Journal(path, last_seq=5)
+    journal.discard_through(5)
+    journal.close()
+    assert (tmp_path / 'journal').read_bytes() == b''
+
+
+def test_compaction_after_recovering_a_torn_tail(tmp_path):
+    path = str(tmp_path / 'journal')
+    write(path, 0, ['T0', 'T1', 'T2'])
+    data = (tmp_path / 'journal').read_bytes()
+    (tmp_path / 'journal').write_bytes(data[:-10])
+    store, seq = restart(path)
+
+    journal = Journal(path, last_seq=seq)
+    journal.append({'op': 'add_question', 'question': question('T3')})
+    journal.discard_through(1)
+    journal.close()
+
+    store = QuestionStore()
+    assert replay(path, store, after_seq=1)[0] == 3
+    assert [q['id'] for q in store.all()] == ['T3', 'T1']
+
+
+def test_compaction_while_appending(tmp_path):
+    path = str(tmp_path / 'journal')
+    journal = Journal(path)
+    appended = []
+    errors = []
+
+    def append(writer):
+        try:
+            for i in range(300):
+                question_id = f'W{writer}-{i}'
+                # Some writers don't wait, so records are often pending or mid-write during compaction
+                appended.append((journal.append({'op': 'add_question', 'question': question(question_id)}, wait=i % 2 == 0), question_id))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=append, args=(writer,)) for writer in range(4)]
+    for thread in threads:
+        thread.start()
+    discarded = 0
+    while any(thread.is_alive() for thread in threads):
+        discarded = max(discarded, journal.appended_seq - 20)
+        journal.discard_through(discarded)
+    for thread in threads:
+        thread.join()
+    journal.close()
+
+    assert errors == []
+    store = QuestionStore()
+    assert replay(path, store, after_seq=discarded)[0] == 1200
+    assert set(store.questions_by_id) == {question_id for seq, question_id in appended if seq > discarded}
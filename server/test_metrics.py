@@ -0,0 +1,32 @@
+from conftest import call
+from metrics import Metrics
+
+
+def test_unknown_actions_share_one_series():
+    metrics = Metrics({'vote'})
+    metrics.observe_request('vote', 0.001, 10)
+    for i in range(100):
+        metrics.observe_request(f'made_up_{i}', 0.001, 10, ok=False)
+    metrics.observe_request(['not', 'a', 'string'], 0.001, 10, ok=False)
+
+    actions = metrics.snapshot()['actions']
+    assert sorted(actions) == ['invalid', 'unknown', 'vote']
+    assert actions['unknown']['count'] == 100 and actions['unknown']['errors'] == 100
+
+
+def test_label_values_are_escaped():
+    metrics = Metrics()
+    metrics.observe_persistence('a"b\\c\nd', 0.001)
+    text = metrics.render_text()
+    assert 'stackoverflow_persistence_total{kind="a\\"b\\\\c\\nd"} 1\n' in text
+    # Every sample stays on its own line
+    assert all(line.startswith('stackoverflow_') for line in text.splitlines())
+
+
+def test_server_counts_requests_per_action(server):
+    call(server, action='get_tags')
+    call(server, action='no_such_action\n')
+    actions = call(server, action='stats')['actions']
+    assert actions['get_tags']['count'] == 1
+    assert actions['unknown']['count'] == 1 and actions['unknown']['errors'] == 1
+    assert 'no_such_action\n' not in actions
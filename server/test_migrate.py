@@ -0,0 +1,46 @@
+import pickle
+
+from auth import check_password, is_hashed
+from migrate import migrate
+from snapshot import open_database
+
+
+def legacy_database(path, data):
+    with open(path, 'wb') as f:
+        pickle.dump(data, f)
+
+
+def test_migrate_legacy_pickle(tmp_path):
+    source, target = str(tmp_path / 'database.pkl'), str(tmp_path / 'database.snap')
+    legacy_database(source, {
+        'questions': [
+            {'id': 'Q1', 'title': 'title', 'body': 'body', 'authorId': 'alice', 'tags': ['swift'], 'extra': 1,
+             'answers': [{'id': 'A1', 'body': 'answer', 'author_id': 'bob'}]},
+            {'id': 'Q2', 'title': 'other', 'body': 'body', 'author_id': 'bob'},
+        ],
+        'users': {'alice@example.com': {'username': 'alice', 'password': 'secret'}},
+        'journal_seq': 7,
+    })
+
+    report = migrate(source, target, hash_iterations=1000)
+    assert (report.questions, report.answers, report.users, report.hashed_passwords) == (2, 1, 1, 1)
+    assert report.dropped_fields >= 1
+
+    database = open_database(target)
+    try:
+        questions = {q['id']: q for q in database['questions']}
+        assert database['legacy'] is False and database['journal_seq'] == 7
+        assert questions['Q1']['author_id'] == 'alice' and 'extra' not in questions['Q1']
+        assert questions['Q1']['answers'][0]['authorId'] == 'bob'
+        password = database['users']['alice@example.com']['password']
+        assert is_hashed(password) and check_password(password, 'secret', 1000) == (True, False)
+    finally:
+        database['close']()
+
+
+def test_open_database_reads_a_question_list_pickle(tmp_path):
+    path = str(tmp_path / 'database.pkl')
+    legacy_database(path, [{'id': 'Q1', 'title': 'title'}])
+    database = open_database(path)
+    assert database['legacy'] is True and database['users'] == {} and database['journal_seq'] == 0
+    assert [q['id'] for q in database['questions']] == ['Q1']
@@ -0,0 +1,57 @@
+import argparse
+
+import pytest
+
+from auth import TokenCache
+from ratelimit import RateLimiter, TokenBucket, parse_limits, user_key
+
+
+def test_bucket_spends_burst_then_refills_at_rate():
+    bucket = TokenBucket(rate=10, burst=3, now=0.0)
+    assert [bucket.take(0.0) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.take(0.0) == pytest.approx(0.1)
+    # 0.25 s refills 2.5 tokens, but never past the burst
+    assert bucket.take(0.25) == 0.0
+    assert bucket.take(0.25) == 0.0
+    assert bucket.take(0.25) == pytest.approx(0.05)
+    assert bucket.take(100.0) == 0.0
+    assert bucket.tokens == 2
+
+
+def test_parse_limits():
+    assert parse_limits('read=200/400, vote=50') == {'read': (200.0, 400.0), 'vote': (50.0, 50.0)}
+    assert parse_limits('') == {}
+    for bad in ('chat=1', 'read=x', 'read=0', 'read=10/0.5'):
+        with pytest.raises(argparse.ArgumentTypeError):
+            parse_limits(bad)
+
+
+def test_limiter_checks_connection_then_user_buckets():
+    limiter = RateLimiter(parse_limits('write=100/2'), parse_limits('write=100/3'))
+    first, second = {}, {}
+    request = {'action': 'add_answer', 'answer': {'authorId': 'u1'}}
+    assert limiter.check(first, request, 'add_answer', '10.0.0.1') == 0
+    assert limiter.check(first, request, 'add_answer', '10.0.0.1') == 0
+    assert limiter.check(first, request, 'add_answer', '10.0.0.1') > 0  # this connection's burst is spent
+    assert limiter.check(second, request, 'add_answer', '10.0.0.1') == 0
+    assert limiter.check(second, request, 'add_answer', '10.0.0.1') > 0  # and now the address's, across connections
+    # Reads have no limit configured here
+    assert limiter.check(first, {'action': 'get_questions'}, 'get_questions') == 0
+    assert limiter.limited == 2
+
+
+def test_users_are_their_token_or_address_never_claimed_ids():
+    sessions = TokenCache()
+    token = sessions.issue('alice@example.com')
+    assert user_key({'token': token, 'userId': 'bob'}, sessions, '10.0.0.1') == ('user', 'alice@example.com')
+    assert user_key({'token': 'made up', 'userId': 'bob'}, sessions, '10.0.0.1') == ('peer', '10.0.0.1')
+    assert user_key({'email': 'bob@example.com', 'answer': {'authorId': 'bob'}}, sessions, None) is None
+
+    limiter = RateLimiter({}, parse_limits('vote=100/2'), sessions)
+    # Naming a different user in each request doesn't buy a fresh bucket
+    assert [limiter.check({}, {'userId': f'u{i}'}, 'vote', '10.0.0.1') == 0 for i in range(3)] == [True, True, False]
+    # Nor does naming alice spend hers: her token's bucket is her own
+    assert limiter.check({}, {'token': token}, 'vote', '10.0.0.1') == 0
+    assert limiter.check({}, {'token': token}, 'vote', '10.0.0.1') == 0
+    assert limiter.check({}, {'token': token}, 'vote', '10.0.0.1') > 0
+    assert limiter.check({}, {'userId': 'alice'}, 'vote', '10.0.0.2') == 0
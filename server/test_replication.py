@@ -0,0 +1,58 @@
+import multiprocessing
+
+import pytest
+
+from conftest import call, new_question, start_server, stop_server
+from replication import ReplicaLink, ReplicationHub
+
+
+@pytest.fixture
+def worker(server):
+    """A worker replicating the server fixture, over a pipe within this process as serve_workers sets up"""
+    call(server, action='add_question', question=new_question('Q0'))
+    call(server, action='add_question', question=new_question('gone'))
+    call(server, action='delete_question', question_id='gone', author_id='alice')
+    server.replication = ReplicationHub(server.handle_owner_request)
+    server.journal.on_append = server.replication.broadcast
+    owner_end, worker_end = multiprocessing.Pipe()
+    server.add_replica(owner_end)
+    worker = start_server(replica=ReplicaLink(worker_end))
+    yield worker
+    # Losing the owner would otherwise signal this process to shut down
+    worker.replica.on_lost = lambda: None
+    stop_server(worker)
+    worker_end.close()
+
+
+def test_worker_forwards_writes_and_reports_its_own_seq(server, worker):
+    assert [q['id'] for q in worker.store.all()] == ['Q0']
+    synced = call(worker, action='get_changes')
+    since, epoch = synced['seq'], synced['epoch']
+
+    response = call(worker, action='add_question', question=new_question('Q1'))
+    assert response['status'] == 'success'
+    # The owner applied the write, and the worker's replica has it by the time the reply arrives
+    assert 'Q1' in server.store and 'Q1' in worker.store
+    # The seq in the reply is the worker's, so get_changes against the worker picks up right after it
+    assert response['seq'] == worker.store.seq != server.store.seq
+    assert call(worker, action='get_changes', since=response['seq'], epoch=epoch)['questions'] == []
+    assert [q['id'] for q in call(worker, action='get_changes', since=since, epoch=epoch)['questions']] == ['Q1']
+
+    response = call(worker, action='vote', questionId='Q1', userId='bob', voteType='upvote')
+    assert response['status'] == 'success' and response['upvotes'] == 1
+
+
+def test_sessions_live_on_the_owner(server, worker):
+    signed_up = call(worker, action='sign_up', username='carol', email='carol@example.com', password='secret')
+    assert signed_up['status'] == 'success' and 'carol@example.com' in server.store.users
+    token = call(worker, action='login', email='carol@example.com', password='secret')['token']
+    response = call(worker, action='add_question', token=token, question=new_question('Q1', author='mallory'))
+    assert response['status'] == 'success'
+    assert worker.store.get('Q1')['author_id'] == 'carol'
+
+
+def test_only_forwarded_writes_leave_a_workers_event_loop(server, worker):
+    assert worker.runs_off_loop(b'{"action": "add_question", "question": {}}')
+    assert worker.runs_off_loop(b'{"action": "login"}')
+    assert not worker.runs_off_loop(b'{"action": "list_questions"}')
+    assert server.runs_off_loop(b'{"action": "add_question", "question": {}}')
@@ -0,0 +1,29 @@
+from response_cache import ResponseCache, cache_key
+
+
+def test_entries_are_only_served_at_their_version():
+    cache = ResponseCache()
+    cache.put('k', 1, b'payload')
+    assert cache.get('k', 1) == (b'payload', False)
+    assert cache.get('k', 2) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_byte_budget_evicts_least_recently_used():
+    cache = ResponseCache(max_bytes=10)
+    cache.put('a', 1, b'aaaa')
+    cache.put('b', 1, b'bbbb')
+    cache.get('a', 1)
+    cache.put('c', 1, b'cccc')
+    assert cache.get('b', 1) is None and cache.get('a', 1) and cache.get('c', 1)
+    assert cache.size == 8
+    cache.put('huge', 1, b'x' * 11)  # larger than the whole budget: never cached
+    assert cache.get('huge', 1) is None
+    cache.invalidate()
+    assert cache.get('a', 1) is None and cache.size == 0
+
+
+def test_cache_key_is_canonical():
+    assert cache_key({'b': 1, 'a': 2}) == cache_key({'a': 2, 'b': 1})
+    assert cache_key({'a': float('nan')}) is not None
+    assert cache_key({'a': object()}) is None
@@ -0,0 +1,56 @@
+from conftest import call, new_question
+from schema import normalize_question
+
+
+def test_add_question_rejects_an_existing_id(server):
+    assert call(server, action='add_question', question=new_question('Q1'))['status'] == 'success'
+    call(server, action='add_answer', questionId='Q1', answer={'id': 'A1', 'body': 'text', 'authorId': 'bob'})
+
+    response = call(server, action='add_question', question=new_question('Q1', author='mallory'))
+    assert response['status'] == 'error'
+    question = server.store.get('Q1')
+    assert question['author_id'] == 'alice' and [a['id'] for a in question['answers']] == ['A1']
+    assert call(server, action='delete_question', question_id='Q1', author_id='alice')['status'] == 'success'
+
+
+def test_bad_limits_and_cursors_get_a_clear_error(server):
+    for i in range(3):
+        call(server, action='add_question', question=new_question(f'Q{i}'))
+    first = call(server, action='list_questions', limit=2)
+    assert [q['id'] for q in first['data']] == ['Q2', 'Q1'] and first['next_cursor']
+    assert [q['id'] for q in call(server, action='list_questions', limit=2, cursor=first['next_cursor'])['data']] == ['Q0']
+
+    for action in ('list_questions', 'questions_by_tag', 'filter_questions', 'get_tags'):
+        for limit in ('10', 2.5, [1], True):
+            response = call(server, action=action, tag='swift', limit=limit)
+            assert response == {'status': 'error', 'message': 'Invalid limit'}, (action, limit)
+    for action in ('list_questions', 'questions_by_tag'):
+        for cursor in (5, ['x'], {'a': 1}, 'not base64!'):
+            response = call(server, action=action, tag='swift', cursor=cursor)
+            assert response == {'status': 'error', 'message': 'Invalid cursor'}, (action, cursor)
+
+
+def test_vote_needs_a_string_user_id(server):
+    call(server, action='add_question', question=new_question('Q1'))
+    for user_id in (5, None, '', {'a': 1}):
+        response = call(server, action='vote', questionId='Q1', userId=user_id, voteType='upvote')
+        assert response['status'] == 'error'
+    assert server.store.votes.totals['Q1'] == [0, 0]
+    assert call(server, action='vote', questionId='Q1', userId='bob', voteType='upvote')['upvotes'] == 1
+    assert call(server, action='vote', questionId='Q1', userId='bob', voteType='upvote')['upvotes'] == 1
+
+
+def test_cached_reads_follow_the_store_seq(server):
+    call(server, action='add_question', question=new_question('Q1'))
+    first = call(server, action='list_questions')
+    hits = server.response_cache.hits
+    assert call(server, action='list_questions') == first
+    assert server.response_cache.hits == hits + 1
+
+    call(server, action='add_answer', questionId='Q1', answer={'id': 'A1', 'body': 'text', 'authorId': 'bob'})
+    assert [a['id'] for a in call(server, action='list_questions')['data'][0]['answers']] == ['A1']
+
+    # Even a change that skips invalidate() moves the seq, so the old entry is never served
+    call(server, action='list_questions')
+    server.store.add_question(normalize_question(new_question('Q2')))
+    assert [q['id'] for q in call(server, action='list_questions')['data']] == ['Q2', 'Q1']
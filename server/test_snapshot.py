@@ -0,0 +1,110 @@
+import json
+import os
+import pickle
+import shutil
+import struct
+
+import pytest
+
+from conftest import call, start_server, stop_server
+from schema import normalize_question, normalize_user
+from snapshot import ENTRY, HEADERS, MAGIC, Snapshot, SnapshotError, write_snapshot
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def questions():
+    return [
+        normalize_question({
+            'id': f'Q{i}', 'title': f'title {i}', 'body': 'body', 'author_id': 'alice', 'tags': ['swift', 'ios'],
+            'user_votes': {'bob': 1}, 'upvotes': 1,
+            'answers': [{'id': f'A{i}', 'body': 'answer', 'authorId': 'bob'}],
+        })
+        for i in range(3)
+    ]
+
+
+def test_roundtrip(tmp_path):
+    path = str(tmp_path / 'database.snap')
+    users = {'a@x.io': normalize_user('a@x.io', {'username': 'alice', 'password': 'hash'})}
+    write_snapshot(path, questions(), users, journal_seq=42)
+    with Snapshot(path) as snapshot:
+        assert len(snapshot) == 3 and snapshot.journal_seq == 42 and snapshot.version == 2
+        assert list(snapshot) == questions()
+        assert snapshot[-1] == questions()[2]
+        assert snapshot.users() == {'a@x.io': users['a@x.io'].to_dict()}
+    assert not os.path.exists(path + '.tmp')
+
+
+def test_empty_snapshot(tmp_path):
+    path = str(tmp_path / 'database.snap')
+    write_snapshot(path, iter([]), {})
+    with Snapshot(path) as snapshot:
+        assert list(snapshot) == [] and snapshot.users() == {}
+
+
+def test_version_1_snapshots_still_load(tmp_path):
+    # Version 1: keyed JSON records and no string table
+    header = HEADERS[1]
+    records = [json.dumps(q.to_dict(), default=lambda r: r.to_dict()).encode('utf-8') for q in questions()]
+    users = b'{}'
+    body, table, offset = b'', b'', header.size
+    for record in records:
+        table += ENTRY.pack(offset, len(record))
+        body += record
+        offset += len(record)
+    path = tmp_path / 'database.snap'
+    path.write_bytes(header.pack(MAGIC, 1, len(records), 7, offset, len(users), offset + len(users))
+                     + body + users + table)
+    with Snapshot(str(path)) as snapshot:
+        assert snapshot.version == 1 and snapshot.journal_seq == 7
+        assert [normalize_question(q) for q in snapshot] == questions()
+
+
+def test_damaged_files_are_rejected(tmp_path):
+    path = str(tmp_path / 'database.snap')
+    write_snapshot(path, questions(), {})
+    data = open(path, 'rb').read()
+    for damaged in (b'', data[:10], b'NOTSNAP\x00' + data[8:], data[:8] + struct.pack('<I', 99) + data[12:],
+                    data[:-20]):
+        with open(path, 'wb') as f:
+            f.write(damaged)
+        with pytest.raises(SnapshotError):
+            Snapshot(path).close()
+
+
+def test_server_loads_and_migrates_a_legacy_pickle(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'server').mkdir()
+    # The database shipped with the repository is a legacy pickle
+    shutil.copy(os.path.join(HERE, 'database.pkl'), tmp_path / 'server' / 'database.pkl')
+    with open(tmp_path / 'server' / 'database.pkl', 'rb') as f:
+        data = pickle.load(f)
+
+    server = start_server()
+    try:
+        assert len(server.store) == len(data['questions'])
+        assert set(server.store.users) == set(data['users'])
+        assert call(server, action='get_questions')['status'] == 'success'
+    finally:
+        stop_server(server)
+    # Saved as a snapshot on shutdown, which the next start reads instead
+    with Snapshot(str(tmp_path / 'server' / 'database.snap')) as snapshot:
+        assert [q['id'] for q in snapshot] == [q['id'] for q in data['questions']]
+
+
+def test_server_loads_a_question_list_pickle(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'server').mkdir()
+    # The oldest databases were just the question list, with authorId on questions
+    old = [{'id': 'Q1', 'title': 't', 'body': 'b', 'authorId': 'alice', 'answers': [{'id': 'A1', 'author_id': 'bob'}]}]
+    with open(tmp_path / 'server' / 'database.pkl', 'wb') as f:
+        pickle.dump(old, f)
+
+    server = start_server()
+    try:
+        question = server.store.get('Q1')
+        assert question['author_id'] == 'alice' and question['answers'][0]['authorId'] == 'bob'
+        assert server.store.users == {}
+    finally:
+        stop_server(server)
@@ -0,0 +1,80 @@
+import pytest
+
+from schema import normalize_answer, normalize_question
+from store import QuestionStore
+
+
+def question(question_id, **fields):
+    return normalize_question(dict({'id': question_id, 'title': 'title', 'body': 'body', 'author_id': 'u1'}, **fields))
+
+
+def test_non_string_text_is_normalized_away():
+    record = question('Q1', title=5, body={'a': 1}, answers=[{'id': 'A1', 'body': ['x']}])
+    assert record['title'] == '' and record['body'] == ''
+    assert record['answers'][0]['body'] == ''
+
+    store = QuestionStore()
+    store.add_question(record)
+    assert store.cast_vote('Q1', 'u2', 1) == (1, 0)
+
+
+def test_failed_tokenize_leaves_no_trace():
+    store = QuestionStore()
+    broken = question('Q1')
+    broken['body'] = {'a': 1}  # past normalization, as a bug elsewhere could leave it
+    with pytest.raises(AttributeError):
+        store.add_question(broken)
+    assert 'Q1' not in store and store.all() == [] and store.seq == 0
+    assert store.page('newest')[0] == []
+
+    store.add_question(question('Q2'))
+    answer = normalize_answer({'id': 'A1', 'body': 'text'}, 'Q2')
+    answer['body'] = ['x']
+    with pytest.raises(AttributeError):
+        store.add_answer('Q2', answer)
+    assert store.get('Q2')['answers'] == [] and store.answers_by_id['Q2'] == {}
+
+
+def test_changes_since_reports_only_newer_records():
+    store = QuestionStore([question('Q1'), question('Q2')])
+    since, epoch = store.seq, store.epoch
+    store.add_question(question('Q3'))
+    store.add_answer('Q1', normalize_answer({'id': 'A1', 'body': 'text'}, 'Q1'))
+    store.delete_question('Q2')
+
+    changes = store.changes_since(since, epoch)
+    assert changes['reset'] is False
+    assert [q['id'] for q in changes['questions']] == ['Q3']
+    assert [(a['questionId'], a['answer']['id']) for a in changes['answers']] == [('Q1', 'A1')]
+    assert changes['deleted_questions'] == ['Q2']
+
+    since = store.seq
+    store.delete_answer('Q1', 'A1')
+    changes = store.changes_since(since, epoch)
+    assert changes['questions'] == [] and changes['answers'] == []
+    assert changes['deleted_answers'] == [{'questionId': 'Q1', 'answerId': 'A1'}]
+    assert store.changes_since(store.seq, epoch)['questions'] == []
+
+
+def test_changes_since_resets_for_other_epochs_and_future_seqs():
+    store = QuestionStore([question('Q1')])
+    assert store.changes_since(0, 'another run')['reset'] is True
+    assert store.changes_since(store.seq + 1, store.epoch)['reset'] is True
+    assert [q['id'] for q in store.changes_since(0, None)['questions']] == ['Q1']
+
+
+def test_trimmed_tombstones_force_a_reset():
+    store = QuestionStore([question(f'Q{i}') for i in range(4)], max_tombstones=2)
+    since, epoch = store.seq, store.epoch
+    store.delete_question('Q0')
+    store.delete_question('Q1')
+    # Two tombstones fit, so a client from before them still gets a delta
+    assert sorted(store.changes_since(since, epoch)['deleted_questions']) == ['Q0', 'Q1']
+
+    store.delete_question('Q2')
+    # Q0's tombstone is gone: that client could miss the delete, so it must resync
+    changes = store.changes_since(since, epoch)
+    assert changes['reset'] is True
+    assert [q['id'] for q in changes['questions']] == ['Q3']
+    # Clients that synced after the trimmed tombstone still get deltas
+    assert sorted(store.changes_since(store.horizon, epoch)['deleted_questions']) == ['Q1', 'Q2']
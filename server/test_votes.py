@@ -0,0 +1,47 @@
+import pytest
+
+from votes import VoteCounter
+
+
+def counter():
+    votes = VoteCounter()
+    votes.load({'id': 'Q1', 'user_votes': {'u1': 1}, 'upvotes': 1, 'downvotes': 0})
+    return votes
+
+
+def test_repeated_vote_counts_once():
+    votes = counter()
+    assert votes.cast('Q1', 'u1', 1) is False
+    assert votes.cast('Q1', 'u2', 1) is True
+    assert votes.cast('Q1', 'u2', 1) is False
+    assert votes.totals['Q1'] == [2, 0]
+
+
+def test_switching_and_clearing_adjust_both_totals():
+    votes = counter()
+    assert votes.cast('Q1', 'u1', -1) is True
+    assert votes.totals['Q1'] == [0, 1]
+    assert votes.cast('Q1', 'u1', 0) is True
+    assert votes.totals['Q1'] == [0, 0]
+    assert 'u1' not in votes.user_votes['Q1']
+
+
+def test_unknown_question():
+    assert counter().cast('Q2', 'u1', 1) is None
+
+
+def test_pending_votes_coalesce_per_user():
+    votes = counter()
+    votes.mark_pending('Q1', 'u2', 1)
+    votes.mark_pending('Q1', 'u2', -1)
+    votes.mark_pending('Q1', 'u3', 1)
+    assert sorted(votes.take_pending()) == [['Q1', 'u2', -1], ['Q1', 'u3', 1]]
+    assert votes.take_pending() == []
+
+
+def test_invalid_user_ids_change_nothing():
+    votes = counter()
+    for user_id in (5, None, '', ['u2']):
+        with pytest.raises(ValueError):
+            votes.cast('Q1', user_id, 1)
+    assert votes.totals['Q1'] == [1, 0] and votes.user_votes['Q1'] == {'u1': 1}
@@ -0,0 +1,79 @@
+import sys
+import threading
+
+# Accepted spellings of a vote; VoteType in the Swift client encodes as -1/0/1
+VOTE_VALUES = {'upvote': 1, 'downvote': -1, 'none': 0, 1: 1, -1: -1, 0: 0}
+
+
+class VoteCounter:
+    """Per-user votes and running totals for every question.
+
+    Each user holds at most one vote (+1 or -1) per question; casting the same
+    vote again changes nothing and switching adjusts both totals. Totals live
+    here rather than in the question records, so a burst of votes on a hot
+    question only touches two integers and one dict entry per vote. Callers
+    hold the question's stripe lock around cast().
+
+    Changed (question, user) pairs collect in `pending` until take_pending(),
+    so many votes on the same question coalesce into one batch.
+    """
+
+    def __init__(self):
+        self.user_votes = {}  # question id -> {user id: 1 or -1}
+        self.totals = {}      # question id -> [upvotes, downvotes]
+        self.pending = {}     # (question id, user id) -> vote cast since the last batch
+        self.pending_lock = threading.Lock()
+
+    def load(self, question):
+        """Seed the counters from a question record"""
+        question_id = question['id']
+        self.user_votes[question_id] = {
+            sys.intern(user_id): value
+            for user_id, value in (question.get('user_votes') or {}).items()
+            if value in (1, -1)
+        }
+        # Older records counted anonymous votes, so totals can exceed the per-user map
+        self.totals[question_id] = [question.get('upvotes', 0), question.get('downvotes', 0)]
+
+    def forget(self, question_id):
+        self.user_votes.pop(question_id, None)
+        self.totals.pop(question_id, None)
+
+    def cast(self, question_id, user_id, value):
+        """Record a user's vote; returns True if it changed anything, None for an unknown question"""
+        # Validated before any total changes, so a bad id can't count a vote with no voter
+        if not isinstance(user_id, str) or not user_id:
+            raise ValueError(f"Invalid user id: {user_id!r}")
+        user_id = sys.intern(user_id)
+        votes = self.user_votes.get(question_id)
+        if votes is None:
+            return None
+        previous = votes.get(user_id, 0)
+        if previous == value:
+            return False
+
+        totals = self.totals[question_id]
+        if previous == 1:
+            totals[0] -= 1
+        elif previous == -1:
+            totals[1] -= 1
+        if value == 1:
+            totals[0] += 1
+        elif value == -1:
+            totals[1] += 1
+
+        if value:
+            votes[user_id] = value
+        else:
+            votes.pop(user_id, None)
+        return True
+
+    def mark_pending(self, question_id, user_id, value):
+        with self.pending_lock:
+            self.pending[(question_id, user_id)] = value
+
+    def take_pending(self):
+        """Every vote changed since the last call, as [question id, user id, value] triples"""
+        with self.pending_lock:
+            pending, self.pending = self.pending, {}
+        return [[question_id, user_id, value] for (question_id, user_id), value in pending.items()]